@@ -0,0 +1,64 @@
+import json
+from typing import Any, Optional
+
+from aiogram.fsm.storage.redis import RedisStorage, Redis
+from loguru import logger
+from redis.asyncio import BlockingConnectionPool
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_dumps(data: Any) -> str:
+    """Сериализация данных FSM: orjson, если установлен, иначе стандартный json."""
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def json_loads(data: Any) -> Any:
+    """Десериализация данных FSM."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def build_redis(url: str, max_connections: int = 50, pool_timeout: float = 5.0) -> Redis:
+    """
+    Создание клиента Redis с ограниченным пулом соединений. При исчерпании пула запрос
+    ждёт свободное соединение до pool_timeout секунд вместо немедленной ошибки.
+
+    :param url: Адрес Redis (redis://host:port/db).
+    :param max_connections: Максимальный размер пула соединений.
+    :param pool_timeout: Время ожидания свободного соединения (в секундах).
+    :return: Асинхронный клиент Redis, владеющий пулом.
+    """
+    pool = BlockingConnectionPool.from_url(
+        url,
+        max_connections=max_connections,
+        timeout=pool_timeout,
+        socket_keepalive=True,
+        health_check_interval=30,
+    )
+    return Redis.from_pool(pool)
+
+
+def build_storage(redis: Redis, state_ttl: Optional[int] = None, data_ttl: Optional[int] = None) -> RedisStorage:
+    """
+    Создание хранилища состояний FSM в Redis: состояния диалогов переживают перезапуск
+    и общие для всех экземпляров бота.
+
+    :param redis: Асинхронный клиент Redis.
+    :param state_ttl: Время жизни состояния (в секундах); устаревшие диалоги удаляются.
+    :param data_ttl: Время жизни данных состояния (в секундах); не может быть меньше state_ttl,
+                     иначе состояние переживёт данные, с которыми работают его обработчики.
+    :return: Хранилище состояний.
+    """
+    if data_ttl is not None and (state_ttl is None or data_ttl < state_ttl):
+        logger.warning(f"FSM data TTL ({data_ttl}s) is shorter than state TTL ({state_ttl}s), using {state_ttl}s.")
+        data_ttl = state_ttl
+    logger.info(f"FSM storage: Redis (state TTL: {state_ttl}s, data TTL: {data_ttl}s, "
+                f"serializer: {'orjson' if orjson is not None else 'json'}).")
+    return RedisStorage(redis, state_ttl=state_ttl, data_ttl=data_ttl, json_loads=json_loads, json_dumps=json_dumps)
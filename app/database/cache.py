@@ -0,0 +1,287 @@
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+# Заполнение Redis после чтения из БД: запись принимается, только если с начала чтения
+# версия настроек пользователя не менялась (никто не записал более новые данные).
+FILL_IF_VERSION_LUA = """
+local current = redis.call('GET', KEYS[2]) or ''
+if current ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', tonumber(ARGV[3]))
+return 1
+"""
+
+# Версия кэша для заполнения после чтения из БД: (локальное поколение, версия в Redis)
+CacheVersion = Tuple[int, Optional[str]]
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class SettingsCache:
+    """
+    Кэш настроек пользователей (LRU + TTL) с опциональным вторым уровнем в Redis.
+
+    Локальный уровень ограничен по числу записей и времени жизни, Redis-уровень
+    позволяет нескольким экземплярам бота разделять один и тот же кэш.
+
+    При подключении Redis каждое изменение настроек рассылается через pub/sub, и остальные
+    процессы (реплики бота, исполнители генерации) удаляют запись из локального уровня.
+    Заполнение кэша после чтения из БД проверяет версию: если за время чтения настройки
+    изменились, прочитанные данные считаются устаревшими и не сохраняются.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 300.0, redis_ttl: int = 3600,
+                 key_prefix: str = 'user_settings'):
+        """
+        :param max_size: Максимальное количество записей в локальном кэше.
+        :param ttl: Время жизни записи в локальном кэше (в секундах).
+        :param redis_ttl: Время жизни записи в Redis (в секундах).
+        :param key_prefix: Префикс ключей и канала инвалидации в Redis.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+        self.key_prefix = key_prefix
+        self.redis = None
+        self.shared = False
+        self.channel = f"{key_prefix}:invalidate"
+        self.origin = uuid.uuid4().hex
+        self.__fill_script = None
+
+        self._entries: OrderedDict[int, tuple[float, Dict[str, any]]] = OrderedDict()
+        # Поколение последнего изменения настроек каждого пользователя (ограничено max_size)
+        self._generation = 0
+        self._changed: OrderedDict[int, int] = OrderedDict()
+        self._changed_floor = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def attach_redis(self, redis, shared: bool = True) -> None:
+        """
+        Подключение Redis: рассылка инвалидаций между процессами и, при shared, второй уровень кэша.
+
+        :param redis: Асинхронный клиент Redis.
+        :param shared: Хранить настройки в Redis как общий второй уровень кэша.
+        """
+        self.redis = redis
+        self.shared = shared
+        self.__fill_script = redis.register_script(FILL_IF_VERSION_LUA)
+        logger.info(f"Settings cache invalidation is broadcast via Redis"
+                    f"{' and settings are shared in Redis' if shared else ''}.")
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.key_prefix}:{user_id}"
+
+    def _version_key(self, user_id: int) -> str:
+        return f"{self.key_prefix}:{user_id}:version"
+
+    def _mark_changed(self, user_id: int) -> None:
+        """Отметка изменения настроек: начатые ранее заполнения кэша будут отклонены."""
+        self._generation += 1
+        self._changed[user_id] = self._generation
+        self._changed.move_to_end(user_id)
+        while len(self._changed) > self.max_size:
+            _, generation = self._changed.popitem(last=False)
+            self._changed_floor = max(self._changed_floor, generation)
+
+    def _changed_since(self, user_id: int, generation: int) -> bool:
+        # Ниже порога записи об изменениях вытеснены или сброшены — считаем, что изменение могло быть
+        if generation < self._changed_floor:
+            return True
+        return self._changed.get(user_id, 0) > generation
+
+    def _get_local(self, user_id: int) -> Optional[Dict[str, any]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, settings = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return settings
+
+    def _set_local(self, user_id: int, settings: Dict[str, any]) -> None:
+        self._entries[user_id] = (time.monotonic() + self.ttl, dict(settings))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, user_id: int) -> Optional[Dict[str, any]]:
+        """
+        Получение настроек пользователя из кэша.
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        :return: Копия словаря настроек или None при промахе.
+        """
+        settings = self._get_local(user_id)
+        if settings is None and self.shared:
+            generation = self._generation
+            try:
+                raw = await self.redis.get(self._key(user_id))
+            except Exception as e:
+                logger.error(f"Error reading settings cache from Redis: {e}")
+                raw = None
+            # Если настройки изменились во время чтения, ответ Redis мог устареть — считаем промахом
+            if raw is not None and not self._changed_since(user_id, generation):
+                settings = json.loads(raw)
+                self._set_local(user_id, settings)
+
+        if settings is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(settings)
+
+    async def version(self, user_id: int) -> CacheVersion:
+        """
+        Версия настроек пользователя перед чтением из БД; передаётся в set() при заполнении кэша.
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        :return: Версия кэша.
+        """
+        redis_version = None
+        if self.shared:
+            try:
+                raw = await self.redis.get(self._version_key(user_id))
+                redis_version = _text(raw) if raw is not None else ''
+            except Exception as e:
+                logger.error(f"Error reading settings version from Redis: {e}")
+        return self._generation, redis_version
+
+    async def set(self, user_id: int, settings: Dict[str, any], version: Optional[CacheVersion] = None) -> None:
+        """
+        Сохранение настроек пользователя в кэш.
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        :param settings: Словарь настроек пользователя.
+        :param version: Версия, полученная через version() до чтения из БД. Если она указана,
+                        настройки сохраняются, только пока не изменились; без неё настройки
+                        считаются новыми (запись в БД) и рассылаются остальным процессам.
+        """
+        if version is None:
+            self._mark_changed(user_id)
+            self._set_local(user_id, settings)
+            await self._publish_change(user_id, settings)
+            return
+
+        generation, redis_version = version
+        if self._changed_since(user_id, generation):
+            self.stale += 1
+            logger.debug(f"Stale settings read for user (ID: {user_id}) was not cached.")
+            return
+        self._set_local(user_id, settings)
+        if self.shared and redis_version is not None:
+            try:
+                await self.__fill_script(keys=[self._key(user_id), self._version_key(user_id)],
+                                         args=[redis_version, json.dumps(settings), self.redis_ttl])
+            except Exception as e:
+                logger.error(f"Error writing settings cache to Redis: {e}")
+
+    async def update(self, user_id: int, values: Dict[str, any]) -> None:
+        """
+        Сквозная запись: обновление закэшированных настроек после успешной записи в БД.
+        Локальная запись дополняется новыми значениями, общая в Redis удаляется,
+        остальные процессы получают инвалидацию.
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        :param values: Обновлённые поля.
+        """
+        self._mark_changed(user_id)
+        settings = self._get_local(user_id)
+        if settings is not None:
+            self._set_local(user_id, {**settings, **{k: v for k, v in values.items() if k in settings}})
+        await self._publish_change(user_id)
+
+    async def invalidate(self, user_id: int) -> None:
+        """
+        Удаление настроек пользователя из кэша во всех процессах.
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        """
+        self._mark_changed(user_id)
+        self._entries.pop(user_id, None)
+        await self._publish_change(user_id)
+
+    async def _publish_change(self, user_id: int, settings: Optional[Dict[str, any]] = None) -> None:
+        """
+        Фиксация изменения в Redis: новая версия, новые данные (или удаление устаревших)
+        и сообщение остальным процессам.
+        """
+        if self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                if self.shared:
+                    pipe.incr(self._version_key(user_id))
+                    pipe.expire(self._version_key(user_id), self.redis_ttl)
+                    if settings is None:
+                        pipe.delete(self._key(user_id))
+                    else:
+                        pipe.set(self._key(user_id), json.dumps(settings), ex=self.redis_ttl)
+                pipe.publish(self.channel, f"{self.origin}:{user_id}")
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error publishing settings change to Redis: {e}")
+
+    async def listen(self) -> None:
+        """
+        Приём инвалидаций от остальных процессов (запускается фоновой задачей).
+        После переподключения локальный уровень очищается: сообщения за время разрыва потеряны.
+        """
+        if self.redis is None:
+            return
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                self.clear()
+                async for message in pubsub.listen():
+                    origin, _, user_id = _text(message['data']).partition(':')
+                    if origin == self.origin:
+                        continue
+                    self._mark_changed(int(user_id))
+                    self._entries.pop(int(user_id), None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error receiving settings cache invalidations: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def clear(self) -> None:
+        """Очистка локального уровня кэша."""
+        self._entries.clear()
+        self._changed_floor = self._generation
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, any]:
+        """
+        Статистика работы кэша.
+
+        :return: Словарь с количеством попаданий, промахов, долей попаданий, размером кэша
+                 и числом отклонённых устаревших чтений.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "size": len(self._entries),
+            "stale": self.stale,
+        }
@@ -0,0 +1,109 @@
+import time
+
+from loguru import logger
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.service.metrics import DB_QUERY_DURATION, DB_QUERY_ERRORS
+
+
+DEFAULT_DATABASE_URL = 'sqlite+aiosqlite:///app/database/database.db'
+
+
+def build_engine(url: str = DEFAULT_DATABASE_URL,
+                 echo: bool = False,
+                 pool_size: int = 10,
+                 max_overflow: int = 20,
+                 pool_timeout: float = 30.0,
+                 pool_recycle: int = 1800,
+                 statement_cache_size: int = 500,
+                 sqlite_busy_timeout: int = 5000,
+                 sqlite_mmap_size: int = 268_435_456,
+                 sqlite_cache_size: int = -64_000) -> AsyncEngine:
+    """
+    Создание движка базы данных с профилем настроек под конкретную СУБД.
+
+    :param url: URL подключения к базе данных.
+    :param echo: Логирование всех SQL-запросов.
+    :param pool_size: Размер пула соединений (PostgreSQL).
+    :param max_overflow: Количество соединений сверх размера пула (PostgreSQL).
+    :param pool_timeout: Время ожидания свободного соединения из пула (в секундах).
+    :param pool_recycle: Время жизни соединения в пуле (в секундах).
+    :param statement_cache_size: Размер кэша подготовленных выражений asyncpg (PostgreSQL).
+    :param sqlite_busy_timeout: Время ожидания снятия блокировки (в миллисекундах, SQLite).
+    :param sqlite_mmap_size: Размер отображаемой в память области файла базы (в байтах, SQLite).
+    :param sqlite_cache_size: Размер страничного кэша (отрицательное значение — в КиБ, SQLite).
+    :return: Асинхронный движок SQLAlchemy.
+    """
+    backend = make_url(url).get_backend_name()
+
+    if backend == 'sqlite':
+        engine = create_async_engine(
+            url,
+            echo=echo,
+            connect_args={"timeout": sqlite_busy_timeout / 1000},
+        )
+        _apply_sqlite_pragmas(engine, sqlite_busy_timeout, sqlite_mmap_size, sqlite_cache_size)
+    elif backend == 'postgresql':
+        engine = create_async_engine(
+            url,
+            echo=echo,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=True,
+            connect_args={"prepared_statement_cache_size": statement_cache_size},
+        )
+    else:
+        engine = create_async_engine(url, echo=echo)
+
+    _instrument_queries(engine)
+    logger.info(f"Database engine created for backend '{backend}'.")
+    return engine
+
+
+def _apply_sqlite_pragmas(engine: AsyncEngine, busy_timeout: int, mmap_size: int, cache_size: int) -> None:
+    """
+    Настройка каждого нового соединения SQLite: WAL-журнал, synchronous=NORMAL,
+    время ожидания блокировок, mmap и размер страничного кэша.
+    """
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+        cursor.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        cursor.execute(f"PRAGMA cache_size={int(cache_size)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+
+def _instrument_queries(engine: AsyncEngine) -> None:
+    """
+    Измерение времени выполнения каждого SQL-запроса (метрики db_query_*).
+    Время начала хранится в info соединения стеком, так как выполнение может быть вложенным.
+    """
+
+    def operation(statement: str) -> str:
+        return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        DB_QUERY_DURATION.observe(time.perf_counter() - started, operation=operation(statement))
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def count_query_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('query_started'):
+            conn.info['query_started'].pop()
+        DB_QUERY_ERRORS.inc(operation=operation(exception_context.statement or ''))
@@ -1,4 +1,5 @@
-from sqlalchemy import String, Boolean, DateTime, Integer
+from dataclasses import dataclass
+from sqlalchemy import String, Boolean, DateTime, Integer, BigInteger, UniqueConstraint
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from datetime import datetime
@@ -17,7 +18,7 @@ class UserData(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
 
-    user_id: Mapped[int] = mapped_column(Integer, nullable=False, unique=True, index=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False, unique=True, index=True)
     username: Mapped[str] = mapped_column(String(150), nullable=True)
     fullname: Mapped[str] = mapped_column(String(250), nullable=True)
     is_admin: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -35,3 +36,59 @@ class UserData(Base):
     def __repr__(self):
         return (f'UserData(user_id={self.user_id!r}, username={self.username!r}, '
                 f'fullname={self.fullname!r}, language={self.language!r})')
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    Неизменяемый снимок данных пользователя, загружаемый один раз на обновление.
+    """
+    user_id: int
+    username: str
+    fullname: str
+    is_admin: bool
+    language: str
+    chat_model: str
+    token_balance: int
+    gpt4o_access: bool
+    scenary_access: bool
+    llama_access: bool
+
+
+class TokenLedger(Base):
+    """
+    Журнал движения токенов пользователей (только добавление записей).
+    """
+    __tablename__ = 'token_ledger'
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
+    delta: Mapped[int] = mapped_column(Integer, nullable=False)          # Изменение баланса (отрицательное — списание)
+    balance_after: Mapped[int] = mapped_column(Integer, nullable=False)  # Баланс после операции
+    reason: Mapped[str] = mapped_column(String(50), nullable=True)       # Причина операции (например, модель)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return (f'TokenLedger(user_id={self.user_id!r}, delta={self.delta!r}, '
+                f'balance_after={self.balance_after!r}, reason={self.reason!r})')
+
+
+class MediaAsset(Base):
+    """
+    Загруженные в Telegram статические файлы: file_id по хэшу содержимого.
+    file_id действителен только для загрузившего его бота, поэтому хранится и ID бота.
+    """
+    __tablename__ = 'media_assets'
+    __table_args__ = (UniqueConstraint('bot_id', 'content_hash'),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    bot_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False)  # SHA-256 содержимого файла
+    name: Mapped[str] = mapped_column(String(255), nullable=False)         # Имя файла (для отладки)
+    file_id: Mapped[str] = mapped_column(String(255), nullable=False)      # file_id в Telegram
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'MediaAsset(bot_id={self.bot_id!r}, name={self.name!r}, content_hash={self.content_hash!r})'
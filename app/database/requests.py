@@ -1,22 +1,91 @@
+import asyncio
+import time
 from datetime import datetime
 from loguru import logger
-from typing import Tuple, Dict, Optional, List
+from typing import Tuple, Dict, Optional, List, AsyncIterator, Any
 
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from sqlalchemy import select, update, insert, or_, case, text, table, column, literal_column, Row
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-from app.database.models import Base, UserData
+from app.database.models import Base, UserData, UserSnapshot, TokenLedger, MediaAsset
+from app.database.cache import SettingsCache
+from app.database.engine import build_engine
+from app.service.metrics import TOKENS_SPENT, TOKENS_CREDITED
+from app.database.search import (
+    SQLITE_SEARCH_TABLE,
+    MIN_INDEXED_QUERY_LENGTH,
+    create_search_index,
+    escape_like,
+    fts_phrase
+)
 
 
 class Database:
     """Класс для управления базой данных бота."""
 
-    __engine = create_async_engine(
-        url='sqlite+aiosqlite:///app/database/database.db',
-        echo=True
-    )
+    __engine = build_engine()
     __async_session = async_sessionmaker(__engine, expire_on_commit=False)
 
+    settings_cache = SettingsCache()
+
+    # Поля пользователя, хранящиеся в кэше настроек и в снимке пользователя
+    SETTINGS_COLUMNS = (
+        "username", "fullname", "is_admin", "language", "chat_model", "token_balance",
+        "gpt4o_access", "scenary_access", "llama_access",
+    )
+
+    USER_ROW_COLUMNS = (
+        "id", "user_id", "username", "fullname", "is_admin", "registration_date", "language",
+        "chat_model", "token_balance", "gpt4o_access", "scenary_access", "llama_access",
+    )
+
+    __search_indexed = False
+
+    ledger_batch_size = 100
+    # Предел буфера журнала на время недоступности БД и пауза между неудачными сбросами (в секундах)
+    ledger_max_buffer = 100_000
+    ledger_backoff_base = 1.0
+    ledger_backoff_max = 60.0
+    __ledger_buffer: List[Dict[str, any]] = []
+    __ledger_flush_task: Optional[asyncio.Task] = None
+    __ledger_failures = 0
+    __ledger_retry_at = 0.0
+    __ledger_dropping = 0
+    ledger_dropped = 0
+
+    @classmethod
+    async def configure(cls, url: str, **engine_options) -> None:
+        """
+        Пересоздание движка базы данных по конфигурации.
+
+        :param url: URL подключения к базе данных.
+        :param engine_options: Параметры профиля движка (см. build_engine).
+        """
+        await cls.__engine.dispose()
+        cls.__engine = build_engine(url, **engine_options)
+        cls.__async_session = async_sessionmaker(cls.__engine, expire_on_commit=False)
+
+    @classmethod
+    async def close(cls) -> None:
+        """Закрытие всех соединений с базой данных."""
+        await cls.__engine.dispose()
+
+    @classmethod
+    def configure_cache(cls, max_size: int, ttl: float, redis=None, shared: bool = False) -> None:
+        """
+        Настройка кэша настроек пользователей.
+
+        :param max_size: Максимальное количество записей в локальном кэше.
+        :param ttl: Время жизни записи в локальном кэше (в секундах).
+        :param redis: Асинхронный клиент Redis для рассылки инвалидаций между процессами.
+        :param shared: Хранить настройки в Redis как общий кэш между экземплярами бота.
+        """
+        cls.settings_cache = SettingsCache(max_size=max_size, ttl=ttl)
+        if redis is not None:
+            cls.settings_cache.attach_redis(redis, shared=shared)
+
     @classmethod
     async def create_tables(cls):
         """Создание таблиц в базе данных."""
@@ -24,6 +93,17 @@ class Database:
             await conn.run_sync(Base.metadata.create_all)
         logger.info("Database tables have been successfully created.")
 
+        try:
+            async with cls.__engine.begin() as conn:
+                cls.__search_indexed = await create_search_index(conn)
+            if cls.__search_indexed:
+                logger.info("User search index is ready.")
+            else:
+                logger.info(f"User search index is not supported for '{cls.__engine.dialect.name}', using LIKE search.")
+        except Exception as e:
+            cls.__search_indexed = False
+            logger.error(f"Error creating user search index, falling back to LIKE search: {e}")
+
     @classmethod
     async def add_user(cls, user_id: int, username: str, fullname: Optional[str] = "") -> Tuple[Optional[UserData], bool]:
         """
@@ -54,6 +134,58 @@ class Database:
             logger.error(f"Error adding user: {e}")
             return None, False
 
+    @classmethod
+    async def upsert_user(cls, user_id: int, username: str, fullname: Optional[str] = "") -> Tuple[Optional[Dict[str, any]], bool]:
+        """
+        Регистрация пользователя: для существующего пользователя обновляются имя и полное имя.
+        В PostgreSQL — один запрос INSERT ... ON CONFLICT DO UPDATE ... RETURNING (xmax = 0),
+        в SQLite — INSERT ... ON CONFLICT DO NOTHING RETURNING и UPDATE, если запись уже была.
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        :param username: Имя пользователя Telegram.
+        :param fullname: Полное имя пользователя.
+        :return: Кортеж со словарём настроек пользователя и флагом создания новой записи.
+        """
+        fullname = fullname or username
+        columns = [getattr(UserData, name) for name in cls.SETTINGS_COLUMNS]
+        values = dict(user_id=user_id, username=username, fullname=fullname, registration_date=datetime.utcnow())
+
+        try:
+            async with cls.__async_session() as session:
+                if cls.__engine.dialect.name == 'postgresql':
+                    stmt = pg_insert(UserData).values(**values)
+                    # xmax = 0 только у строки, вставленной этим запросом, а не обновлённой при конфликте
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[UserData.user_id],
+                        set_={"username": stmt.excluded.username, "fullname": stmt.excluded.fullname}
+                    ).returning(literal_column("(xmax = 0)").label("inserted"), *columns)
+                    row = (await session.execute(stmt)).one()
+                    created = row.inserted
+                else:
+                    stmt = sqlite_insert(UserData).values(**values).on_conflict_do_nothing(
+                        index_elements=[UserData.user_id]
+                    ).returning(*columns)
+                    row = (await session.execute(stmt)).one_or_none()
+                    created = row is not None
+                    if row is None:
+                        stmt = (
+                            update(UserData)
+                            .where(UserData.user_id == user_id)
+                            .values(username=username, fullname=fullname)
+                            .returning(*columns)
+                            .execution_options(synchronize_session=False)
+                        )
+                        row = (await session.execute(stmt)).one()
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Error upserting user: {e}")
+            return None, False
+
+        settings = {name: getattr(row, name) for name in cls.SETTINGS_COLUMNS}
+        await cls.settings_cache.set(user_id, settings)
+        logger.debug(f"User upserted: {username} (ID: {user_id}), created: {created}")
+        return settings, created
+
     @classmethod
     async def get_user(cls, user_id: int) -> Optional[UserData]:
         """
@@ -94,6 +226,7 @@ class Database:
                 result = await session.execute(stmt)
                 await session.commit()
                 if result.rowcount:
+                    await cls.settings_cache.update(user_id, kwargs)
                     logger.debug(f"User data (ID: {user_id}) updated: {kwargs}")
                     return True
                 logger.debug(f"Failed to update user data (ID: {user_id}).")
@@ -106,6 +239,7 @@ class Database:
     async def get_all_users(cls) -> List[UserData]:
         """
         Получение списка всех пользователей.
+        Загружает всю таблицу в память; для обхода большой базы используйте iter_users.
 
         :return: Список объектов пользователей.
         """
@@ -119,6 +253,101 @@ class Database:
             logger.error(f"Error retrieving list of users: {e}")
             return []
 
+    @classmethod
+    async def iter_users(cls, batch_size: int = 1000, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[Row]:
+        """
+        Потоковый обход пользователей с keyset-пагинацией по id.
+        Каждая порция читается отдельным запросом, поэтому память не растёт вместе с базой.
+
+        :param batch_size: Количество пользователей в одной порции.
+        :param filters: Фильтры по равенству полей, например {"chat_model": "gpt4o"}.
+        :return: Асинхронный генератор лёгких строк (Row) с полями пользователя.
+        :raises Exception: Ошибка БД при чтении очередной порции (после записи в лог).
+        """
+        conditions = []
+        for field, value in (filters or {}).items():
+            if field not in cls.USER_ROW_COLUMNS:
+                raise ValueError(f"Unknown user filter: {field}")
+            conditions.append(getattr(UserData, field) == value)
+
+        columns = [getattr(UserData, name) for name in cls.USER_ROW_COLUMNS]
+        last_id = 0
+        total = 0
+        while True:
+            stmt = (
+                select(*columns)
+                .where(UserData.id > last_id, *conditions)
+                .order_by(UserData.id)
+                .limit(batch_size)
+            )
+            try:
+                async with cls.__async_session() as session:
+                    rows = (await session.execute(stmt)).all()
+            except Exception as e:
+                # Обрыв обхода не должен выглядеть как его конец: вызывающий код получит неполный список
+                logger.error(f"Error iterating users after ID {last_id}: {e}")
+                raise
+
+            if not rows:
+                break
+            for row in rows:
+                yield row
+            total += len(rows)
+            last_id = rows[-1].id
+            if len(rows) < batch_size:
+                break
+
+        logger.debug(f"Users iterated: {total}")
+
+    @classmethod
+    async def search_users(cls, query: str, limit: int = 10, offset: int = 0) -> List[Row]:
+        """
+        Поиск пользователей по префиксу или подстроке имени пользователя и полного имени.
+        В SQLite используется индекс FTS5, в PostgreSQL — триграммные индексы.
+
+        :param query: Поисковый запрос (например, "@username" или часть имени).
+        :param limit: Максимальное количество результатов.
+        :param offset: Смещение для постраничного вывода.
+        :return: Список строк с полями user_id, username и fullname.
+        """
+        query = query.strip().lstrip('@')
+        if not query:
+            return []
+
+        columns = (UserData.user_id, UserData.username, UserData.fullname)
+        prefix = escape_like(query) + '%'
+        substring = '%' + escape_like(query) + '%'
+        dialect = cls.__engine.dialect.name
+
+        if dialect == 'sqlite' and cls.__search_indexed and len(query) >= MIN_INDEXED_QUERY_LENGTH:
+            search_table = table(SQLITE_SEARCH_TABLE, column("rowid"))
+            stmt = (
+                select(*columns)
+                .join(search_table, search_table.c.rowid == UserData.id)
+                .where(text(f"{SQLITE_SEARCH_TABLE} MATCH :phrase").bindparams(phrase=fts_phrase(query)))
+                .order_by(literal_column("rank"))
+            )
+        else:
+            if dialect == 'postgresql':
+                username_match, fullname_match = UserData.username.ilike, UserData.fullname.ilike
+            else:
+                username_match, fullname_match = UserData.username.like, UserData.fullname.like
+            pattern = substring if len(query) >= MIN_INDEXED_QUERY_LENGTH else prefix
+            stmt = (
+                select(*columns)
+                .where(or_(username_match(pattern, escape='\\'), fullname_match(pattern, escape='\\')))
+                .order_by(case((username_match(prefix, escape='\\'), 0), else_=1), UserData.id)
+            )
+
+        try:
+            async with cls.__async_session() as session:
+                rows = (await session.execute(stmt.limit(limit).offset(offset))).all()
+                logger.debug(f"User search for {query!r} returned {len(rows)} rows.")
+                return rows
+        except Exception as e:
+            logger.error(f"Error searching users: {e}")
+            return []
+
     @classmethod
     async def delete_user(cls, user_id: int) -> bool:
         """
@@ -129,10 +358,11 @@ class Database:
         """
         try:
             async with cls.__async_session() as session:
-                user = await session.get(UserData, user_id)
+                user = await session.scalar(select(UserData).where(UserData.user_id == user_id))
                 if user:
                     await session.delete(user)
                     await session.commit()
+                    await cls.settings_cache.invalidate(user_id)
                     logger.debug(f"User (ID: {user_id}) deleted from the database.")
                     return True
                 logger.debug(f"User (ID: {user_id}) not found for deletion.")
@@ -145,21 +375,23 @@ class Database:
     async def get_user_settings(cls, user_id: int) -> Optional[Dict[str, any]]:
         """
         Получение настроек пользователя.
+        Сначала настройки ищутся в кэше, при промахе читаются из базы данных и кэшируются.
 
         :param user_id: Уникальный ID пользователя Telegram.
         :return: Словарь с настройками пользователя или None, если пользователь не найден.
         """
         try:
+            settings = await cls.settings_cache.get(user_id)
+            # Записи старого формата (без части полей) считаются промахом
+            if settings is not None and all(name in settings for name in cls.SETTINGS_COLUMNS):
+                return settings
+
+            # Версия берётся до чтения: если настройки изменятся во время чтения, результат не кэшируется
+            version = await cls.settings_cache.version(user_id)
             user = await cls.get_user(user_id)
             if user:
-                settings = {
-                    "language": user.language,
-                    "chat_model": user.chat_model,
-                    "gpt4o_access": user.gpt4o_access,
-                    "scenary_access": user.scenary_access,
-                    "llama_access": user.llama_access,
-                    "token_balance": user.token_balance,
-                }
+                settings = {name: getattr(user, name) for name in cls.SETTINGS_COLUMNS}
+                await cls.settings_cache.set(user_id, settings, version=version)
                 logger.debug(f"User settings retrieved (ID: {user_id}): {settings}")
                 return settings
             logger.debug(f"Failed to retrieve settings for user (ID: {user_id}).")
@@ -168,6 +400,19 @@ class Database:
             logger.error(f"Error retrieving user settings: {e}")
             return None
 
+    @classmethod
+    async def get_user_snapshot(cls, user_id: int) -> Optional[UserSnapshot]:
+        """
+        Получение неизменяемого снимка данных пользователя (через кэш настроек).
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        :return: Снимок пользователя или None, если пользователь не найден.
+        """
+        settings = await cls.get_user_settings(user_id)
+        if settings is None:
+            return None
+        return UserSnapshot(user_id=user_id, **settings)
+
     @classmethod
     async def set_user_setting(cls, user_id: int, setting: str, value: any) -> bool:
         """
@@ -178,7 +423,8 @@ class Database:
         :param value: Значение настройки.
         :return: True, если настройка установлена успешно, иначе False.
         """
-        allowed_settings = {"language", "chat_model", "gpt4o_access", "scenary_access", "llama_access", "token_balance"}
+        # Баланс меняется только через debit_tokens, credit_tokens и adjust_tokens, чтобы каждое изменение попадало в журнал
+        allowed_settings = {"language", "chat_model", "gpt4o_access", "scenary_access", "llama_access"}
         if setting not in allowed_settings:
             logger.warning(f"Attempted to set unknown setting: {setting}")
             return False
@@ -194,12 +440,268 @@ class Database:
         :return: Название выбранной модели чата или None, если пользователь не найден.
         """
         try:
-            user = await cls.get_user(user_id)
-            if user:
-                logger.debug(f"User model retrieved (ID: {user_id}): {user.chat_model}")
-                return user.chat_model
+            settings = await cls.get_user_settings(user_id)
+            if settings:
+                logger.debug(f"User model retrieved (ID: {user_id}): {settings['chat_model']}")
+                return settings['chat_model']
             logger.debug(f"Failed to retrieve user model (ID: {user_id}).")
             return None
         except Exception as e:
             logger.error(f"Error retrieving user model: {e}")
             return None
+
+    @classmethod
+    async def get_media_file_id(cls, bot_id: int, content_hash: str) -> Optional[str]:
+        """
+        Получение file_id загруженного ранее файла.
+
+        :param bot_id: ID бота, загрузившего файл.
+        :param content_hash: SHA-256 содержимого файла.
+        :return: file_id или None, если файл ещё не загружался.
+        """
+        try:
+            async with cls.__async_session() as session:
+                return await session.scalar(
+                    select(MediaAsset.file_id).where(MediaAsset.bot_id == bot_id,
+                                                     MediaAsset.content_hash == content_hash)
+                )
+        except Exception as e:
+            logger.error(f"Error retrieving media file_id: {e}")
+            return None
+
+    @classmethod
+    async def save_media_file_id(cls, bot_id: int, content_hash: str, name: str, file_id: str) -> bool:
+        """
+        Сохранение file_id загруженного файла (с заменой устаревшего).
+
+        :param bot_id: ID бота, загрузившего файл.
+        :param content_hash: SHA-256 содержимого файла.
+        :param name: Имя файла.
+        :param file_id: file_id, полученный от Telegram.
+        :return: True, если запись сохранена, иначе False.
+        """
+        dialect_insert = pg_insert if cls.__engine.dialect.name == 'postgresql' else sqlite_insert
+        stmt = dialect_insert(MediaAsset).values(
+            bot_id=bot_id,
+            content_hash=content_hash,
+            name=name,
+            file_id=file_id,
+            created_at=datetime.utcnow()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MediaAsset.bot_id, MediaAsset.content_hash],
+            set_={"file_id": stmt.excluded.file_id, "name": stmt.excluded.name}
+        )
+        try:
+            async with cls.__async_session() as session:
+                await session.execute(stmt)
+                await session.commit()
+            logger.debug(f"Media file_id saved: {name} ({content_hash[:12]})")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving media file_id: {e}")
+            return False
+
+    @classmethod
+    async def debit_tokens(cls, user_id: int, amount: int, reason: Optional[str] = None) -> Optional[int]:
+        """
+        Атомарное списание токенов одним условным запросом UPDATE ... RETURNING.
+        Списание происходит только при достаточном балансе, поэтому параллельные
+        запросы одного пользователя не теряют обновления и не уводят баланс в минус.
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        :param amount: Количество списываемых токенов.
+        :param reason: Причина списания для журнала токенов.
+        :return: Новый баланс или None, если токенов недостаточно или пользователь не найден.
+        """
+        try:
+            async with cls.__async_session() as session:
+                stmt = (
+                    update(UserData)
+                    .where(UserData.user_id == user_id, UserData.token_balance >= amount)
+                    .values(token_balance=UserData.token_balance - amount)
+                    .returning(UserData.token_balance)
+                    .execution_options(synchronize_session=False)
+                )
+                balance = (await session.execute(stmt)).scalar_one_or_none()
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Error debiting tokens: {e}")
+            return None
+
+        if balance is None:
+            logger.debug(f"Not enough tokens to debit {amount} from user (ID: {user_id}).")
+            return None
+
+        await cls.settings_cache.update(user_id, {"token_balance": balance})
+        cls._record_ledger(user_id=user_id, delta=-amount, balance_after=balance, reason=reason)
+        TOKENS_SPENT.inc(amount, reason=reason or 'unknown')
+        logger.debug(f"Debited {amount} tokens from user (ID: {user_id}). Balance: {balance}")
+        return balance
+
+    @classmethod
+    async def credit_tokens(cls, user_id: int, amount: int, reason: Optional[str] = None) -> Optional[int]:
+        """
+        Атомарное начисление токенов (например, возврат за неудавшийся запрос).
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        :param amount: Количество начисляемых токенов.
+        :param reason: Причина начисления для журнала токенов.
+        :return: Новый баланс или None, если пользователь не найден.
+        """
+        try:
+            async with cls.__async_session() as session:
+                stmt = (
+                    update(UserData)
+                    .where(UserData.user_id == user_id)
+                    .values(token_balance=UserData.token_balance + amount)
+                    .returning(UserData.token_balance)
+                    .execution_options(synchronize_session=False)
+                )
+                balance = (await session.execute(stmt)).scalar_one_or_none()
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Error crediting tokens: {e}")
+            return None
+
+        if balance is None:
+            logger.debug(f"User (ID: {user_id}) not found for token credit.")
+            return None
+
+        await cls.settings_cache.update(user_id, {"token_balance": balance})
+        cls._record_ledger(user_id=user_id, delta=amount, balance_after=balance, reason=reason)
+        TOKENS_CREDITED.inc(amount, reason=reason or 'unknown')
+        logger.debug(f"Credited {amount} tokens to user (ID: {user_id}). Balance: {balance}")
+        return balance
+
+    @classmethod
+    async def adjust_tokens(cls, user_id: int, balance: int, reason: str = "admin", attempts: int = 3) -> Optional[int]:
+        """
+        Установка баланса токенов (например, администратором) с записью разницы в журнал токенов.
+        Баланс заменяется условным UPDATE по прочитанному значению, поэтому одновременное
+        списание не теряется: при конфликте чтение и запись повторяются.
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        :param balance: Новый баланс.
+        :param reason: Причина изменения для журнала токенов.
+        :param attempts: Количество попыток при одновременном изменении баланса.
+        :return: Новый баланс или None, если пользователь не найден или баланс не удалось изменить.
+        """
+        try:
+            async with cls.__async_session() as session:
+                for _ in range(attempts):
+                    current = (await session.execute(
+                        select(UserData.token_balance).where(UserData.user_id == user_id)
+                    )).scalar_one_or_none()
+                    if current is None:
+                        logger.debug(f"User (ID: {user_id}) not found for token adjustment.")
+                        return None
+                    stmt = (
+                        update(UserData)
+                        .where(UserData.user_id == user_id, UserData.token_balance == current)
+                        .values(token_balance=balance)
+                        .returning(UserData.token_balance)
+                        .execution_options(synchronize_session=False)
+                    )
+                    updated = (await session.execute(stmt)).scalar_one_or_none()
+                    await session.commit()
+                    if updated is not None:
+                        break
+                else:
+                    logger.warning(f"Token balance of user (ID: {user_id}) kept changing, adjustment was not applied.")
+                    return None
+        except Exception as e:
+            logger.error(f"Error adjusting tokens: {e}")
+            return None
+
+        delta = balance - current
+        await cls.settings_cache.update(user_id, {"token_balance": balance})
+        cls._record_ledger(user_id=user_id, delta=delta, balance_after=balance, reason=reason)
+        if delta > 0:
+            TOKENS_CREDITED.inc(delta, reason=reason)
+        elif delta < 0:
+            TOKENS_SPENT.inc(-delta, reason=reason)
+        logger.debug(f"Adjusted tokens of user (ID: {user_id}) by {delta}. Balance: {balance}")
+        return balance
+
+    @classmethod
+    def _record_ledger(cls, user_id: int, delta: int, balance_after: int, reason: Optional[str]) -> None:
+        """
+        Добавление записи в буфер журнала токенов.
+        При заполнении буфера запускается его сброс в базу данных, если после неудачного
+        сброса истекла пауза.
+        """
+        cls.__ledger_buffer.append({
+            "user_id": user_id,
+            "delta": delta,
+            "balance_after": balance_after,
+            "reason": reason,
+            "created_at": datetime.utcnow(),
+        })
+        cls._trim_ledger()
+        if len(cls.__ledger_buffer) >= cls.ledger_batch_size and time.monotonic() >= cls.__ledger_retry_at and (
+                cls.__ledger_flush_task is None or cls.__ledger_flush_task.done()):
+            cls.__ledger_flush_task = asyncio.create_task(cls.flush_ledger())
+
+    @classmethod
+    def _trim_ledger(cls) -> None:
+        """Отбрасывание самых старых записей журнала сверх ledger_max_buffer."""
+        overflow = len(cls.__ledger_buffer) - cls.ledger_max_buffer
+        if overflow <= 0:
+            return
+        del cls.__ledger_buffer[:overflow]
+        if not cls.__ledger_dropping:
+            logger.error(f"Token ledger buffer is full ({cls.ledger_max_buffer} entries), "
+                         f"the oldest entries are dropped until the database is available.")
+        cls.__ledger_dropping += overflow
+        cls.ledger_dropped += overflow
+
+    @classmethod
+    async def flush_ledger(cls, force: bool = False) -> int:
+        """
+        Пакетная запись накопленных операций в таблицу token_ledger.
+        После ошибки записи следующие сбросы откладываются с экспоненциально растущей паузой.
+
+        :param force: Сбросить буфер, не дожидаясь окончания паузы (при остановке).
+        :return: Количество записанных операций.
+        """
+        if not cls.__ledger_buffer or (not force and time.monotonic() < cls.__ledger_retry_at):
+            return 0
+
+        entries = cls.__ledger_buffer[:]
+        del cls.__ledger_buffer[:len(entries)]
+        try:
+            async with cls.__async_session() as session:
+                await session.execute(insert(TokenLedger), entries)
+                await session.commit()
+        except Exception as e:
+            cls.__ledger_buffer[:0] = entries
+            cls._trim_ledger()
+            cls.__ledger_failures += 1
+            delay = min(cls.ledger_backoff_base * 2 ** (cls.__ledger_failures - 1), cls.ledger_backoff_max)
+            cls.__ledger_retry_at = time.monotonic() + delay
+            logger.error(f"Error flushing token ledger ({len(cls.__ledger_buffer)} entries buffered), "
+                         f"retrying in {delay:.0f}s: {e}")
+            return 0
+
+        cls.__ledger_failures = 0
+        cls.__ledger_retry_at = 0.0
+        if cls.__ledger_dropping:
+            logger.error(f"Token ledger lost {cls.__ledger_dropping} entries while the database was unavailable.")
+            cls.__ledger_dropping = 0
+        logger.debug(f"Token ledger flushed: {len(entries)} entries.")
+        return len(entries)
+
+    @classmethod
+    async def run_ledger_flusher(cls, interval: float = 5.0) -> None:
+        """
+        Периодический сброс журнала токенов. Запускается фоновой задачей при старте бота.
+
+        :param interval: Интервал между сбросами (в секундах).
+        """
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await cls.flush_ledger()
+        finally:
+            await cls.flush_ledger(force=True)
@@ -0,0 +1,81 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+
+# Полнотекстовый индекс FTS5 с триграммным токенизатором: поддерживает поиск по префиксу и подстроке
+# и синхронизируется с таблицей user_data триггерами.
+SQLITE_SEARCH_TABLE = "user_search"
+
+SQLITE_SEARCH_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_SEARCH_TABLE} USING fts5(
+        username, fullname, content='user_data', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_data_search_ai AFTER INSERT ON user_data BEGIN
+        INSERT INTO {SQLITE_SEARCH_TABLE}(rowid, username, fullname)
+        VALUES (new.id, new.username, new.fullname);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_data_search_ad AFTER DELETE ON user_data BEGIN
+        INSERT INTO {SQLITE_SEARCH_TABLE}({SQLITE_SEARCH_TABLE}, rowid, username, fullname)
+        VALUES ('delete', old.id, old.username, old.fullname);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_data_search_au AFTER UPDATE OF username, fullname ON user_data BEGIN
+        INSERT INTO {SQLITE_SEARCH_TABLE}({SQLITE_SEARCH_TABLE}, rowid, username, fullname)
+        VALUES ('delete', old.id, old.username, old.fullname);
+        INSERT INTO {SQLITE_SEARCH_TABLE}(rowid, username, fullname)
+        VALUES (new.id, new.username, new.fullname);
+    END
+    """,
+]
+
+# Триграммные GIN-индексы ускоряют ILIKE '%...%' по имени и полному имени.
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_user_data_username_trgm ON user_data USING gin (username gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_user_data_fullname_trgm ON user_data USING gin (fullname gin_trgm_ops)",
+]
+
+# Минимальная длина запроса для триграммного индекса.
+MIN_INDEXED_QUERY_LENGTH = 3
+
+
+async def create_search_index(conn: AsyncConnection) -> bool:
+    """
+    Создание индексов для поиска пользователей по имени и полному имени.
+
+    :param conn: Асинхронное соединение с базой данных.
+    :return: True, если индексы созданы, или False, если СУБД их не поддерживает.
+    """
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        exists = await conn.scalar(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": SQLITE_SEARCH_TABLE}
+        )
+        for statement in SQLITE_SEARCH_DDL:
+            await conn.execute(text(statement))
+        if not exists:
+            # Заполнение индекса уже существующими пользователями
+            await conn.execute(text(f"INSERT INTO {SQLITE_SEARCH_TABLE}({SQLITE_SEARCH_TABLE}) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_SEARCH_DDL:
+            await conn.execute(text(statement))
+    else:
+        return False
+    return True
+
+
+def escape_like(value: str) -> str:
+    """Экранирование спецсимволов LIKE."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def fts_phrase(value: str) -> str:
+    """Преобразование пользовательского ввода во фразу FTS5."""
+    return '"' + value.replace('"', '""') + '"'
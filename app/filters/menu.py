@@ -0,0 +1,20 @@
+from typing import Any, Dict, Union
+
+from aiogram.filters import BaseFilter
+from aiogram.types import Message
+
+from app.keyboards.reply_keyboards import MENU_COMMANDS
+
+
+class MenuFilter(BaseFilter):
+    """
+    Фильтр кнопок главного меню: один поиск по словарю MENU_COMMANDS вместо
+    проверки текста сообщения на равенство с каждой подписью кнопки.
+    Команда кнопки передаётся обработчику в аргументе menu_command.
+    """
+
+    async def __call__(self, message: Message) -> Union[bool, Dict[str, Any]]:
+        command = MENU_COMMANDS.get(message.text)
+        if command is None:
+            return False
+        return {'menu_command': command}
@@ -1,5 +1,7 @@
 import asyncio
+import html
 import json
+from typing import Dict, Optional
 
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
@@ -9,17 +11,17 @@ from aiogram.fsm.context import FSMContext
 from loguru import logger
 
 from app.database.requests import Database
+from app.database.models import UserData, UserSnapshot
 from app.FSM.fsm import FSMSettings, FSMModel, FSMAdmin
 from aiogram.fsm.state import default_state
 from app.keyboards.inline_keyboards import (
     get_settings_keyboard,
     get_hide_keyboard,
     get_choose_model_keyboard,
-    get_approve_gpt4o_keyboard,
-    get_approve_scenary_keyboard,
     get_admin_keyboard,
     get_admin_user_editing_keyboard,
-    get_user_model_access_keyboard
+    get_user_model_access_keyboard,
+    get_user_search_keyboard
 )
 
 from app.keyboards.reply_keyboards import (
@@ -30,217 +32,253 @@ from app.service.helpers import get_gpt_response
 
 from aiogram.types.reply_keyboard_markup import ReplyKeyboardMarkup
 
-from app.lexicon.bot_lexicon import LEXICON_RU, LEXICON_EN
+from app.lexicon.i18n import t
 
 router = Router()
 
+SEARCH_PAGE_SIZE = 10  # Количество пользователей на странице результатов поиска
+# Поля пользователя, сохраняемые в данных FSM при редактировании
+USER_CARD_FIELDS = ('user_id', 'username', 'fullname', 'language', 'chat_model', 'token_balance',
+                    'gpt4o_access', 'scenary_access', 'llama_access')
+
+
+async def get_edited_user(state: FSMContext, message: Message, lang: str) -> Optional[Dict]:
+    """
+    Получение карточки редактируемого пользователя из данных FSM.
+    Если данные истекли раньше состояния, администратор возвращается в админ-панель.
+
+    :param state: Контекст FSM администратора.
+    :param message: Сообщение для ответа администратору.
+    :param lang: Язык администратора.
+    :return: Словарь с полями USER_CARD_FIELDS или None, если данных нет.
+    """
+    data = (await state.get_data()).get('user')
+    if data is None:
+        await state.set_state(FSMAdmin.entered_admin_panel)
+        await message.answer(t('admin_session_expired', lang), reply_markup=get_admin_keyboard(lang=lang))
+        logger.warning("Edited user data has expired, admin was returned to the admin panel.")
+    return data
+
 @router.callback_query(F.data == "enter_admin_panel")
-async def callback_enter_admin_panel(callback: CallbackQuery, state: FSMContext):
+async def callback_enter_admin_panel(callback: CallbackQuery, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик нажатия кнопки "Войти в админ-панель".
     """
 
-    settings = await Database.get_user_settings(callback.from_user.id)
+    cur_lang = user.language if user else 'ru'
 
-    if settings:
-        cur_lang = settings.get('language', 'ru')
-
-    if cur_lang == 'ru':
-        await callback.message.edit_text("Вы вошли в админ-панель.")
-        await callback.message.answer(text="Меню администратора", reply_markup=await get_admin_keyboard(lang='ru'))
-    else:
-        await callback.message.edit_text("You have entered the admin panel.")
-        await callback.message.answer(text="Admin menu", reply_markup=await get_admin_keyboard(lang='en'))
+    await callback.message.edit_text(t('admin_entered', cur_lang))
+    await callback.message.answer(text=t('admin_menu', cur_lang), reply_markup=get_admin_keyboard(lang=cur_lang))
 
     await state.set_state(FSMAdmin.entered_admin_panel)
     await callback.answer()
 
 @router.callback_query(F.data == "find_user", StateFilter(FSMAdmin.entered_admin_panel))
-async def callback_find_user(callback: CallbackQuery, state: FSMContext):
+async def callback_find_user(callback: CallbackQuery, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик нажатия кнопки "Поиск пользователей".
     """
-    settings = await Database.get_user_settings(callback.from_user.id)
-
-    if settings:
-        cur_lang = settings.get('language', 'ru')
+    cur_lang = user.language if user else 'ru'
 
     await state.set_state(FSMAdmin.searching_for_user)
 
-    if cur_lang == 'ru':
-        await callback.message.edit_text("Поиск пользователя")
-        await callback.message.answer("Введите ID пользователя:")
-    else:
-        await callback.message.edit_text("User search")
-        await callback.message.answer("Enter user ID:")
+    await callback.message.edit_text(t('user_search_title', cur_lang))
+    await callback.message.answer(t('user_search_prompt', cur_lang))
 
     await callback.answer()
 
+def user_card(user: UserData) -> Dict[str, any]:
+    """
+    Снимок данных пользователя для хранения в FSM: хранилище состояний сериализует данные в JSON,
+    поэтому ORM-объект туда не передаётся.
+
+    :param user: Объект пользователя.
+    :return: Словарь с данными пользователя.
+    """
+    return {field: getattr(user, field) for field in USER_CARD_FIELDS}
+
+
+async def show_found_user(message: Message, state: FSMContext, user_id: int, cur_lang: str) -> bool:
+    """
+    Отправка карточки найденного пользователя и переход к его редактированию.
+
+    :return: True, если пользователь найден, иначе False.
+    """
+    user_data = await Database.get_user(user_id)
+    if not user_data:
+        return False
+
+    card = user_card(user_data)
+    await message.answer(t('user_found', cur_lang, **card), reply_markup=get_admin_user_editing_keyboard(lang=cur_lang))
+
+    await state.update_data(data={"user": card})
+    await state.set_state(FSMAdmin.user_editing)
+    return True
+
 @router.message(F.text.isdigit(), StateFilter(FSMAdmin.searching_for_user))
-async def process_user_search(message: Message, state: FSMContext):
+async def process_user_search(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик ввода ID пользователя для поиска.
     """
     user_id = int(message.text.strip())
 
-    user_settings = await Database.get_user_settings(user_id)
-    user_data = await Database.get_user(user_id)
+    cur_lang = user.language if user else 'ru'
+
+    if not await show_found_user(message, state, user_id, cur_lang):
+        await message.answer(t('user_not_found', cur_lang))
 
-    settings = await Database.get_user_settings(message.from_user.id)
+@router.message(F.text, StateFilter(FSMAdmin.searching_for_user))
+async def process_user_search_query(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
+    """
+    Обработчик поиска пользователей по @username или имени (по префиксу и подстроке).
+    """
+    query = message.text.strip()
+
+    cur_lang = user.language if user else 'ru'
+
+    users = await Database.search_users(query, limit=SEARCH_PAGE_SIZE + 1)
+
+    if not users:
+        await message.answer(t('user_not_found', cur_lang))
+        return
+
+    await state.update_data(data={"search_query": query})
 
-    if settings:
-        cur_lang = settings.get('language', 'ru')
+    text = t('search_results', cur_lang, query=html.escape(query))
 
-    if user_settings:
-        if cur_lang == 'ru':
-            await message.answer(f"Пользователь найден: {user_data.fullname}\n\n" \
-                                 f"Язык пользователя: {user_data.language}\n" \
-                                 f"Выбранная модель: {user_data.chat_model}\n" \
-                                 f"Баланс токенов: {user_data.token_balance}\n\n" \
-                                 f"Пользователь весь ваш. Что прикажете с ним сделать? 😏",
-                                 reply_markup=await get_admin_user_editing_keyboard())
-        else:
-            await message.answer(f"User found: {user_data.fullname}\n\n" \
-                                 f"User language: {user_data.language}\n" \
-                                 f"Selected model: {user_data.chat_model}\n" \
-                                 f"Token balance: {user_data.token_balance}\n\n" \
-                                 f"What do you want to do with this user? 😏",
-                                 reply_markup=await get_admin_user_editing_keyboard())
+    await message.answer(text, reply_markup=get_user_search_keyboard(users[:SEARCH_PAGE_SIZE],
+                                                                           page=0,
+                                                                           has_next=len(users) > SEARCH_PAGE_SIZE,
+                                                                           lang=cur_lang))
 
-        await state.update_data(data={"user": user_data})
-        await state.set_state(FSMAdmin.user_editing)
+@router.callback_query(F.data.startswith("search_page_"), StateFilter(FSMAdmin.searching_for_user))
+async def callback_search_page(callback: CallbackQuery, state: FSMContext, user: Optional[UserSnapshot]):
+    """
+    Обработчик переключения страниц результатов поиска.
+    """
+    page = int(callback.data.split("_")[-1])
+    query = (await state.get_data()).get('search_query', '')
+
+    cur_lang = user.language if user else 'ru'
 
-    else:
-        if cur_lang == 'ru':
-            await message.answer("Пользователь не найден.")
-        else:
-            await message.answer("User not found.")
+    users = await Database.search_users(query, limit=SEARCH_PAGE_SIZE + 1, offset=page * SEARCH_PAGE_SIZE)
 
+    await callback.message.edit_reply_markup(reply_markup=get_user_search_keyboard(users[:SEARCH_PAGE_SIZE],
+                                                                                         page=page,
+                                                                                         has_next=len(users) > SEARCH_PAGE_SIZE,
+                                                                                         lang=cur_lang))
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("pick_user_"), StateFilter(FSMAdmin.searching_for_user))
+async def callback_pick_user(callback: CallbackQuery, state: FSMContext, user: Optional[UserSnapshot]):
+    """
+    Обработчик выбора пользователя из результатов поиска.
+    """
+    user_id = int(callback.data.split("_")[-1])
+
+    cur_lang = user.language if user else 'ru'
+
+    await callback.message.delete()
+    if not await show_found_user(callback.message, state, user_id, cur_lang):
+        await callback.message.answer(t('user_not_found', cur_lang))
+
+    await callback.answer()
 
 
 @router.callback_query(F.data == "change_user_model", StateFilter(FSMAdmin.user_editing))
-async def callback_change_user_model(callback: CallbackQuery, state: FSMContext):
+async def callback_change_user_model(callback: CallbackQuery, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик изменения модели чата для пользователя.
     """
-    data = (await state.get_data())['user']
-    settings = await Database.get_user_settings(data.user_id)
-
-    if settings:
-        cur_lang = settings.get('language', 'ru')
+    cur_lang = user.language if user else 'ru'
+    data = await get_edited_user(state, callback.message, cur_lang)
+    if data is None:
+        await callback.answer()
+        return
 
     await state.set_state(FSMAdmin.changing_user_model)
 
     await callback.message.delete()
-    if cur_lang == 'ru':
-        await callback.message.answer(f"Изменить доступ к модели для пользователя {data.fullname} (@{data.username}):",
-                                      reply_markup=await get_user_model_access_keyboard(gpt=data.gpt4o_access,
-                                                                                        scenary=data.scenary_access,
-                                                                                        llama=data.llama_access,
-                                                                                        lang='ru'))
-    else:
-        await callback.message.answer(f"Choose the chat model for the user {data.fullname} (@{data.username}):",
-                                      reply_markup=await get_user_model_access_keyboard(gpt=data.gpt4o_access,
-                                                                                        scenary=data.scenary_access,
-                                                                                        llama=data.llama_access,
-                                                                                        lang='en'))
+    await callback.message.answer(t('user_access_prompt', cur_lang, **data),
+                                  reply_markup=get_user_model_access_keyboard(gpt=data['gpt4o_access'],
+                                                                              scenary=data['scenary_access'],
+                                                                              llama=data['llama_access'],
+                                                                              lang=cur_lang))
 
     await callback.answer()
 
 
 @router.callback_query(F.data.startswith("access"), StateFilter(FSMAdmin.changing_user_model))
-async def callback_access(callback: CallbackQuery, state: FSMContext):
+async def callback_access(callback: CallbackQuery, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик доступа к модели GPT4o для пользователя.
     """
     mdl = callback.data.split('_')[1]
-    data = (await state.get_data())['user']
-    if mdl == 'gpt4o':
-        data.gpt4o_access = edit = not data.gpt4o_access
-    elif mdl == 'scenary':
-        data.scenary_access = edit = not data.scenary_access
-    else:
-        data.llama_access = edit = not data.llama_access
+    cur_lang = user.language if user else 'ru'
+    data = await get_edited_user(state, callback.message, cur_lang)
+    if data is None:
+        await callback.answer()
+        return
+    setting = f"{mdl}_access"
+    data[setting] = edit = not data[setting]
 
     await state.update_data(data={'user': data})
-    await Database.set_user_setting(user_id=data.user_id, setting=f"{mdl}_access", value=edit)
-    settings = await Database.get_user_settings(data.user_id)
-
-    if settings:
-        cur_lang = settings.get('language', 'ru')
+    await Database.set_user_setting(user_id=data['user_id'], setting=setting, value=edit)
 
     await callback.message.delete()
-    if cur_lang == 'ru':
-        await callback.message.answer(f"Настройки доступа были изменены успешно для пользователя {data.fullname} (@{data.username}):",
-                                      reply_markup=await get_admin_user_editing_keyboard())
-    else:
-        await callback.message.answer(f"Access settings have been edited successfully for the user {data.fullname} (@{data.username}):",
-                                      reply_markup=await get_admin_user_editing_keyboard())
+    await callback.message.answer(t('user_access_changed', cur_lang, **data),
+                                  reply_markup=get_admin_user_editing_keyboard(lang=cur_lang))
 
     await state.set_state(FSMAdmin.user_editing)
     await callback.answer()
 
 @router.callback_query(F.data == "change_user_token_balance", StateFilter(FSMAdmin.user_editing))
-async def callback_change_user_token_balance(callback: CallbackQuery, state: FSMContext):
+async def callback_change_user_token_balance(callback: CallbackQuery, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик изменения баланса токенов для пользователя.
     """
-    data = (await state.get_data())['user']
-    settings = await Database.get_user_settings(data.user_id)
-
-    if settings:
-        cur_lang = settings.get('language', 'ru')
+    cur_lang = user.language if user else 'ru'
+    data = await get_edited_user(state, callback.message, cur_lang)
+    if data is None:
+        await callback.answer()
+        return
 
     await state.set_state(FSMAdmin.changing_user_token_balance)
 
     await callback.message.delete()
-    if cur_lang == 'ru':
-        await callback.message.answer(f"Текущий баланс токенов пользователя {data.fullname} (@{data.username}): {data.token_balance}\n\n"
-                                      f"Введите новое значение:")
-    else:
-        await callback.message.answer(f"Current token balance for the user {data.fullname} (@{data.username}): {data.token_balance}\n\n"
-                                      f"Enter new value:")
+    await callback.message.answer(t('user_balance_prompt', cur_lang, **data))
 
     await callback.answer()
 
 
 @router.message(F.text.isdigit(), StateFilter(FSMAdmin.changing_user_token_balance))
-async def process_user_token_balance(message: Message, state: FSMContext):
+async def process_user_token_balance(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик ввода нового баланса токенов для пользователя.
     """
     new_balance = int(message.text.strip())
-    data = (await state.get_data())['user']
-    user = await Database.get_user(data.user_id)
-    await Database.set_user_setting(user_id=data.user_id, setting="token_balance", value=new_balance)
-    settings = await Database.get_user_settings(data.user_id)
-
-    if settings:
-        cur_lang = settings.get('language', 'ru')
+    cur_lang = user.language if user else 'ru'
+    data = await get_edited_user(state, message, cur_lang)
+    if data is None:
+        return
+    # Изменение баланса записывается в журнал токенов, как и списания
+    if await Database.adjust_tokens(user_id=data['user_id'], balance=new_balance, reason="admin") is None:
+        await message.answer(t('user_balance_not_changed', cur_lang, **data))
+        return
+    data['token_balance'] = new_balance
 
     await message.delete()
-    if cur_lang == 'ru':
-        await message.answer(f"Баланс токенов пользователя {data.fullname} (@{data.username}) успешно изменен на {new_balance}.",
-                             reply_markup=await get_admin_user_editing_keyboard())
-    else:
-        await message.answer(f"Token balance for the user {data.fullname} (@{data.username}) has been successfully changed to {new_balance}.",
-                             reply_markup=await get_admin_user_editing_keyboard())
+    await message.answer(t('user_balance_changed', cur_lang, **data),
+                         reply_markup=get_admin_user_editing_keyboard(lang=cur_lang))
 
     await state.set_state(FSMAdmin.user_editing)
     await state.update_data(data={"user": data})
 
 @router.message(StateFilter(FSMAdmin.changing_user_token_balance))
-@router.message(StateFilter(FSMAdmin.searching_for_user))
-async def process_user_token_balance_invalid(message: Message, state: FSMContext):
+async def process_user_token_balance_invalid(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик неверного ввода баланса токенов для пользователя.
     """
-    settings = await Database.get_user_settings(message.from_user.id)
-
-    if settings:
-        cur_lang = settings.get('language', 'ru')
+    cur_lang = user.language if user else 'ru'
 
-    if cur_lang == 'ru':
-        await message.answer("Введите число.")
-    else:
-        await message.answer("Enter a number.")
+    await message.answer(t('enter_number', cur_lang))
@@ -1,5 +1,6 @@
 import asyncio
 import json
+from typing import Optional
 
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
@@ -9,32 +10,71 @@ from aiogram.fsm.context import FSMContext
 from loguru import logger
 
 from app.database.requests import Database
+from app.database.models import UserSnapshot
 from app.FSM.fsm import FSMSettings, FSMModel, FSMUser
 from aiogram.fsm.state import default_state
 from app.keyboards.inline_keyboards import (
     get_settings_keyboard,
-    get_hide_keyboard,
+    get_hide_chat_keyboard,
     get_choose_model_keyboard,
-    get_approve_gpt4o_keyboard,
-    get_approve_llama3_keyboard,
-    get_approve_scenary_keyboard,
+    get_approve_model_keyboard,
     get_approve_keyboard
 )
 
 from app.keyboards.reply_keyboards import (
     get_menu_keyboard
 )
+from app.filters.menu import MenuFilter
 
-from app.service.helpers import get_gpt_response, get_llama_response, get_scenary_response
+from app.service.generations import generations, deliver_answer
+from app.service.jobs import jobs
+from app.service import faq
+from app.service.media import media, AGREEMENT_PDF
 
 from aiogram.types.reply_keyboard_markup import ReplyKeyboardMarkup
 
-from app.lexicon.bot_lexicon import LEXICON_RU, LEXICON_EN
+from app.lexicon.i18n import catalog, t
 
-from aiogram.types import FSInputFile
 
 router = Router()
 
+# Названия моделей для сообщений пользователю
+MODEL_NAMES = {'gpt4o': 'GPT4o', 'llama3': 'Llama3', 'scenary': 'Scenary'}
+
+
+async def answer_with_model(message: Message, cur_lang: str, model: str, cost: int) -> None:
+    """
+    Ответ модели на сообщение пользователя: в процессе бота или, в режиме исполнителей,
+    через очередь заданий. Правило возврата токенов описано в deliver_answer.
+
+    :param message: Сообщение пользователя.
+    :param cur_lang: Язык пользователя.
+    :param model: Модель бота ('gpt4o', 'llama3' или 'scenary').
+    :param cost: Стоимость запроса (в токенах), уже списанная с баланса.
+    """
+    user_id = message.from_user.id
+    if jobs.enabled:
+        try:
+            await jobs.enqueue(user_id=user_id, chat_id=message.chat.id, lang=cur_lang, model=model,
+                               cost=cost, prompt=message.text)
+        except Exception:
+            await Database.credit_tokens(user_id=user_id, amount=cost, reason=f"{model}_refund")
+            raise
+        return
+
+    await deliver_answer(message.bot, message.chat.id, user_id, cur_lang, model, cost, message.text)
+
+
+@router.message(MenuFilter())
+async def menu_dispatch(message: Message, state: FSMContext, user: Optional[UserSnapshot], menu_command: str):
+    """
+    Обработчик кнопок главного меню: команда кнопки определяется фильтром MenuFilter,
+    обработчик команды берётся из MENU_HANDLERS.
+    Регистрируется раньше обработчиков общения с моделями, чтобы кнопки меню работали и во время диалога.
+    """
+    await MENU_HANDLERS[menu_command](message, state, user)
+
+
 @router.message(Command("start"))
 async def cmd_start(message: Message, state: FSMContext):
     """
@@ -45,168 +85,99 @@ async def cmd_start(message: Message, state: FSMContext):
     username = message.from_user.username or ""
     fullname = message.from_user.full_name or ""
 
-    user, created = await Database.add_user(user_id=user_id, username=username, fullname=fullname)
-
-    settings = await Database.get_user_settings(user_id)
+    settings, created = await Database.upsert_user(user_id=user_id, username=username, fullname=fullname)
 
     if settings:
         cur_lang = settings.get('language', 'ru')
     else:
         cur_lang = 'ru'  # Default language
 
-    if not created:
+    if created:
         await state.set_state(FSMUser.approving_agreement)
-        welcome_text_ru = f"Добро пожаловать, <b>{fullname}</b>!\n\n" \
-                          f"Перед использованием бота вам следует ознакомиться с политикой конфиденциальности и подтвердить принятие пользовательского соглашения ☝️"
-        welcome_text_en = f"Welcome, <b>{fullname}</b>!\n\n" \
-                          f"Before using the bot, please familiarize yourself with the privacy policy and accept the user agreement ☝️"
-
-        # Путь к локальному PDF-файлу
-        pdf_path = "app\database\Пользовательское соглашение.pdf"
-
-        ## Используем FSInputFile для отправки локального файла
-        pdf_file = FSInputFile(pdf_path)
-
-        await message.answer_document(pdf_file, caption="Пользовательское соглашние 📄")
-        if cur_lang == 'ru':
-            await message.answer(text=welcome_text_ru, reply_markup=await get_approve_keyboard())
-        else:
-            await message.answer(text=welcome_text_en, reply_markup=await get_approve_keyboard())
 
+        # Соглашение загружается в Telegram один раз и дальше отправляется по file_id
+        await media.send_document(message, AGREEMENT_PDF, caption=t('agreement_caption', cur_lang))
+        await message.answer(text=t('welcome_new', cur_lang, fullname=fullname), reply_markup=get_approve_keyboard(lang=cur_lang))
         return
 
-    else:
-        welcome_text_ru = f"С возвращением, <b>{fullname}</b>!"
-        welcome_text_en = f"Welcome, <b>{fullname}</b>!"
-
-    if cur_lang == 'ru':
-        await message.answer(LEXICON_RU['start'].format(hello=welcome_text_ru), reply_markup=await get_menu_keyboard(lang='ru'))
-    else:
-        await message.answer(LEXICON_EN['start'].format(hello=welcome_text_en), reply_markup=await get_menu_keyboard(lang='en'))
+    await message.answer(t('start', cur_lang, hello=t('welcome_back', cur_lang, fullname=fullname)),
+                         reply_markup=get_menu_keyboard(lang=cur_lang))
 
     logger.info(f"User {username} (ID: {user_id}) started the bot.")
 
 
 @router.callback_query(F.data == 'approve', StateFilter(FSMUser.approving_agreement))
-async def callback_approve(callback: CallbackQuery, state: FSMContext):
+async def callback_approve(callback: CallbackQuery, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик согласия пользователя с политикой конфиденциальности.
     """
-    user_id = callback.from_user.id
-    username = callback.from_user.username or ""
     fullname = callback.from_user.full_name or ""
 
-    settings = await Database.get_user_settings(user_id)
-
-    if settings:
-        cur_lang = settings.get('language', 'ru')
-    else:
-        cur_lang = 'ru'  # Default language
+    cur_lang = user.language if user else 'ru'  # Default language
 
     await state.set_state(default_state)
 
-    welcome_text_ru = f"С возвращением, <b>{fullname}</b>!"
-    welcome_text_en = f"Welcome, <b>{fullname}</b>!"
-
     await callback.message.delete()
-    if cur_lang == 'ru':
-        await callback.message.answer(LEXICON_RU['start'].format(hello=welcome_text_ru), reply_markup=await get_menu_keyboard(lang='ru'))
-    else:
-        await callback.message.answer(LEXICON_EN['start'].format(hello=welcome_text_en), reply_markup=await get_menu_keyboard(lang='en'))
+    await callback.message.answer(t('start', cur_lang, hello=t('welcome_back', cur_lang, fullname=fullname)),
+                                  reply_markup=get_menu_keyboard(lang=cur_lang))
 
     await callback.answer()
 
-@router.message(F.text == "🤖 Изменить модель")
-@router.message(F.text == "🤖 Change Model")
-async def change_model(message: Message, state: FSMContext):
+async def change_model(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик команды /chat и сообщения "🤖 Изменить модель".
     Предлагает выбрать модель для чата.
     """
     user_id = message.from_user.id
-    settings = await Database.get_user_settings(user_id=user_id)
-    if settings:
-        cur_lang = settings.get('language', 'ru')
-    else:
-        cur_lang = 'ru'  # Default language
+    cur_lang = user.language if user else 'ru'  # Default language
 
     await state.set_state(FSMModel.choosing_model)
 
-    settings = await Database.get_user_settings(user_id=user_id)
-    gpt4o = settings['gpt4o_access']
-    scenary = settings['scenary_access']
-    llama = settings['llama_access']
-
-    if cur_lang == 'ru':
-        text = "Выберите модель для чата.\n\nВам доступны следующие модели:"
-    else:
-        text = "Choose a chat model.\n\nYou have access to the folowing models:"
+    gpt4o = user.gpt4o_access if user else False
+    scenary = user.scenary_access if user else False
+    llama = user.llama_access if user else False
 
-    await message.answer(text, reply_markup=await get_choose_model_keyboard(gpt4o=gpt4o, scenary=scenary, llama=llama, lang=cur_lang))
+    await message.answer(t('choose_model', cur_lang),
+                         reply_markup=get_choose_model_keyboard(gpt4o=gpt4o, scenary=scenary, llama=llama, lang=cur_lang))
     logger.info(f"User (ID: {user_id}) is choosing a model with ChatGPT.")
 
-@router.message(F.text == "⚙️ Настройки")
-@router.message(F.text == "⚙️ Settings")
-async def cmd_settings(message: Message, state: FSMContext):
+async def cmd_settings(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик команды /settings.
     Показывает текущие настройки пользователя и предоставляет варианты изменения.
     """
     user_id = message.from_user.id
-    settings = await Database.get_user_settings(user_id=user_id)
 
-    if not settings:
-        if settings.get('language') == 'en':
-            await message.answer("Your profile was not found. Please use /start to register.")
-        else:
-            await message.answer("Ваш профиль не найден. Пожалуйста, используйте /start для регистрации.")
+    if not user:
+        await message.answer(t('profile_not_found', message.from_user.language_code))
         return
 
-    cur_lang = settings.get('language', 'ru')
+    cur_lang = user.language
 
-    if cur_lang == 'ru':
-        settings_text = "<b>Ваши текущие настройки:</b>\n\n"
-    else:
-        settings_text = "<b>Your current settings:</b>\n\n"
-
-    is_admin = (await Database.get_user(user_id=user_id)).is_admin
-
-    keyboard = await get_settings_keyboard(lang=cur_lang, is_admin=is_admin)
+    keyboard = get_settings_keyboard(lang=cur_lang, is_admin=user.is_admin)
 
-    await message.answer(settings_text, reply_markup=keyboard)
+    await message.answer(t('settings_title', cur_lang), reply_markup=keyboard)
     logger.info(f"User (ID: {user_id}) requested settings.")
 
 @router.callback_query(F.data == 'change_language')
-async def change_language(callback: CallbackQuery, state: FSMContext):
+async def change_language(callback: CallbackQuery, state: FSMContext, user: Optional[UserSnapshot]):
     """
-    Обработчик для изменения языка пользователя.
+    Обработчик для изменения языка пользователя: языки каталога переключаются по кругу.
     """
     user_id = callback.from_user.id
-    settings = await Database.get_user_settings(user_id=user_id)
-    if settings:
-        cur_lang = settings.get('language', 'ru')
-    else:
-        cur_lang = 'ru'  # Default language
+    cur_lang = catalog.lang(user.language if user else None)
 
     await callback.message.delete()
 
     await state.set_state(FSMSettings.waiting_for_language)
-    is_admin = (await Database.get_user(user_id=user_id)).is_admin
-
-    if cur_lang == 'ru':
-        await Database.set_user_setting(user_id=user_id, setting='language', value='en')
-        new_lang = 'en'
-        response_text = "Language changed to EN."
-        await callback.message.answer("<b>Your current settings:</b>\n\n", reply_markup=await get_settings_keyboard(lang='en', is_admin=is_admin))
-        await callback.message.answer("Settings have been changed", reply_markup=await get_menu_keyboard(lang='en'))
-    else:
-        await Database.set_user_setting(user_id=user_id, setting='language', value='ru')
-        new_lang = 'ru'
-        response_text = "Язык изменен на RU."
-        await callback.message.answer("<b>Ваши текущие настройки:</b>\n\n", reply_markup=await get_settings_keyboard(lang='ru', is_admin=is_admin))
-        await callback.message.answer("Настройки были изменены", reply_markup=await get_menu_keyboard(lang='ru'))
+    is_admin = user.is_admin if user else False
+
+    new_lang = catalog.locales[(catalog.locales.index(cur_lang) + 1) % len(catalog.locales)]
+    await Database.set_user_setting(user_id=user_id, setting='language', value=new_lang)
+    await callback.message.answer(t('settings_title', new_lang), reply_markup=get_settings_keyboard(lang=new_lang, is_admin=is_admin))
+    await callback.message.answer(t('settings_changed', new_lang), reply_markup=get_menu_keyboard(lang=new_lang))
 
-    await callback.answer(text=response_text)
+    await callback.answer(text=t('language_changed', new_lang, lang=new_lang.upper()))
     logger.info(f"User (ID: {user_id}) changed language to {new_lang.upper()}.")
 
 @router.callback_query(F.data == "hide")
@@ -215,9 +186,8 @@ async def callback_hide(callback: CallbackQuery, state: FSMContext):
     Обработчик для отмены текущего действия.
     """
     user_id = callback.from_user.id
-    settings = await Database.get_user_settings(user_id=user_id)
 
-    if state.get_state() not in (FSMModel.waiting_for_message_gpt4o, FSMModel.waiting_for_message_llama3, FSMModel.waiting_for_message_scenary):
+    if await state.get_state() not in (FSMModel.waiting_for_message_gpt4o, FSMModel.waiting_for_message_llama3, FSMModel.waiting_for_message_scenary):
         await state.clear()
 
     await callback.message.delete()
@@ -226,251 +196,167 @@ async def callback_hide(callback: CallbackQuery, state: FSMContext):
 
     await callback.answer()
 
+@router.callback_query(F.data == "hide_chat")
+async def callback_hide_chat(callback: CallbackQuery):
+    """
+    Обработчик скрытия приглашения к диалогу с моделью: выполняющаяся генерация отменяется.
+    """
+    user_id = callback.from_user.id
+
+    if generations.cancel(user_id) or (jobs.enabled and await jobs.cancel(user_id)):
+        logger.info(f"User (ID: {user_id}) cancelled the running generation.")
+
+    await callback.message.delete()
+
+    logger.info(f"User (ID: {user_id}) hided the chat prompt.")
+
+    await callback.answer()
+
 @router.message(Command("cancel"))
-async def cmd_cancel(message: Message, state: FSMContext):
+async def cmd_cancel(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик команды "/cancel".
     Отменяет текущее действие пользователя.
     """
-    cur_lang = (await Database.get_user_settings(user_id=message.from_user.id))['language']
+    cur_lang = user.language if user else 'ru'
+    if generations.cancel(message.from_user.id) or (jobs.enabled and await jobs.cancel(message.from_user.id)):
+        logger.info(f"User (ID: {message.from_user.id}) cancelled the running generation.")
     await state.clear()
 
-    await message.answer("Действие отменено" if cur_lang == 'ru' else "Action cancelled", reply_markup=await get_menu_keyboard(lang=cur_lang))
+    await message.answer(t('action_cancelled', cur_lang), reply_markup=get_menu_keyboard(lang=cur_lang))
 
 
 @router.callback_query(F.data.startswith("choice_"), StateFilter(FSMModel.choosing_model))
-async def callback_choose_model(callback: CallbackQuery, state: FSMContext):
+async def callback_choose_model(callback: CallbackQuery, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик выбора модели для чата.
     """
     model = callback.data.split("_")[-1]
     user_id = callback.from_user.id
-    settings = await Database.get_user_settings(user_id=user_id)
-    if settings:
-        cur_lang = settings.get('language', 'ru')
-    else:
-        cur_lang = 'ru'  # Default language
+    cur_lang = user.language if user else 'ru'  # Default language
 
-    if model == "gpt4o":
-        if cur_lang == 'ru':
-            text = LEXICON_RU['gpt4o_choice']
-        else:
-            text = LEXICON_EN['gpt4o_choice']
-        keyboard = await get_approve_gpt4o_keyboard(lang=cur_lang)
-    elif model == "llama3":
-        if cur_lang == 'ru':
-            text = LEXICON_RU['llama3_choice']
-        else:
-            text = LEXICON_EN['llama3_choice']
-        keyboard = await get_approve_llama3_keyboard(lang=cur_lang)
-    elif model == "scenary":
-        if cur_lang == 'ru':
-            text = LEXICON_RU['scenary_choice']
-        else:
-            text = LEXICON_EN['scenary_choice']
-        keyboard = await get_approve_scenary_keyboard(lang=cur_lang)
+    if model in MODEL_NAMES:
+        await callback.message.edit_text(t(f'{model}_choice', cur_lang), reply_markup=get_approve_model_keyboard(model, lang=cur_lang))
     else:
-        if cur_lang == 'ru':
-            text = "Неизвестная модель."
-        else:
-            text = "Unknown model."
-        keyboard = InlineKeyboardMarkup()
+        await callback.message.edit_text(t('unknown_model', cur_lang))
 
-    await callback.message.edit_text(text, reply_markup=keyboard)
     await callback.answer()
     logger.info(f"User (ID: {user_id}) is approving model {model}.")
 
 @router.callback_query(F.data.startswith("approve"), StateFilter(FSMModel.choosing_model))
-async def callback_approve_model(callback: CallbackQuery, state: FSMContext):
+async def callback_approve_model(callback: CallbackQuery, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик подтверждения выбора модели для чата.
     """
     model = callback.data.split("_")[-1]
     user_id = callback.from_user.id
-    settings = await Database.get_user_settings(user_id=user_id)
-    if settings:
-        cur_lang = settings.get('language', 'ru')
-    else:
-        cur_lang = 'ru'  # Default language
+    cur_lang = user.language if user else 'ru'  # Default language
 
     success = await Database.set_user_setting(user_id=user_id, setting="chat_model", value=model)
     if success:
-        if model == "gpt4o":
-            if cur_lang == 'ru':
-                text = "Модель GPT4o успешно выбрана."
-            else:
-                text = "GPT4o model has been successfully selected."
-        elif model == "llama3":
-            if cur_lang == 'ru':
-                text = "Модель Llama3 успешно выбрана."
-            else:
-                text = "Llama3 model has been successfully selected."
-        elif model == "scenary":
-            if cur_lang == 'ru':
-                text = "Режим «сценарный» успешно выбран."
-            else:
-                text = "Scenary mode has been successfully selected."
-        else:
-            if cur_lang == 'ru':
-                text = "Неизвестная модель."
-            else:
-                text = "Unknown model."
-
+        text = t(f'model_selected_{model}', cur_lang) if model in MODEL_NAMES else t('unknown_model', cur_lang)
         await callback.message.edit_text(text)
         logger.info(f"User (ID: {user_id}) changed chat model to {model}.")
     else:
-        if cur_lang == 'ru':
-            text = "Не удалось изменить модель. Попробуйте позже."
-        else:
-            text = "Failed to change the model. Please try again later."
-        await callback.message.edit_text(text)
+        await callback.message.edit_text(t('model_change_failed', cur_lang))
         logger.error(f"Failed to change chat model for user (ID: {user_id}).")
 
     await state.clear()
     await callback.answer()
 
 @router.callback_query(F.data == "refuse")
-async def callback_refuse_model(callback: CallbackQuery, state: FSMContext):
+async def callback_refuse_model(callback: CallbackQuery, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик отказа от выбора модели для чата.
     """
     user_id = callback.from_user.id
-    settings = await Database.get_user_settings(user_id=user_id)
-    if settings:
-        cur_lang = settings.get('language', 'ru')
-    else:
-        cur_lang = 'ru'  # Default language
+    cur_lang = user.language if user else 'ru'  # Default language
 
     await state.clear()
 
-    if cur_lang == 'ru':
-        text = "Выбор модели отменен."
-    else:
-        text = "Model selection canceled."
-
-    await callback.message.edit_text(text)
+    await callback.message.edit_text(t('model_selection_cancelled', cur_lang))
     await callback.answer()
     logger.info(f"User (ID: {user_id}) refused to choose a model.")
 
+# Регистрируется до обработчиков общения с моделями, чтобы команда не уходила модели
+@router.message(Command('price'))
+async def price_list(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
+    """
+    Обработчик команды "Прайс-лист" и команды "/pricelist".
+    Отправляет сообщение с прайс-листом.
+    """
+    await message.answer(t('price_list', user.language if user else 'ru'))
+
 @router.message(Command("chat"))
-@router.message(F.text == "🗨️ Запустить чат")
-@router.message(F.text == "🗨️ Start Chat")
-async def cmd_chat_start(message: Message, state: FSMContext):
+async def cmd_chat_start(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик сообщения "🗨️ Запустить чат" и команды "/chat".
     Переводит пользователя в состояние ожидания сообщения для ChatGPT.
     """
     user_id = message.from_user.id
-    settings = await Database.get_user_settings(user_id=user_id)
-    if settings:
-        cur_lang = settings.get('language', 'ru')
-    else:
-        cur_lang = 'ru'  # Default language
+    cur_lang = user.language if user else 'ru'  # Default language
 
-    model = await Database.get_user_model(user_id=user_id)
-    token_balance = settings['token_balance']
+    model = user.chat_model if user else None
+    token_balance = user.token_balance if user else 0
 
     if model == "gpt4o":
         if token_balance < 100:
-            if cur_lang == 'ru':
-                await message.answer(f"У вас недостаточно токенов для использования модели GPT4o.\n\n<b>Пополните баланс токенов, чтобы продолжить — для этого напишите @TheMorz3.</b>" \
-                                f"\n\n <i>/price — узнать прайс-лист</i>")
-            else:
-                await message.answer(f"You don't have enough tokens to use model GPT4o. Please top up your token balance to continue. DM @TheMorze in order to do it.")
+            await message.answer(t('not_enough_tokens', cur_lang, model=MODEL_NAMES[model]))
             return
-        full_model = "GPT4o"
         await state.set_state(FSMModel.waiting_for_message_gpt4o)
     elif model == "llama3":
         if token_balance < 150:
-            if cur_lang == 'ru':
-                await message.answer(f"У вас недостаточно токенов для использования модели LLama3.\n\n<b>Пополните баланс токенов, чтобы продолжить — для этого напишите @TheMorz3.</b>" \
-                                f"\n\n <i>/price — узнать прайс-лист</i>")
-            else:
-                await message.answer(f"You don't have enough tokens to use model LLama3. Please top up your token balance to continue. DM @TheMorze in order to do it.")
+            await message.answer(t('not_enough_tokens', cur_lang, model=MODEL_NAMES[model]))
             return
-        full_model = "Llama3"
         await state.set_state(FSMModel.waiting_for_message_llama3)
     elif model == "scenary":
         if token_balance < 150:
-            if cur_lang == 'ru':
-                await message.answer(f"У вас недостаточно токенов для использования модели LLama3.\n\n<b>Пополните баланс токенов, чтобы продолжить — для этого напишите @TheMorz3.</b>" \
-                                f"\n\n <i>/price — узнать прайс-лист</i>")
-            else:
-                await message.answer(f"You don't have enough tokens to use model LLama3. Please top up your token balance to continue. DM @TheMorze in order to do it.")
+            await message.answer(t('not_enough_tokens', cur_lang, model=MODEL_NAMES[model]))
             return
-        full_model = "Scenary"
         await state.set_state(FSMModel.waiting_for_message_scenary)
     else:
         # Default model
-        full_model = "GPT4o"
+        model = "gpt4o"
         await state.set_state(FSMModel.waiting_for_message_gpt4o)
 
-    if cur_lang == 'ru':
-        prompt = f"Вы сейчас используете: {full_model}\n\nВведите ваше сообщение:\n\n<i>Чтобы отменить диалог, нажмите /cancel</i>"
-    else:
-        prompt = f"You are now using: {full_model}\n\nEnter your message:\n\n<i>In order to quit the dialogue, click /cancel</i>"
-
-    await message.answer(prompt, reply_markup=await get_hide_keyboard(lang=cur_lang))
+    await message.answer(t('chat_started', cur_lang, model=MODEL_NAMES[model]), reply_markup=get_hide_chat_keyboard(lang=cur_lang))
 
     logger.info(f"User (ID: {user_id}) is starting a chat with ChatGPT.")
 
-@router.message(StateFilter(FSMModel.waiting_for_message_gpt4o))
-async def process_gpt4o_message(message: Message, state: FSMContext):
+@router.message(StateFilter(FSMModel.waiting_for_message_gpt4o), flags={'throttling': 'gpt4o'})
+async def process_gpt4o_message(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик сообщений в состоянии общения с GPT4o.
     """
 
     user_message = message.text
     user_id = message.from_user.id
-    settings = await Database.get_user_settings(user_id=user_id)
-    if settings:
-        cur_lang = settings.get('language', 'ru')
-    else:
-        cur_lang = 'ru'  # Default language
-
-
-    token_balance = settings['token_balance']
+    cur_lang = user.language if user else 'ru'  # Default language
 
-    if token_balance < 100:
-        if cur_lang == 'ru':
-            await message.answer(f"У вас недостаточно токенов для использования модели GPT4o.\n\n<b>Пополните баланс токенов, чтобы продолжить — для этого напишите @TheMorz3.</b>" \
-                                f"\n\n <i>/price — узнать прайс-лист</i>")
-        else:
-            await message.answer(f"You don't have enough tokens to use model GPT4o. Please top up your token balance to continue. DM @TheMorze in order to do it.")
+    balance = await Database.debit_tokens(user_id=user_id, amount=100, reason="gpt4o")
+    if balance is None:
+        await message.answer(t('not_enough_tokens', cur_lang, model=MODEL_NAMES['gpt4o']))
         return
 
     logger.info(f"Message received from user (ID: {user_id}): {user_message}")
 
     await message.bot.send_chat_action(chat_id=message.chat.id, action='typing')
 
-    gpt_response = await get_gpt_response(user_message)
+    await answer_with_model(message, cur_lang, model='gpt4o', cost=100)
 
-    await Database.set_user_setting(user_id=user_id, setting="token_balance", value=(await Database.get_user_settings(user_id=user_id))['token_balance'] - 100)
 
-    await message.answer(gpt_response)
-    logger.info(f"Response sent to user (ID: {user_id}): {gpt_response}")
-
-
-@router.message(StateFilter(FSMModel.waiting_for_message_llama3))
-async def process_llama3_message(message: Message, state: FSMContext):
+@router.message(StateFilter(FSMModel.waiting_for_message_llama3), flags={'throttling': 'llama3'})
+async def process_llama3_message(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик сообщений в состоянии общения с Llama3.
     """
     user_message = message.text
     user_id = message.from_user.id
-    settings = await Database.get_user_settings(user_id=user_id)
-    if settings:
-        cur_lang = settings.get('language', 'ru')
-    else:
-        cur_lang = 'ru'  # Default language
+    cur_lang = user.language if user else 'ru'  # Default language
 
-    token_balance = settings['token_balance']
-    if token_balance < 150:
-        if cur_lang == 'ru':
-            await message.answer(f"У вас недостаточно токенов для использования модели LLama3.\n\n<b>Пополните баланс токенов, чтобы продолжить — для этого напишите @TheMorz3.</b>" \
-                                f"\n\n <i>/price — узнать прайс-лист</i>")
-        else:
-            await message.answer(f"You don't have enough tokens to use model LLama3. Please top up your token balance to continue. DM @TheMorze in order to do it.")
+    balance = await Database.debit_tokens(user_id=user_id, amount=150, reason="llama3")
+    if balance is None:
+        await message.answer(t('not_enough_tokens', cur_lang, model=MODEL_NAMES['llama3']))
         return
 
     logger.info(f"Message received from user (ID: {user_id}): {user_message}")
@@ -480,180 +366,80 @@ async def process_llama3_message(message: Message, state: FSMContext):
     # llama_response = await get_llama_response(user_message)
     await message.bot.send_chat_action(chat_id=message.chat.id, action='typing')
 
-    llama_response = await get_llama_response(user_message)
-
-    await Database.set_user_setting(user_id=user_id, setting="token_balance", value=(await Database.get_user_settings(user_id=user_id))['token_balance'] - 150)
-    await message.answer(llama_response)
-    logger.info(f"Response sent to user (ID: {user_id}): {llama_response}")
+    await answer_with_model(message, cur_lang, model='llama3', cost=150)
     
-@router.message(StateFilter(FSMModel.waiting_for_message_scenary))
-async def process_scenary_message(message: Message, state: FSMContext):
+@router.message(StateFilter(FSMModel.waiting_for_message_scenary), F.text, flags={'throttling': 'scenary'})
+async def process_scenary_message(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
     """
-    Обработчик сообщений в состоянии общения с Scenary.
+    Обработчик текстовых сообщений в состоянии общения с Scenary.
+    Стикеры, фото и голосовые сообщения не доходят до поиска по FAQ и модели.
     """
     user_message = message.text
     user_id = message.from_user.id
-    settings = await Database.get_user_settings(user_id=user_id)
-    if settings:
-        cur_lang = settings.get('language', 'ru')
-    else:
-        cur_lang = 'ru'  # Default language
+    cur_lang = user.language if user else 'ru'  # Default language
 
-    token_balance = settings['token_balance']
-    if token_balance < 50:
-        if cur_lang == 'ru':
-            await message.answer(f"У вас недостаточно токенов для использования модели Scenary.\n\n<b>Пополните баланс токенов, чтобы продолжить — для этого напишите @TheMorz3.</b>"
-                                 f"\n\n <i>/price — узнать прайс-лист</i>")
-        else:
-            await message.answer(f"You don't have enough tokens to use model Scenary. Please top up your token balance to continue. DM @TheMorze in order to do it.")
+    # Почти дословные вопросы из FAQ отвечаются сразу, без обращения к модели
+    direct_answer = faq.get_faq_index().find_direct_answer(user_message)
+    if direct_answer is not None:
+        balance = await Database.debit_tokens(user_id=user_id, amount=faq.FAQ_DIRECT_COST, reason="scenary_faq")
+    else:
+        balance = await Database.debit_tokens(user_id=user_id, amount=50, reason="scenary")
+    if balance is None:
+        await message.answer(t('not_enough_tokens', cur_lang, model=MODEL_NAMES['scenary']))
         return
 
     logger.info(f"Message received from user (ID: {user_id}): {user_message}")
 
+    if direct_answer is not None:
+        await message.answer(direct_answer.answer)
+        logger.info(f"FAQ answer sent to user (ID: {user_id}): {direct_answer.question}")
+        return
+
     # Здесь можно добавить интеграцию с Llama API
     # Пример:
     # llama_response = await get_llama_response(user_message)
     await message.bot.send_chat_action(chat_id=message.chat.id, action='typing')
 
-    scenary_response = await get_scenary_response(user_message)
-
-    await Database.set_user_setting(user_id=user_id, setting="token_balance", value=(await Database.get_user_settings(user_id=user_id))['token_balance'] - 50)
-    await message.answer(scenary_response)
-    logger.info(f"Response sent to user (ID: {user_id}): {scenary_response}")
+    await answer_with_model(message, cur_lang, model='scenary', cost=50)
 
 
 
 @router.message(StateFilter(FSMModel.scenary_processing_message))
-async def fallback_handler(message: Message, state: FSMContext):
+async def fallback_handler(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик для непредвиденных состояний.
     """
     user_id = message.from_user.id
-    settings = await Database.get_user_settings(user_id=user_id)
-    if settings:
-        cur_lang = settings.get('language', 'ru')
-    else:
-        cur_lang = 'ru'  # Default language
-
-    if cur_lang == 'ru':
-        fallback_text = "Я не знаю, как на это отвечать :("
-    else:
-        fallback_text = "I don't know how to respond to that :("
+    cur_lang = user.language if user else 'ru'  # Default language
 
-    await message.answer(fallback_text)
+    await message.answer(t('fallback', cur_lang))
     logger.error(f"Unexpected state while processing a message from user (ID: {user_id}).")
     await state.clear()
 
-@router.message(F.text == '🆘 Помощь')
-@router.message(F.text == '🆘 Help')
-async def cmd_help(message: Message):
+async def cmd_help(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик команды "🆘 Помощь" и команды "/help".
     Отправляет сообщение с помощью.
     """
+    await message.answer(t('help', user.language if user else 'ru'))
 
-    await message.answer("<b><i>==ПОМОЩЬ==</i></b>\n\n" \
-                         "🗨 <b><i>Запустить чат</i></b> — <i>Начать общение с выбранной моделью нейросети</i>\n" \
-                         "🤖 <b><i>Изменить модель</i></b> — <i>выбрать модель из существующих</i>\n" \
-                         "⚙️ <b><i>Настройки</i></b> — <i>Изменить язык</i> или <i>Войти в админ-панель (при наличии прав)</i>\n" \
-                         "📚 <b><i>О нас</i></b> — информация о команде разработчиков\n" \
-                         "📜 <b><i>Прайс-лист</i></b> — актуальные цены на токены")
 
-
-@router.message(F.text == '📚 О нас')
-@router.message(F.text == '📚 About us')
-async def about_us(message: Message):
+async def about_us(message: Message, state: FSMContext, user: Optional[UserSnapshot]):
     """
     Обработчик команды "📚 О нас" и команды "/about".
     Отправляет сообщение с информацией о боте.
     """
-    await message.answer("<b><i>==О НАС==</i></b>\n\nМы команда из трех молодых энтузиастов,"
-                        "решивших собрать все самое нужное "
-                        "для студента / абитуриента МИСИС в одном боте.\n\n"
-                        "Предложения по улучшению работы сервиса принимаются"
-                        "только от Павла Дмитриевича, напишите нам в лс - бан ☠️")
-
-@router.message(F.text == '📜 Прайс-лист')
-@router.message(F.text == '📜 Price List')
-@router.message(Command('price'))
-async def price_list(message: Message):
-    """
-    Обработчик команды "Прайс-лист" и команды "/pricelist".
-    Отправляет сообщение с прайс-листом.
-    """
-    cur_lang = (await Database.get_user_settings(message.from_user.id))['language']
-
-    if cur_lang == 'ru':
-        await message.answer('''<b>🌟 Прайс-лист на услуги чат-бота 🌟\n\n\n</b>🔹 10 тыс. токенов — 50 рублей\n
-🔹 100 тыс. токенов — 300 рублей\n
-🔹 1 млн. токенов — 2500 рублей\n''')
-
-    else:
-        await message.answer('''<b>🌟 Chat bot service price list 🌟\n\n</b>
-
-🔹 10,000 tokens — 50 rubles\n
-
-🔹 100,000 tokens — 300 rubles\n
-
-🔹 1,000,000 tokens — 2500 rubles\n''')
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    await message.answer(t('about_us', user.language if user else 'ru'))
 
+# Команды главного меню (см. MENU_LAYOUT) и их обработчики
+MENU_HANDLERS = {
+    'start_chat': cmd_chat_start,
+    'change_model': change_model,
+    'settings': cmd_settings,
+    'help': cmd_help,
+    'about': about_us,
+    'price_list': price_list,
+}
 
 
 @router.message(F.text.lower().contains('хонер'))
@@ -662,4 +448,4 @@ async def process_some(message: Message):
     Обработчик сообщений, содержащих 'хонер'.
     Отправляет сообщение с приветствием.
     """
-    await message.answer("<b><i>==ХУАВЕЙ==  :)</i></b>")
+    await message.answer(t('huawei', 'ru'))
@@ -1,305 +1,259 @@
+from itertools import product
+from typing import Dict, Tuple
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
-async def get_settings_keyboard(lang: str = 'ru', is_admin = False) -> InlineKeyboardMarkup:
+from app.lexicon.i18n import catalog, t
+
+LANGUAGES = catalog.locales
+FLAGS = (False, True)
+
+def _build_settings_keyboard(lang: str = 'ru', is_admin = False) -> InlineKeyboardMarkup:
     """
     Создание клавиатуры для настроек пользователя с динамической кнопкой языка.
 
-    :param lang: Язык пользователя ('ru' или 'en').
+    :param lang: Язык пользователя.
     :return: Объект InlineKeyboardMarkup с кнопками настроек.
     """
-    if lang == 'ru':
-        language_button_text = "Язык: 🇷🇺 Русский"
-        admin_panel = "Войти в админ-панель"
-        hide_button_text = "Скрыть"
-    else:
-        language_button_text = "Language: 🇬🇧 English"
-        admin_panel = "Enter Admin Panel"
-        hide_button_text = "Hide"
-
+    rows = [[InlineKeyboardButton(text=t('btn_language', lang), callback_data="change_language")]]
     if is_admin:
-        keyboard = InlineKeyboardMarkup(
-            inline_keyboard=[
-                [
-                    InlineKeyboardButton(text=language_button_text, callback_data="change_language")
-                ],
-                [
-                    InlineKeyboardButton(text=admin_panel, callback_data="enter_admin_panel")],
-                [
-                    InlineKeyboardButton(text=hide_button_text, callback_data="hide")
-                ]
-            ]
-        )
-        return keyboard
-
-    else:
-        keyboard = InlineKeyboardMarkup(
-            inline_keyboard=[
-                [
-                    InlineKeyboardButton(text=language_button_text, callback_data="change_language"),
-                ],
-                [
-                    InlineKeyboardButton(text=hide_button_text, callback_data="hide")
-                ]
-            ]
-        )
+        rows.append([InlineKeyboardButton(text=t('btn_admin_panel', lang), callback_data="enter_admin_panel")])
+    rows.append([InlineKeyboardButton(text=t('btn_hide', lang), callback_data="hide")])
 
-    return keyboard
+    return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
-async def get_choose_model_keyboard(gpt4o=True, scenary=True, llama=True, lang: str = 'ru') -> InlineKeyboardMarkup:
+def _build_choose_model_keyboard(gpt4o=True, scenary=True, llama=True, lang: str = 'ru') -> InlineKeyboardMarkup:
     """
     Создание клавиатуры для выбора модели.
 
-    :param lang: Язык пользователя ('ru' или 'en').
+    :param lang: Язык пользователя.
     :return: Объект InlineKeyboardMarkup с кнопками выбора модели.
     """
-    if lang == 'ru':
-        gpt4o_text = "🚀 GPT4o"
-        scenary_text = "👾 Сценарная"
-        llama3_text = "🦙 Llama3"
-        hide_text = "Скрыть"
-    else:
-        gpt4o_text = "🚀 GPT4o"
-        scenary_text = "👾 Scenary"
-        llama3_text = "🦙 Llama3"
-        hide_text = "Hide"
-
     models = []
     if gpt4o:
-        models.append(InlineKeyboardButton(text=gpt4o_text, callback_data="choice_gpt4o"))
+        models.append(InlineKeyboardButton(text=t('btn_gpt4o', lang), callback_data="choice_gpt4o"))
     if scenary:
-        models.append(InlineKeyboardButton(text=scenary_text, callback_data="choice_scenary"))
+        models.append(InlineKeyboardButton(text=t('btn_scenary', lang), callback_data="choice_scenary"))
     if llama:
-        models.append(InlineKeyboardButton(text=llama3_text, callback_data="choice_llama3"))
+        models.append(InlineKeyboardButton(text=t('btn_llama3', lang), callback_data="choice_llama3"))
 
 
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             models,
             [
-                InlineKeyboardButton(text=hide_text, callback_data="hide")
+                InlineKeyboardButton(text=t('btn_hide', lang), callback_data="hide")
             ]
         ]
     )
     return keyboard
 
 
-async def get_approve_gpt4o_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
-    """
-    Создание клавиатуры для подтверждения выбора модели GPT4o.
-
-    :param lang: Язык пользователя ('ru' или 'en').
-    :return: Объект InlineKeyboardMarkup с кнопками подтверждения.
-    """
-    if lang == 'ru':
-        yes_text = "✅ Да"
-        no_text = "❌ Нет"
-    else:
-        yes_text = "✅ Yes"
-        no_text = "❌ No"
-
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text=yes_text, callback_data="approve_gpt4o"),
-                InlineKeyboardButton(text=no_text, callback_data="refuse")
-            ]
-        ]
-    )
-    return keyboard
-
-
-async def get_approve_llama3_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
-    """
-    Создание клавиатуры для подтверждения выбора модели Llama3.
-
-    :param lang: Язык пользователя ('ru' или 'en').
-    :return: Объект InlineKeyboardMarkup с кнопками подтверждения.
-    """
-    if lang == 'ru':
-        yes_text = "✅ Да"
-        no_text = "❌ Нет"
-    else:
-        yes_text = "✅ Yes"
-        no_text = "❌ No"
-
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text=yes_text, callback_data="approve_llama3"),
-                InlineKeyboardButton(text=no_text, callback_data="refuse")
-            ]
-        ]
-    )
-    return keyboard
-
-async def get_approve_scenary_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+def _build_approve_model_keyboard(model: str, lang: str = 'ru', refuse_data: str = "refuse") -> InlineKeyboardMarkup:
     """
-    Создание клавиатуры для подтверждения выбора модели Сценарный.
+    Создание клавиатуры для подтверждения выбора модели.
 
-    :param lang: Язык пользователя ('ru' или 'en').
+    :param model: Модель ('gpt4o', 'llama3' или 'scenary').
+    :param lang: Язык пользователя.
+    :param refuse_data: callback_data кнопки отказа.
     :return: Объект InlineKeyboardMarkup с кнопками подтверждения.
     """
-    if lang == 'ru':
-        yes_text = "✅ Да"
-        no_text = "❌ Нет"
-    else:
-        yes_text = "✅ Yes"
-        no_text = "❌ No"
-
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text=yes_text, callback_data="approve_scenary"),
-                InlineKeyboardButton(text=no_text, callback_data="hide")
+                InlineKeyboardButton(text=t('btn_yes', lang), callback_data=f"approve_{model}"),
+                InlineKeyboardButton(text=t('btn_no', lang), callback_data=refuse_data)
             ]
         ]
     )
     return keyboard
 
 
-async def get_hide_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+def _build_hide_keyboard(lang: str = 'ru', callback_data: str = "hide") -> InlineKeyboardMarkup:
     """
     Создание клавиатуры для отмены действия.
 
-    :param lang: Язык пользователя ('ru' или 'en').
+    :param lang: Язык пользователя.
+    :param callback_data: Данные кнопки: "hide" или "hide_chat" для приглашения к диалогу с моделью.
     :return: Объект InlineKeyboardMarkup с кнопкой отмены.
     """
-    if lang == 'ru':
-        hide_text = "Скрыть"
-    else:
-        hide_text = "Hide"
-
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text=hide_text, callback_data="hide")
+                InlineKeyboardButton(text=t('btn_hide', lang), callback_data=callback_data)
             ]
         ]
     )
     return keyboard
 
-async def get_admin_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+def _build_admin_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
     """
     Создание клавиатуры для администратора.
 
-    :param lang: Язык пользователя ('ru' или 'en').
+    :param lang: Язык пользователя.
     :return: Объект InlineKeyboardMarkup с кнопками администратора.
     """
-    if lang == 'ru':
-        find_user = "Найти пользователя"
-        hide_text = "Скрыть"
-    else:
-        find_user = "Find User"
-        hide_text = "Hide"
-
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text=find_user, callback_data="find_user")
+                InlineKeyboardButton(text=t('btn_find_user', lang), callback_data="find_user")
             ],
 
             [
-                InlineKeyboardButton(text=hide_text, callback_data="hide")
+                InlineKeyboardButton(text=t('btn_hide', lang), callback_data="hide")
             ]
         ]
     )
     return keyboard
 
-async def get_admin_user_editing_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+def _build_admin_user_editing_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
     """
     Создание клавиатуры для редактирования пользователя администратором.
 
-    :param lang: Язык пользователя ('ru' или 'en').
+    :param lang: Язык пользователя.
     :return: Объект InlineKeyboardMarkup с кнопками редактирования пользователя.
     """
-    if lang == 'ru':
-        change_model = "🤌 Изменить настройки доступа к моделям"
-        change_token_balance = "🤑 Изменить баланс токенов"
-        hide_text = "Скрыть"
-    else:
-        change_model = "🤌 Change access setting to the models"
-        change_token_balance = "🤑 Change token balance"
-        hide_text = "Hide"
-
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text=change_model, callback_data="change_user_model")
+                InlineKeyboardButton(text=t('btn_change_access', lang), callback_data="change_user_model")
             ],
 
             [
-                InlineKeyboardButton(text=change_token_balance, callback_data="change_user_token_balance")
+                InlineKeyboardButton(text=t('btn_change_balance', lang), callback_data="change_user_token_balance")
             ],
             [
-                InlineKeyboardButton(text=hide_text, callback_data="hide")
+                InlineKeyboardButton(text=t('btn_hide', lang), callback_data="hide")
             ]
         ]
     )
     return keyboard
 
-async def get_user_model_access_keyboard(gpt = False, scenary = False, llama = False, lang: str = 'ru') -> InlineKeyboardMarkup:
+def _build_user_model_access_keyboard(gpt = False, scenary = False, llama = False, lang: str = 'ru') -> InlineKeyboardMarkup:
     """
     Создание клавиатуры для выбора модели чата.
 
-    :param lang: Язык пользователя ('ru' или 'en').
+    :param lang: Язык пользователя.
     :return: Объект InlineKeyboardMarkup с кнопками выбора модели.
     """
-    if lang == 'ru':
-        if gpt:
-            gpt4o_text = "✅ GPT4o"
-        else:
-            gpt4o_text = "❌ GPT4o"
-
-        if scenary:
-            scenary_text = "✅ Сценарный"
-        else:
-            scenary_text = "❌ Сценарный"
-
-        if llama:
-            llama3_text = "✅ Llama3"
-        else:
-            llama3_text = "❌ Llama3"
-
-        hide_text = "Скрыть"
-    else:
-        if gpt:
-            gpt4o_text = "✅ GPT4o"
-        else:
-            gpt4o_text = "❌ GPT4o"
-
-        if scenary:
-            scenary_text = "✅ Scenary"
-        else:
-            scenary_text = "❌ Scenary"
-
-        if llama:
-            llama3_text = "✅ Llama3"
-        else:
-            llama3_text = "❌ Llama3"
-
-        hide_text = "Hide"
+    def mark(enabled: bool) -> str:
+        return "✅" if enabled else "❌"
 
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text=gpt4o_text, callback_data="access_gpt4o"),
-                InlineKeyboardButton(text=scenary_text, callback_data="access_scenary"),
-                InlineKeyboardButton(text=llama3_text, callback_data="access_llama")
+                InlineKeyboardButton(text=f"{mark(gpt)} {t('btn_access_gpt4o', lang)}", callback_data="access_gpt4o"),
+                InlineKeyboardButton(text=f"{mark(scenary)} {t('btn_access_scenary', lang)}", callback_data="access_scenary"),
+                InlineKeyboardButton(text=f"{mark(llama)} {t('btn_access_llama3', lang)}", callback_data="access_llama")
             ],
             [
-                InlineKeyboardButton(text=hide_text, callback_data="hide")
+                InlineKeyboardButton(text=t('btn_hide', lang), callback_data="hide")
             ]
         ]
     )
     return keyboard
 
-async def get_approve_keyboard():
+def _build_approve_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="✅ Подтвердить | Approve", callback_data="approve")
+                InlineKeyboardButton(text=t('btn_approve_agreement', lang), callback_data="approve")
             ]
         ]
     )
     return keyboard
+
+def get_user_search_keyboard(users, page: int = 0, has_next: bool = False, lang: str = 'ru') -> InlineKeyboardMarkup:
+    """
+    Создание клавиатуры с результатами поиска пользователей и постраничной навигацией.
+
+    :param users: Найденные пользователи (строки с полями user_id, username, fullname).
+    :param page: Номер текущей страницы (с нуля).
+    :param has_next: Есть ли следующая страница.
+    :param lang: Язык пользователя.
+    :return: Объект InlineKeyboardMarkup с найденными пользователями.
+    """
+    rows = []
+    for user in users:
+        text = user.fullname or str(user.user_id)
+        if user.username:
+            text += f" (@{user.username})"
+        rows.append([InlineKeyboardButton(text=text[:64], callback_data=f"pick_user_{user.user_id}")])
+
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton(text=t('btn_prev_page', lang), callback_data=f"search_page_{page - 1}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton(text=t('btn_next_page', lang), callback_data=f"search_page_{page + 1}"))
+    if navigation:
+        rows.append(navigation)
+
+    rows.append([InlineKeyboardButton(text=t('btn_hide', lang), callback_data="hide")])
+
+    keyboard = InlineKeyboardMarkup(inline_keyboard=rows)
+    return keyboard
+
+
+# Реестр клавиатур: все варианты (язык и флаги) строятся один раз при импорте модуля,
+# обработчики получают готовый объект синхронным поиском по словарю.
+# Объекты общие для всех вызовов, поэтому изменять их нельзя.
+INLINE_KEYBOARDS: Dict[Tuple, InlineKeyboardMarkup] = {
+    **{('settings', lang, is_admin): _build_settings_keyboard(lang, is_admin)
+       for lang, is_admin in product(LANGUAGES, FLAGS)},
+    **{('choose_model', lang, gpt4o, scenary, llama): _build_choose_model_keyboard(gpt4o, scenary, llama, lang)
+       for lang, gpt4o, scenary, llama in product(LANGUAGES, FLAGS, FLAGS, FLAGS)},
+    **{('user_model_access', lang, gpt, scenary, llama): _build_user_model_access_keyboard(gpt, scenary, llama, lang)
+       for lang, gpt, scenary, llama in product(LANGUAGES, FLAGS, FLAGS, FLAGS)},
+    **{('approve_gpt4o', lang): _build_approve_model_keyboard('gpt4o', lang) for lang in LANGUAGES},
+    **{('approve_llama3', lang): _build_approve_model_keyboard('llama3', lang) for lang in LANGUAGES},
+    **{('approve_scenary', lang): _build_approve_model_keyboard('scenary', lang, refuse_data="hide") for lang in LANGUAGES},
+    **{('hide_chat', lang): _build_hide_keyboard(lang, callback_data="hide_chat") for lang in LANGUAGES},
+    **{(name, lang): builder(lang)
+       for name, builder in (('hide', _build_hide_keyboard),
+                             ('admin', _build_admin_keyboard),
+                             ('admin_user_editing', _build_admin_user_editing_keyboard),
+                             ('approve', _build_approve_keyboard))
+       for lang in LANGUAGES},
+}
+
+
+def keyboard_lang(lang: str) -> str:
+    """Язык клавиатуры: языки, которых нет в каталоге, заменяются языком по умолчанию."""
+    return catalog.lang(lang)
+
+
+def get_settings_keyboard(lang: str = 'ru', is_admin=False) -> InlineKeyboardMarkup:
+    return INLINE_KEYBOARDS[('settings', keyboard_lang(lang), bool(is_admin))]
+
+
+def get_choose_model_keyboard(gpt4o=True, scenary=True, llama=True, lang: str = 'ru') -> InlineKeyboardMarkup:
+    return INLINE_KEYBOARDS[('choose_model', keyboard_lang(lang), bool(gpt4o), bool(scenary), bool(llama))]
+
+
+def get_user_model_access_keyboard(gpt=False, scenary=False, llama=False, lang: str = 'ru') -> InlineKeyboardMarkup:
+    return INLINE_KEYBOARDS[('user_model_access', keyboard_lang(lang), bool(gpt), bool(scenary), bool(llama))]
+
+
+def get_approve_model_keyboard(model: str, lang: str = 'ru') -> InlineKeyboardMarkup:
+    return INLINE_KEYBOARDS[(f'approve_{model}', keyboard_lang(lang))]
+
+
+def get_hide_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+    return INLINE_KEYBOARDS[('hide', keyboard_lang(lang))]
+
+
+def get_hide_chat_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+    return INLINE_KEYBOARDS[('hide_chat', keyboard_lang(lang))]
+
+
+def get_admin_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+    return INLINE_KEYBOARDS[('admin', keyboard_lang(lang))]
+
+
+def get_admin_user_editing_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+    return INLINE_KEYBOARDS[('admin_user_editing', keyboard_lang(lang))]
+
+
+def get_approve_keyboard(lang: str = 'ru') -> InlineKeyboardMarkup:
+    return INLINE_KEYBOARDS[('approve', keyboard_lang(lang))]
@@ -1,36 +1,30 @@
+from itertools import product
+from typing import Dict, Tuple
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
-async def get_menu_keyboard(one_time: bool = False, lang: str = 'ru') -> ReplyKeyboardMarkup:
+from app.keyboards.inline_keyboards import LANGUAGES, FLAGS, keyboard_lang
+from app.lexicon.i18n import t
+
+# Раскладка главного меню: команды кнопок по рядам. Текст кнопки — строка каталога menu_<команда>
+MENU_LAYOUT: Tuple[Tuple[str, ...], ...] = (
+    ('start_chat',),
+    ('change_model', 'settings'),
+    ('help', 'about'),
+    ('price_list',),
+)
+
+def _build_menu_keyboard(one_time: bool = False, lang: str = 'ru') -> ReplyKeyboardMarkup:
     """
     Создание главной клавиатуры меню для GPT-бота с поддержкой нескольких языков.
 
     :param one_time: Флаг для отображения клавиатуры один раз.
-    :param lang: Язык пользователя ('ru' или 'en').
+    :param lang: Язык пользователя.
     :return: Объект ReplyKeyboardMarkup с кнопками меню.
     """
-
-    # Определение текстов кнопок на основе выбранного языка
-    if lang == 'ru':
-        start_chat_text = '🗨️ Запустить чат'
-        change_model_text = '🤖 Изменить модель'
-        settings_text = '⚙️ Настройки'
-        help_text = '🆘 Помощь'
-        about_text = '📚 О нас'
-        price_list = '📜 Прайс-лист'
-    else:
-        start_chat_text = '🗨️ Start Chat'
-        change_model_text = '🤖 Change Model'
-        settings_text = '⚙️ Settings'
-        help_text = '🆘 Help'
-        about_text = '📚 About us'
-        price_list = '📜 Price list'
-
-    # Создание клавиатуры с динамическими текстами кнопок
     keyboard = [
-        [KeyboardButton(text=start_chat_text)],
-        [KeyboardButton(text=change_model_text), KeyboardButton(text=settings_text)],
-        [KeyboardButton(text=help_text), KeyboardButton(text=about_text)],
-        [KeyboardButton(text=price_list)]
+        [KeyboardButton(text=t(f'menu_{command}', lang)) for command in row]
+        for row in MENU_LAYOUT
     ]
 
     return ReplyKeyboardMarkup(
@@ -38,3 +32,23 @@ async def get_menu_keyboard(one_time: bool = False, lang: str = 'ru') -> ReplyKe
         resize_keyboard=True,
         one_time_keyboard=one_time,
     )
+
+
+# Все варианты главного меню строятся один раз при импорте модуля (см. INLINE_KEYBOARDS)
+REPLY_KEYBOARDS: Dict[Tuple, ReplyKeyboardMarkup] = {
+    ('menu', lang, one_time): _build_menu_keyboard(one_time, lang)
+    for lang, one_time in product(LANGUAGES, FLAGS)
+}
+
+
+# Текст кнопки меню на любом языке -> команда меню; строится из той же раскладки, что и клавиатура
+MENU_COMMANDS: Dict[str, str] = {
+    t(f'menu_{command}', lang): command
+    for lang in LANGUAGES
+    for row in MENU_LAYOUT
+    for command in row
+}
+
+
+def get_menu_keyboard(one_time: bool = False, lang: str = 'ru') -> ReplyKeyboardMarkup:
+    return REPLY_KEYBOARDS[('menu', keyboard_lang(lang), bool(one_time))]
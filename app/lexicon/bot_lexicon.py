@@ -1,30 +1,4 @@
-LEXICON_RU = {
-    'start': '👋  {hello}\n\n'
-             'Я бот, который попробует ответить на твои вопросы, связанные с учёбой в МИСИС и не только!\n\n'
-             'Если вкратце, ты можешь взаимодействовать со мной <b>в 2-х форматах:</b>\n\n'
-             '<i>— используй AI-модели <b>GPT4o</b> или <b>LLama3</b> для помощи в решении учебных задач\n'
-             '— используй <b>«сценарную»</b> модель, чтобы получить ответы на узкоспециализированные вопросы</i>\n\n'
-             'Готов приступить к работе? 🤔',
-    'gpt4o_choice': '<b>Модель <i>GPT4o</i></b>\nЭто крутая и дорогая модель!\n\nВы уверены, что хотите её выбрать?',
-    'scenary_choice': '<b>Режим <i>«сценарный»</i></b>\nПоможет ответить на вопросы про МИСИС! Вы уверены, что хотите её выбрать?\n\n',
-    'llama3_choice': '<b>Модель <i>Llama3</i></b>\nЭто крутая и дорогая модель!\n\nВы уверены, что хотите её выбрать?',}
-
-LEXICON_EN = {
-    'start': (
-        '👋  {hello}\n\n'
-        'I am a bot that will try to answer your questions related to studying at MISIS and beyond!\n\n'
-        'In short, you can interact with me in <b>2 formats:</b>\n\n'
-        '<i>— use the AI model <b>GPT4o</b> to help solve academic tasks\n'
-        '— use the <b>“Scenary”</b> mode to get answers to specialized questions</i>\n\n'
-        'Ready to get started? 🤔'
-    ),
-    'gpt4o_choice': "<b><i>GPT4o</i> model</b>\nIt's a cool and expensive model!\n\nAre you sure you want to select it?",
-    'scenary_choice': "<b><i>Scenary</i> mode</b>\nIt will help answer questions about MISIS\n\nAre you sure you want to select it?\n",
-    'llama3_choice': "<b><i>Llama3</i> model</b>\nIt's a cool and expensive model!\n\nAre you sure you want to select it?",
-}
-
-
-AI_LEXICON= {'PREDEFINED_PROMPT':'''
+AI_LEXICON= {'FAQ':'''
 Есть ли в НИТУ МИСИС бюджетные места?
 Да, есть. С количеством бюджетных мест по каждому направлению подготовки/специальности можно ознакомиться по ссылке:
 •	бакалавриат/специалитет (https://misis.ru/applicants/admission/baccalaureate-and-specialty/budgetary-places/)
@@ -157,7 +131,8 @@ o	если поступающий получил документ о средн
 Есть ли инструкция по заполнению электронного заявления поступающего?
 Да, есть. Она размещена в разделах подачи документов и доступна по ссылке (https://misis.ru/files/-/f237353d04886c8551598ca8d0777bfb/%D0%98%D0%BD%D1%81%D1%82%D1%80%D1%83%D0%BA%D1%86%D0%B8%D1%8F_%D0%9B%D0%9A.pdf).
 Также есть видео инструкции по подаче документов доступные по ссылке (https://youtube.com/playlist?list=PLYPribUU2Tc4MpaTGMGVOwxqaxO5rMv_T)
-Запись вебинара с ответами на частые вопросы по личному кабинету доступна по ссылке (https://vk.com/video-62258607_456240247)
-
+Запись вебинара с ответами на частые вопросы по личному кабинету доступна по ссылке (https://vk.com/video-62258607_456240247)''',
+             'SCENARY_INSTRUCTION': 'Тебе нужно ответить на этот вопрос, опираясь на ответы по предыдущим вопросам. постарайся найти такой вопрос который наиболее близок по контексту с данным и перефразируй ответ своими словами:'}
 
-Тебе нужно ответить на этот вопрос, опираясь на ответы по предыдущим вопросам. постарайся найти такой вопрос который наиболее близок по контексту с данным и перефразируй ответ своими словами:'''}
\ No newline at end of file
+# Полный промпт сценарного режима: весь FAQ и инструкция
+AI_LEXICON['PREDEFINED_PROMPT'] = AI_LEXICON['FAQ'] + '\n\n\n' + AI_LEXICON['SCENARY_INSTRUCTION']
@@ -0,0 +1,132 @@
+import json
+from pathlib import Path
+from string import Formatter
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from loguru import logger
+
+LOCALES_DIR = Path(__file__).resolve().parent / 'locales'
+DEFAULT_LANG = 'ru'
+
+
+class Template:
+    """
+    Строка каталога, разобранная при загрузке: строки без подстановок
+    возвращаются как есть, без вызова format.
+    """
+
+    __slots__ = ('text', 'fields')
+
+    def __init__(self, text: str):
+        self.fields: FrozenSet[str] = frozenset(
+            field for _, field, _, _ in Formatter().parse(text) if field is not None
+        )
+        # В строках без подстановок экранированные скобки {{ }} раскрываются сразу
+        self.text = text if self.fields else text.format()
+
+    def render(self, **kwargs) -> str:
+        return self.text.format(**kwargs) if self.fields else self.text
+
+
+class Catalog:
+    """
+    Каталог строк интерфейса: по файлу <язык>.json на каждый язык.
+
+    Строки загружаются один раз при создании каталога. Если в языке нет нужного ключа,
+    используется строка языка по умолчанию, поэтому новый язык можно добавлять постепенно.
+    """
+
+    def __init__(self, directory: Path = LOCALES_DIR, default_lang: str = DEFAULT_LANG):
+        """
+        :param directory: Каталог с файлами языков.
+        :param default_lang: Язык по умолчанию (используется для отсутствующих ключей и неизвестных языков).
+        """
+        self.default_lang = default_lang
+        self.__templates: Dict[str, Dict[str, Template]] = {}
+        for path in sorted(directory.glob('*.json')):
+            with open(path, encoding='utf-8') as f:
+                self.__templates[path.stem] = {key: Template(text) for key, text in json.load(f).items()}
+        if default_lang not in self.__templates:
+            raise ValueError(f"Default locale '{default_lang}' was not found in {directory}")
+
+        # Язык по умолчанию первым, остальные — в алфавитном порядке
+        self.locales: Tuple[str, ...] = (default_lang,) + tuple(
+            lang for lang in self.__templates if lang != default_lang
+        )
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__templates[self.default_lang]
+
+    def lang(self, lang: Optional[str]) -> str:
+        """Поддерживаемый каталогом язык: неизвестные языки заменяются языком по умолчанию."""
+        return lang if lang in self.__templates else self.default_lang
+
+    def t(self, key: str, lang: Optional[str] = None, **kwargs) -> str:
+        """
+        Получение строки интерфейса.
+
+        :param key: Ключ строки.
+        :param lang: Язык пользователя.
+        :param kwargs: Значения подстановок.
+        :return: Строка на языке пользователя (или на языке по умолчанию, если перевода нет).
+        """
+        template = self.__templates.get(lang, {}).get(key) or self.__templates[self.default_lang].get(key)
+        if template is None:
+            logger.error(f"Missing i18n key '{key}'.")
+            return key
+        return template.render(**kwargs)
+
+    def missing_keys(self) -> Dict[str, FrozenSet[str]]:
+        """
+        Ключи, отсутствующие в каждом из языков (относительно всех ключей каталога).
+
+        :return: Словарь язык -> отсутствующие ключи (только для неполных языков).
+        """
+        all_keys = frozenset().union(*(templates.keys() for templates in self.__templates.values()))
+        return {
+            lang: missing
+            for lang, templates in self.__templates.items()
+            if (missing := all_keys - templates.keys())
+        }
+
+    def placeholder_mismatches(self) -> Dict[Tuple[str, str], Tuple[FrozenSet[str], FrozenSet[str]]]:
+        """
+        Переводы, подстановки в которых отличаются от языка по умолчанию.
+
+        :return: Словарь (язык, ключ) -> (подстановки перевода, ожидаемые подстановки).
+        """
+        default = self.__templates[self.default_lang]
+        return {
+            (lang, key): (template.fields, default[key].fields)
+            for lang, templates in self.__templates.items()
+            for key, template in templates.items()
+            if key in default and template.fields != default[key].fields
+        }
+
+    def check(self) -> bool:
+        """
+        Проверка каталога при запуске: все ключи есть во всех языках,
+        а подстановки в переводах совпадают с языком по умолчанию.
+
+        :return: True, если каталог полный и согласованный.
+        """
+        ok = True
+        for lang, missing in self.missing_keys().items():
+            ok = False
+            logger.warning(f"Locale '{lang}' is missing keys: {', '.join(sorted(missing))}")
+
+        for (lang, key), (fields, expected) in self.placeholder_mismatches().items():
+            ok = False
+            logger.warning(f"Locale '{lang}' key '{key}' has placeholders {sorted(fields)}, "
+                           f"expected {sorted(expected)}")
+        if ok:
+            logger.info(f"i18n catalog is complete: locales {', '.join(self.locales)}.")
+        return ok
+
+
+catalog = Catalog()
+
+
+def t(key: str, lang: Optional[str] = None, **kwargs) -> str:
+    """Получение строки интерфейса из каталога (см. Catalog.t)."""
+    return catalog.t(key, lang, **kwargs)
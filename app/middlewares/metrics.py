@@ -0,0 +1,32 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.service.metrics import HANDLER_DURATION, HANDLER_ERRORS
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Измерение времени выполнения обработчиков и подсчёт их ошибок.
+    Регистрируется как внутренний middleware, поэтому имя обработчика уже известно.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get('handler')
+        name = handler_object.callback.__name__ if handler_object is not None else 'unknown'
+        event_type = type(event).__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name, event=event_type)
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - started, handler=name, event=event_type)
@@ -0,0 +1,150 @@
+import math
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message, TelegramObject
+from loguru import logger
+
+from app.lexicon.i18n import t
+
+# Атомарное списание из корзины токенов: пополнение по прошедшему времени, списание и продление TTL.
+# Время берётся из Redis, чтобы часы экземпляров бота не влияли на лимиты.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'warned')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed, retry_ms, warn = 0, 0, 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now), 'warned', '0')
+else
+    retry_ms = math.ceil((cost - tokens) / rate * 1000)
+    if bucket[3] ~= '1' then
+        warn = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now), 'warned', '1')
+end
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, retry_ms, warn}
+"""
+
+class TokenBucketLimiter:
+    """
+    Ограничение частоты запросов к моделям: корзина токенов в Redis на пару (пользователь, модель).
+
+    Корзина вмещает burst запросов и пополняется со скоростью rate запросов в секунду.
+    Проверка выполняется Lua-скриптом, поэтому лимит общий и точный для всех экземпляров бота.
+    При недоступности Redis запросы пропускаются.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], default_limit: Tuple[float, float] = (3, 0.2),
+                 key_prefix: str = 'throttle'):
+        """
+        :param limits: Лимиты по моделям: (burst, rate) — размер корзины и скорость пополнения (запросов в секунду).
+        :param default_limit: Лимит для моделей, не указанных в limits.
+        :param key_prefix: Префикс ключей Redis.
+        """
+        self.limits = limits
+        self.default_limit = default_limit
+        self.key_prefix = key_prefix
+        self.redis = None
+        self.__script = None
+
+        self.allowed = 0
+        self.throttled = 0
+
+    def configure(self, limits: Dict[str, Tuple[float, float]], default_limit: Tuple[float, float]) -> None:
+        """
+        Настройка лимитов (параметры см. в __init__).
+        """
+        self.limits = limits
+        self.default_limit = default_limit
+
+    def attach_redis(self, redis) -> None:
+        """
+        Подключение Redis: без него ограничение частоты не применяется.
+
+        :param redis: Асинхронный клиент Redis.
+        """
+        self.redis = redis
+        self.__script = redis.register_script(TOKEN_BUCKET_LUA)
+        logger.info(f"LLM request throttling is enabled: {self.limits} (default: {self.default_limit}).")
+
+    def key(self, model: str, user_id: int) -> str:
+        return f"{self.key_prefix}:{model}:{user_id}"
+
+    async def acquire(self, user_id: int, model: str, cost: float = 1) -> Tuple[bool, float, bool]:
+        """
+        Списание запроса из корзины пользователя.
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        :param model: Модель бота.
+        :param cost: Стоимость запроса в токенах корзины.
+        :return: Кортеж: разрешён ли запрос, через сколько секунд он станет возможен
+                 и нужно ли предупредить пользователя (только при первом отказе подряд).
+        """
+        if self.__script is None:
+            return True, 0.0, False
+
+        burst, rate = self.limits.get(model, self.default_limit)
+        try:
+            allowed, retry_ms, warn = await self.__script(keys=[self.key(model, user_id)], args=[rate, burst, cost])
+        except Exception as e:
+            logger.error(f"Error checking rate limit for user (ID: {user_id}): {e}")
+            return True, 0.0, False
+
+        if allowed:
+            self.allowed += 1
+            return True, 0.0, False
+        self.throttled += 1
+        return False, retry_ms / 1000, bool(warn)
+
+    def stats(self) -> Dict[str, int]:
+        return {"allowed": self.allowed, "throttled": self.throttled}
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты сообщений пользователя, адресованных моделям.
+
+    Регистрируется как внутренний middleware, поэтому срабатывает только после фильтров
+    и только для обработчиков с флагом throttling (значение флага — модель бота): команды
+    и кнопки меню в состоянии общения с моделью лимит не расходуют.
+    Сообщения сверх лимита не доходят до обработчика (и не списывают токены баланса);
+    пользователь получает одно предупреждение на серию отклонённых сообщений.
+    """
+
+    def __init__(self, limiter: TokenBucketLimiter):
+        self.limiter = limiter
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        model = get_flag(data, 'throttling')
+        if model is None or not isinstance(event, Message) or event.from_user is None:
+            return await handler(event, data)
+
+        allowed, retry_after, warn = await self.limiter.acquire(event.from_user.id, model)
+        if allowed:
+            return await handler(event, data)
+
+        if warn:
+            user = data.get('user')
+            await event.answer(t('throttled', user.language if user else None, seconds=max(1, math.ceil(retry_after))))
+        logger.info(f"User (ID: {event.from_user.id}) was throttled for {model}, retry after {retry_after:.1f}s.")
+        return None
+
+
+# Лимиты задаются в main() через throttler.configure
+throttler = TokenBucketLimiter(limits={})
@@ -0,0 +1,26 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from app.database.requests import Database
+
+
+class UserSnapshotMiddleware(BaseMiddleware):
+    """
+    Загрузка данных пользователя один раз на обновление.
+
+    Снимок пользователя (UserSnapshot) передаётся обработчикам в аргументе user,
+    поэтому обработчикам не нужно самим читать настройки из базы данных.
+    Если пользователь ещё не зарегистрирован, передаётся None.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        from_user: User = data.get('event_from_user')
+        data['user'] = await Database.get_user_snapshot(from_user.id) if from_user is not None else None
+        return await handler(event, data)
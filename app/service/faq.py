@@ -0,0 +1,235 @@
+import json
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.lexicon.bot_lexicon import AI_LEXICON
+
+
+FAQ_TOP_K = 3  # Количество пар вопрос-ответ, передаваемых модели (см. configure_faq)
+FAQ_DIRECT_THRESHOLD = 0.7  # Порог близости для ответа без LLM
+FAQ_DIRECT_COST = 10  # Стоимость ответа напрямую из FAQ (в токенах)
+FAQ_EVAL_PATH = os.path.join(os.path.dirname(__file__), '..', 'lexicon', 'faq_eval.json')
+
+STEM_LENGTH = 6  # Длина «основы» слова: грубый стемминг для учёта словоизменения
+
+STOPWORDS = frozenset({
+    'а', 'в', 'во', 'и', 'или', 'к', 'ко', 'ли', 'на', 'не', 'но', 'о', 'об', 'от', 'по', 'с', 'со', 'у',
+    'для', 'до', 'за', 'из', 'как', 'какой', 'какая', 'какие', 'когда', 'где', 'что', 'это', 'есть',
+    'можно', 'мне', 'мой', 'моя', 'мои', 'я', 'вы', 'вам', 'ваш', 'же', 'бы', 'при', 'то', 'так', 'также',
+})
+
+_BULLETS = ('•', 'o\t', '*', '-')
+_TERMINAL_PUNCTUATION = ('.', ':', ';', ')', '!', ',')
+
+
+@dataclass(frozen=True)
+class FaqEntry:
+    """Пара вопрос-ответ из FAQ."""
+    question: str
+    answer: str
+    section: Optional[str] = None
+
+
+def _is_topic_line(line: str, next_line: str) -> bool:
+    """
+    Строка без вопросительного знака, которая всё же является вопросом/темой
+    (например, «Перечень документов, необходимых для поступления»).
+    """
+    if line.endswith(_TERMINAL_PUNCTUATION) or line.startswith(_BULLETS) or len(line) > 60:
+        return False
+    return next_line.startswith(_BULLETS) or len(next_line) > 60
+
+
+def parse_faq(text: str) -> List[FaqEntry]:
+    """
+    Разбор текста FAQ на пары вопрос-ответ.
+    Вопросом считается строка, оканчивающаяся на «?», или короткая строка-тема перед ответом;
+    короткие строки перед вопросом считаются заголовками разделов.
+
+    :param text: Текст FAQ.
+    :return: Список пар вопрос-ответ.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    entries = []
+    section = None
+    question = None
+    answer = []
+
+    def flush():
+        if question and answer:
+            entries.append(FaqEntry(question=question, answer='\n'.join(answer), section=section))
+
+    for i, line in enumerate(lines):
+        next_line = lines[i + 1] if i + 1 < len(lines) else ''
+        if line.endswith('?') or _is_topic_line(line, next_line):
+            flush()
+            question, answer = line, []
+        elif next_line.endswith('?') and not line.endswith(_TERMINAL_PUNCTUATION) and len(line) <= 40:
+            flush()
+            section, question, answer = line, None, []
+        elif question:
+            answer.append(line)
+    flush()
+    return entries
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Токенизация текста: нижний регистр, слова без стоп-слов, усечение до основы.
+
+    :param text: Исходный текст.
+    :return: Список токенов.
+    """
+    words = re.findall(r'\w+', text.lower().replace('ё', 'е'))
+    return [word[:STEM_LENGTH] for word in words if word not in STOPWORDS and len(word) > 1]
+
+
+class FaqIndex:
+    """
+    Локальный TF-IDF индекс FAQ на NumPy. Строится один раз при старте бота;
+    векторы нормированы, поэтому скалярное произведение — косинусная близость.
+    """
+
+    def __init__(self, entries: List[FaqEntry]):
+        self.entries = entries
+
+        # Текст вопроса учитывается дважды: он точнее всего описывает тему записи
+        documents = [tokenize(f"{entry.question} {entry.question} {entry.answer}") for entry in entries]
+        questions = [tokenize(entry.question) for entry in entries]
+
+        self.vocabulary: Dict[str, int] = {}
+        for tokens in documents:
+            for token in tokens:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+
+        document_frequency = np.zeros(len(self.vocabulary))
+        for tokens in documents:
+            for token in set(tokens):
+                document_frequency[self.vocabulary[token]] += 1
+        self.idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+
+        self.document_matrix = np.vstack([self._vectorize(tokens) for tokens in documents])
+        self.question_matrix = np.vstack([self._vectorize(tokens) for tokens in questions])
+
+        self.direct_lookups = 0
+        self.direct_hits = 0
+
+    def _vectorize(self, tokens: List[str]) -> np.ndarray:
+        vector = np.zeros(len(self.vocabulary))
+        for token in tokens:
+            index = self.vocabulary.get(token)
+            if index is not None:
+                vector[index] += 1
+        vector = np.log1p(vector) * self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Tuple[FaqEntry, float]]:
+        """
+        Поиск наиболее релевантных записей FAQ.
+
+        :param query: Вопрос пользователя.
+        :param k: Количество возвращаемых записей, по умолчанию FAQ_TOP_K.
+        :return: Список пар (запись, близость), отсортированный по убыванию близости.
+        """
+        k = FAQ_TOP_K if k is None else k
+        scores = self.document_matrix @ self._vectorize(tokenize(query))
+        top = np.argsort(-scores)[:k]
+        return [(self.entries[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def find_direct_answer(self, query: str, threshold: Optional[float] = None) -> Optional[FaqEntry]:
+        """
+        Поиск почти дословного совпадения вопроса пользователя с вопросом из FAQ.
+        Сравнение идёт только с текстами вопросов, чтобы ответ без LLM давался лишь при уверенном совпадении.
+
+        :param query: Вопрос пользователя.
+        :param threshold: Минимальная косинусная близость, по умолчанию FAQ_DIRECT_THRESHOLD.
+        :return: Запись FAQ или None, если уверенного совпадения нет.
+        """
+        threshold = FAQ_DIRECT_THRESHOLD if threshold is None else threshold
+        scores = self.question_matrix @ self._vectorize(tokenize(query))
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+
+        self.direct_lookups += 1
+        hit = score >= threshold
+        if hit:
+            self.direct_hits += 1
+        logger.info(f"FAQ direct answer {'hit' if hit else 'miss'} (score={score:.3f}, threshold={threshold}), "
+                    f"hit rate: {self.direct_hits}/{self.direct_lookups} ({self.direct_hits / self.direct_lookups:.1%})")
+        return self.entries[best] if hit else None
+
+
+def configure_faq(top_k: int, direct_threshold: float, direct_cost: int) -> None:
+    """
+    Настройка поиска по FAQ сценарного режима.
+
+    :param top_k: Количество пар вопрос-ответ, передаваемых модели.
+    :param direct_threshold: Порог близости для ответа напрямую из FAQ, без LLM.
+    :param direct_cost: Стоимость ответа напрямую из FAQ (в токенах).
+    """
+    global FAQ_TOP_K, FAQ_DIRECT_THRESHOLD, FAQ_DIRECT_COST
+    FAQ_TOP_K = top_k
+    FAQ_DIRECT_THRESHOLD = direct_threshold
+    FAQ_DIRECT_COST = direct_cost
+
+
+@lru_cache(maxsize=1)
+def get_faq_index() -> FaqIndex:
+    """
+    Получение индекса FAQ сценарного режима (строится один раз).
+
+    :return: Индекс FAQ.
+    """
+    index = FaqIndex(parse_faq(AI_LEXICON['FAQ']))
+    logger.info(f"FAQ index built: {len(index.entries)} entries, {len(index.vocabulary)} terms.")
+    return index
+
+
+def build_scenary_prompt(question: str, k: Optional[int] = None) -> str:
+    """
+    Сборка промпта сценарного режима: только k наиболее релевантных пар вопрос-ответ вместо всего FAQ.
+
+    :param question: Вопрос пользователя.
+    :param k: Количество пар вопрос-ответ в промпте, по умолчанию FAQ_TOP_K.
+    :return: Промпт для модели.
+    """
+    matches = get_faq_index().search(question, k=k)
+    context = '\n'.join(f"{entry.question}\n{entry.answer}" for entry, _ in matches)
+    return f"{context}\n\n\n{AI_LEXICON['SCENARY_INSTRUCTION']}{question}"
+
+
+def evaluate(index: FaqIndex, cases: List[Dict[str, str]], k: Optional[int] = None) -> Dict[str, float]:
+    """
+    Оценка качества поиска на наборе вопросов с известной записью FAQ.
+
+    :param index: Индекс FAQ.
+    :param cases: Список словарей с ключами "question" и "expected" (вопрос из FAQ).
+    :param k: Глубина поиска, по умолчанию FAQ_TOP_K.
+    :return: Доля попаданий в top-1 и top-k и средний размер промпта.
+    """
+    k = FAQ_TOP_K if k is None else k
+    top1 = topk = 0
+    for case in cases:
+        found = [entry.question for entry, _ in index.search(case['question'], k=k)]
+        top1 += bool(found) and found[0] == case['expected']
+        topk += case['expected'] in found
+    total = len(cases) or 1
+    return {
+        "top1": top1 / total,
+        f"top{k}": topk / total,
+        "prompt_chars": sum(len(build_scenary_prompt(case['question'], k)) for case in cases) / total,
+        "full_prompt_chars": len(AI_LEXICON['PREDEFINED_PROMPT']) + sum(len(c['question']) for c in cases) / total,
+    }
+
+
+if __name__ == '__main__':
+    with open(FAQ_EVAL_PATH, encoding='utf-8') as file:
+        eval_cases = json.load(file)
+    print(json.dumps(evaluate(get_faq_index(), eval_cases), ensure_ascii=False, indent=4))
@@ -0,0 +1,157 @@
+import asyncio
+from typing import Awaitable, Dict, Hashable, Optional, TypeVar
+
+from aiogram import Bot
+from loguru import logger
+
+from app.database.requests import Database
+from app.lexicon.i18n import t
+from app.service.helpers import stream_gpt_response, stream_llama_response, stream_scenary_response
+from app.service.router import ProviderUnavailableError
+from app.service.scheduler import QueueFullError
+from app.service.streaming import send_streamed_response
+
+
+T = TypeVar('T')
+
+
+class GenerationCancelled(Exception):
+    """Генерация ответа отменена пользователем или вытеснена его новым сообщением."""
+
+
+# Потоковые ответы для каждой модели бота
+MODEL_STREAMS = {
+    'gpt4o': stream_gpt_response,
+    'llama3': stream_llama_response,
+    'scenary': stream_scenary_response,
+}
+
+
+class GenerationRegistry:
+    """
+    Реестр выполняющихся генераций ответов: не более одной задачи на ключ (обычно ID пользователя).
+
+    Каждая генерация выполняется в отдельной задаче, поэтому её можно отменить из другого
+    обработчика (/cancel, «Скрыть») или вытеснить новым сообщением того же пользователя.
+    Отмена задачи закрывает поток провайдера и освобождает его место в очереди.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self.cancelled = 0
+
+    def is_running(self, key: Hashable) -> bool:
+        task = self._tasks.get(key)
+        return task is not None and not task.done()
+
+    async def run(self, key: Hashable, coro: Awaitable[T]) -> T:
+        """
+        Запуск генерации; предыдущая генерация с тем же ключом отменяется.
+
+        :param key: Ключ генерации (ID пользователя Telegram или ID задания).
+        :param coro: Корутина генерации ответа.
+        :return: Результат корутины.
+        :raises GenerationCancelled: Если генерация была отменена.
+        """
+        if self.cancel(key):
+            logger.info(f"Previous generation ({key}) was superseded by a new message.")
+
+        task = asyncio.create_task(coro)
+        self._tasks[key] = task
+        try:
+            return await task
+        except asyncio.CancelledError:
+            # Отменили саму генерацию, а не ожидающий её обработчик
+            if task.cancelled() and not asyncio.current_task().cancelling():
+                raise GenerationCancelled(f"Generation ({key}) was cancelled.") from None
+            raise
+        finally:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+    def cancel(self, key: Hashable) -> bool:
+        """
+        Отмена выполняющейся генерации.
+
+        :param key: Ключ генерации (ID пользователя Telegram или ID задания).
+        :return: True, если генерация выполнялась и была отменена.
+        """
+        task = self._tasks.pop(key, None)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        self.cancelled += 1
+        return True
+
+    async def cancel_all(self) -> None:
+        """Отмена всех генераций (при остановке бота)."""
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info(f"Cancelled {len(tasks)} running generation(s).")
+
+
+generations = GenerationRegistry()
+
+
+async def deliver_answer(bot: Bot, chat_id: int, user_id: int, lang: str, model: str, cost: int, prompt: str,
+                         registry: Optional[GenerationRegistry] = None, key: Optional[Hashable] = None) -> Optional[str]:
+    """
+    Потоковая отправка ответа модели в чат как отменяемой генерации.
+
+    Правило списания: стоимость запроса списывается заранее и возвращается, если очередь
+    переполнена, модель недоступна или генерация отменена (/cancel, «Скрыть», новое сообщение)
+    до появления первого фрагмента ответа. Генерация, отменённая после начала ответа,
+    оплачивается полностью: пользователь уже получил часть результата.
+
+    :param bot: Объект бота.
+    :param chat_id: ID чата.
+    :param user_id: Уникальный ID пользователя Telegram.
+    :param lang: Язык пользователя.
+    :param model: Модель бота ('gpt4o', 'llama3' или 'scenary').
+    :param cost: Стоимость запроса (в токенах), уже списанная с баланса.
+    :param prompt: Текст запроса пользователя.
+    :param registry: Реестр генераций (по умолчанию общий реестр процесса).
+    :param key: Ключ генерации в реестре (по умолчанию ID пользователя).
+    :return: Полный текст ответа или None, если ответ не был получен.
+    """
+    registry = registry or generations
+    started = False
+
+    async def on_queued(position: int):
+        await bot.send_message(chat_id, t('queue_position', lang, position=position))
+
+    async def tracked_chunks():
+        nonlocal started
+        async for chunk in MODEL_STREAMS[model](prompt, user_id=user_id, on_queued=on_queued):
+            started = True
+            yield chunk
+
+    try:
+        response = await registry.run(user_id if key is None else key,
+                                      send_streamed_response(bot, chat_id, tracked_chunks()))
+    except GenerationCancelled:
+        if not started:
+            await Database.credit_tokens(user_id=user_id, amount=cost, reason=f"{model}_refund")
+        logger.info(f"Generation ({model}) of user (ID: {user_id}) was cancelled "
+                    f"{'after the answer started, tokens are not refunded' if started else 'before the answer, tokens are refunded'}.")
+        return None
+    except QueueFullError:
+        await Database.credit_tokens(user_id=user_id, amount=cost, reason=f"{model}_refund")
+        await bot.send_message(chat_id, t('queue_full', lang))
+        logger.warning(f"Queue for model {model} is full, request of user (ID: {user_id}) rejected.")
+        return None
+    except ProviderUnavailableError as e:
+        await Database.credit_tokens(user_id=user_id, amount=cost, reason=f"{model}_refund")
+        await bot.send_message(chat_id, t('model_unavailable', lang))
+        logger.error(f"Model {model} is unavailable for user (ID: {user_id}): {e}")
+        return None
+    except Exception:
+        await Database.credit_tokens(user_id=user_id, amount=cost, reason=f"{model}_refund")
+        raise
+
+    logger.info(f"Response sent to user (ID: {user_id}): {response}")
+    return response
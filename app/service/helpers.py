@@ -1,44 +1,357 @@
 import asyncio
-import os
+import hashlib
+import inspect
+import time
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+from loguru import logger
 from openai import AsyncOpenAI
 from g4f.client import Client, AsyncClient
 
 from app.lexicon.bot_lexicon import AI_LEXICON
+from app.service import faq
+from app.service.faq import build_scenary_prompt
+from app.service.metrics import (
+    registry as metrics,
+    LLM_FIRST_CHUNK,
+    LLM_STREAM_DURATION,
+    LLM_PROVIDER_ERRORS,
+    LLM_RESPONSE_DURATION
+)
+from app.service.response_cache import ResponseCache
+from app.service.router import ProviderRouter
+from app.service.scheduler import FairScheduler, QueueCallback
+from app.service.singleflight import SingleFlight, normalize_prompt
 
 
-async def get_gpt_response(prompt):
-    client = AsyncClient()
+class BoundedAsyncClient:
+    """
+    Клиент g4f с ограничениями пула httpx: провайдеры g4f открывают соединения сами,
+    поэтому количество одновременных потоков ограничивается семафором,
+    а ожидание каждого фрагмента — таймаутом чтения (первого — с учётом таймаута соединения).
+    """
 
-    response = await client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-    )
+    def __init__(self, client: AsyncClient, max_connections: int, timeout: float, connect_timeout: float):
+        """
+        :param client: Клиент g4f.
+        :param max_connections: Максимальное количество одновременных потоков.
+        :param timeout: Максимальное время ожидания очередного фрагмента (в секундах).
+        :param connect_timeout: Дополнительное время ожидания первого фрагмента (в секундах).
+        """
+        self._client = client
+        self._slots = asyncio.Semaphore(max_connections)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs) -> AsyncIterator:
+        return self._stream(kwargs)
+
+    async def _stream(self, kwargs: Dict) -> AsyncIterator:
+        async with self._slots:
+            response = self._client.chat.completions.create(**kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+            chunks = response.__aiter__()
+            timeout = self.connect_timeout + self.timeout
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        return
+                    yield chunk
+                    timeout = self.timeout
+            finally:
+                aclose = getattr(chunks, 'aclose', None)
+                if aclose is not None:
+                    await aclose()
+
+
+class LLMClientRegistry:
+    """
+    Реестр клиентов LLM-провайдеров на весь процесс.
+    Клиенты создаются лениво при первом обращении и переиспользуются между запросами,
+    сохраняя keep-alive соединения, TLS-сессии и пул соединений.
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 60.0, timeout: float = 120.0, connect_timeout: float = 10.0,
+                 llama_api_key: Optional[str] = None, llama_base_url: Optional[str] = None):
+        """
+        :param max_connections: Максимальное количество соединений с провайдером.
+        :param max_keepalive_connections: Максимальное количество простаивающих keep-alive соединений.
+        :param keepalive_expiry: Время жизни простаивающего соединения (в секундах).
+        :param timeout: Таймаут чтения, записи и ожидания соединения из пула (в секундах).
+        :param connect_timeout: Таймаут установки соединения (в секундах).
+        :param llama_api_key: Ключ API провайдера llama.
+        :param llama_base_url: Адрес API провайдера llama.
+        """
+        self._clients = {}
+        self.configure(max_connections, max_keepalive_connections, keepalive_expiry,
+                       timeout, connect_timeout, llama_api_key, llama_base_url)
+
+    def configure(self, max_connections: int, max_keepalive_connections: int, keepalive_expiry: float,
+                  timeout: float, connect_timeout: float, llama_api_key: Optional[str],
+                  llama_base_url: Optional[str]) -> None:
+        """
+        Настройка пулов соединений и доступа к провайдерам (параметры см. в __init__).
+        Вызывается до первого запроса: уже созданные клиенты не пересоздаются.
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.llama_api_key = llama_api_key
+        self.llama_base_url = llama_base_url
+
+    def _build_http_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+        )
+
+    def _create(self, name: str):
+        if name == 'g4f':
+            return BoundedAsyncClient(AsyncClient(), max_connections=self.max_connections,
+                                      timeout=self.timeout, connect_timeout=self.connect_timeout)
+        if name == 'llama':
+            return AsyncOpenAI(
+                api_key=self.llama_api_key,
+                base_url=self.llama_base_url,
+                http_client=self._build_http_client(),
+            )
+        raise ValueError(f"Unknown LLM client: {name}")
+
+    def get(self, name: str):
+        """
+        Получение клиента провайдера по имени ('g4f' или 'llama').
+
+        :param name: Имя провайдера.
+        :return: Клиент провайдера.
+        """
+        client = self._clients.get(name)
+        if client is None:
+            client = self._clients[name] = self._create(name)
+            logger.info(f"LLM client '{name}' has been created.")
+        return client
+
+    async def close(self) -> None:
+        """Закрытие всех клиентов и их пулов соединений."""
+        for client in self._clients.values():
+            close = getattr(client, 'close', None)
+            if close is not None and asyncio.iscoroutinefunction(close):
+                await close()
+        self._clients.clear()
+        logger.info("LLM clients have been closed.")
 
-    return response.choices[0].message.content
 
+# Пулы соединений и доступ к провайдерам настраиваются в main() через clients.configure
+clients = LLMClientRegistry()
 
-async def get_llama_response(prompt):
-    client = AsyncOpenAI(api_key=os.environ.get("LLAMA_API_KEY"), base_url=os.environ.get("LLAMA_BASE_URL"))
-    response = await client.chat.completions.create(
-        model="meta-llama/Meta-Llama-3-70B-Instruct-Lite",
-        messages=[{"role": "user", "content": prompt}],
-        # Add any other necessary parameters
+# Модель, запрашиваемая у каждого провайдера
+PROVIDER_MODELS = {
+    'g4f': "gpt-4o-mini",
+    'llama': "meta-llama/Meta-Llama-3-70B-Instruct-Lite",
+}
+
+
+async def stream_completion(provider: str, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+    """
+    Потоковое получение ответа провайдера по частям.
+
+    :param provider: Имя провайдера ('g4f' или 'llama').
+    :param messages: Сообщения диалога.
+    :return: Асинхронный генератор фрагментов текста ответа.
+    """
+    client = clients.get(provider)
+    response = client.chat.completions.create(
+        model=PROVIDER_MODELS[provider],
+        messages=messages,
+        stream=True
     )
+    # AsyncOpenAI возвращает корутину, g4f — сразу асинхронный итератор
+    if inspect.isawaitable(response):
+        response = await response
+
+    async for chunk in response:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
+
+async def timed_stream_completion(provider: str, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+    """
+    Вызов провайдера с метриками: время до первого фрагмента, длительность потока
+    по исходу (ok, error или cancelled — поток закрыт раньше конца) и количество ошибок.
+    """
+    started = time.perf_counter()
+    first = True
+    outcome = 'cancelled'
+    try:
+        async for chunk in stream_completion(provider, messages):
+            if first:
+                LLM_FIRST_CHUNK.observe(time.perf_counter() - started, provider=provider)
+                first = False
+            yield chunk
+        outcome = 'ok'
+    except Exception:
+        outcome = 'error'
+        LLM_PROVIDER_ERRORS.inc(provider=provider)
+        raise
+    finally:
+        LLM_STREAM_DURATION.observe(time.perf_counter() - started, provider=provider, outcome=outcome)
+
+# Порядок провайдеров для каждой модели бота: основной и резервный
+MODEL_ROUTES = {
+    'gpt4o': ['g4f', 'llama'],
+    'llama3': ['llama', 'g4f'],
+    'scenary': ['g4f', 'llama'],
+}
+
+# Ограничители одновременных запросов к каждому провайдеру; лимиты задаются в main() через configure_schedulers
+schedulers = {provider: FairScheduler(provider) for provider in PROVIDER_MODELS}
+
+metrics.gauge('llm_queue_depth', 'Requests waiting for a provider slot.', ('provider',),
+              collect=lambda: {(name,): scheduler.queue_depth for name, scheduler in schedulers.items()})
+metrics.gauge('llm_active_requests', 'Requests holding a provider slot.', ('provider',),
+              collect=lambda: {(name,): scheduler.active for name, scheduler in schedulers.items()})
+
+
+def configure_schedulers(concurrency: Dict[str, int], max_queue: Dict[str, int]) -> None:
+    """
+    Настройка ограничителей одновременных запросов к провайдерам.
+
+    :param concurrency: Максимальное количество одновременных запросов для каждого провайдера.
+    :param max_queue: Максимальная глубина очереди для каждого провайдера.
+    """
+    for provider, scheduler in schedulers.items():
+        scheduler.configure(concurrency=concurrency.get(provider, scheduler.concurrency),
+                            max_queue=max_queue.get(provider, scheduler.max_queue))
 
-    return response.choices[0].message.content
 
+# Таймауты, повторы и хеджирование настраиваются из конфигурации в main() через router.configure
+router = ProviderRouter(timed_stream_completion, MODEL_ROUTES, schedulers=schedulers)
 
-async def get_scenary_response(prompt):
-    client = AsyncClient()
-    response = await client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": AI_LEXICON['PREDEFINED_PROMPT'] + prompt}],
+# Одинаковые одновременные запросы к модели разделяют один вызов провайдера
+flights = SingleFlight()
+
+# Кэш ответов по точному совпадению запроса; TTL, объём и версии задаются в main() через configure_response_cache
+response_cache = ResponseCache()
+
+
+def prompt_template_versions(version: str) -> Dict[str, str]:
+    """
+    Версии шаблонов промптов для ключей кэша ответов. Версия LLM_CACHE_VERSION меняется вручную,
+    для сценарного режима к ней добавляется хэш FAQ, инструкции и FAQ_TOP_K,
+    чтобы правка лексикона или настроек поиска сбрасывала кэш автоматически.
+
+    :param version: Версия шаблонов, заданная в конфигурации.
+    :return: Версия шаблона для каждой модели бота.
+    """
+    scenary_digest = hashlib.sha256(
+        f"{AI_LEXICON['FAQ']}{AI_LEXICON['SCENARY_INSTRUCTION']}{faq.FAQ_TOP_K}".encode('utf-8')
+    ).hexdigest()[:12]
+    return {
+        'gpt4o': version,
+        'llama3': version,
+        'scenary': f"{version}-{scenary_digest}",
+    }
+
+
+def configure_response_cache(ttls: Dict[str, int], default_ttl: int, max_bytes: int, version: str) -> None:
+    """
+    Настройка кэша ответов моделей.
+
+    :param ttls: Время жизни ответов для каждой модели (в секундах).
+    :param default_ttl: Время жизни ответов остальных моделей (в секундах).
+    :param max_bytes: Максимальный объём локального кэша (в байтах).
+    :param version: Версия шаблонов промптов (LLM_CACHE_VERSION).
+    """
+    response_cache.configure(ttls=ttls, default_ttl=default_ttl, max_bytes=max_bytes,
+                             versions=prompt_template_versions(version))
+
+
+async def _collect(chunks: AsyncIterator[str]) -> str:
+    return ''.join([chunk async for chunk in chunks])
+
+
+async def get_gpt_response(prompt, user_id: int = 0):
+    return await _collect(stream_gpt_response(prompt, user_id))
+
+
+async def get_llama_response(prompt, user_id: int = 0):
+    return await _collect(stream_llama_response(prompt, user_id))
+
+
+async def get_scenary_response(prompt, user_id: int = 0):
+    return await _collect(stream_scenary_response(prompt, user_id))
+
+
+async def _cached_stream(model: str, key: str, content: str, user_id: int,
+                         on_queued: Optional[QueueCallback]) -> AsyncIterator[str]:
+    """Поток ответа провайдера, сохраняющий полный ответ в кэш после успешного завершения."""
+    chunks = []
+    async for chunk in router.stream(model, [{"role": "user", "content": content}],
+                                     user_id=user_id, on_queued=on_queued):
+        chunks.append(chunk)
+        yield chunk
+    response = ''.join(chunks)
+    if response:
+        await response_cache.set(model, key, response)
+
+
+async def _stream(model: str, prompt: str, build_content: Callable[[str], str], user_id: int,
+                  on_queued: Optional[QueueCallback]) -> AsyncIterator[str]:
+    """
+    Потоковый ответ модели: сначала из кэша, иначе через провайдера
+    с объединением одинаковых одновременных запросов.
+
+    :param model: Модель бота.
+    :param prompt: Исходный текст пользователя: точный ключ кэша и, после нормализации, ключ объединения.
+    :param build_content: Функция, собирающая из текста пользователя текст для модели.
+    :param user_id: ID пользователя для честного распределения мест у провайдеров.
+    :param on_queued: Корутина, вызываемая с позицией в очереди, если запросу приходится ждать.
+    :return: Асинхронный генератор фрагментов ответа.
+    """
+    started = time.perf_counter()
+    # Кэш учитывает регистр: от него может зависеть ответ (код, идентификаторы, аббревиатуры)
+    key = prompt.strip()
+    cached = await response_cache.get(model, key)
+    if cached is not None:
+        LLM_RESPONSE_DURATION.observe(time.perf_counter() - started, model=model, source='cache')
+        yield cached
+        return
+
+    stream = flights.stream(
+        (model, normalize_prompt(prompt)),
+        lambda: _cached_stream(model, key, build_content(prompt), user_id, on_queued),
     )
+    try:
+        async for chunk in stream:
+            yield chunk
+        LLM_RESPONSE_DURATION.observe(time.perf_counter() - started, model=model, source='provider')
+    finally:
+        await stream.aclose()
+
+
+def stream_gpt_response(prompt, user_id: int = 0, on_queued: Optional[QueueCallback] = None) -> AsyncIterator[str]:
+    return _stream('gpt4o', prompt, str, user_id, on_queued)
+
+
+def stream_llama_response(prompt, user_id: int = 0, on_queued: Optional[QueueCallback] = None) -> AsyncIterator[str]:
+    return _stream('llama3', prompt, str, user_id, on_queued)
 
-    return response.choices[0].message.content
 
+def stream_scenary_response(prompt, user_id: int = 0, on_queued: Optional[QueueCallback] = None) -> AsyncIterator[str]:
+    return _stream('scenary', prompt, build_scenary_prompt, user_id, on_queued)
@@ -0,0 +1,259 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Dict, Optional
+
+from aiogram import Bot
+from loguru import logger
+from redis.exceptions import ResponseError
+
+from app.database.requests import Database
+from app.lexicon.i18n import t
+from app.service.generations import GenerationRegistry, deliver_answer
+
+
+class GenerationJobs:
+    """
+    Очередь заданий генерации в Redis Streams для вынесения LLM-запросов в отдельные процессы.
+
+    Обработчики бота добавляют задания в поток (XADD), процессы-исполнители читают их через
+    группу потребителей (XREADGROUP) и отправляют ответ в чат сами. Задание подтверждается (XACK)
+    после обработки; задания упавшего исполнителя забираются другими через XAUTOCLAIM.
+    Пока задание выполняется, исполнитель периодически продлевает владение им (XCLAIM),
+    чтобы долгая генерация не была перехвачена.
+
+    Отмена: у каждого пользователя хранится ID последнего задания. /cancel удаляет его,
+    новое сообщение перезаписывает — задание, переставшее быть последним, не начинается
+    или прерывается исполнителем.
+    """
+
+    def __init__(self, stream: str = 'llm:jobs', group: str = 'llm-workers', maxlen: int = 10_000,
+                 claim_idle: int = 60_000, max_deliveries: int = 3, latest_ttl: int = 3600,
+                 cancel_poll: float = 1.0, block: int = 5000):
+        """
+        :param stream: Имя потока заданий.
+        :param group: Имя группы потребителей.
+        :param maxlen: Примерная максимальная длина потока.
+        :param claim_idle: Время простоя задания, после которого его забирает другой исполнитель (в мс).
+        :param max_deliveries: Максимальное количество попыток выполнения задания.
+        :param latest_ttl: Время хранения ID последнего задания пользователя (в секундах).
+        :param cancel_poll: Интервал проверки отмены и продления владения заданием (в секундах).
+        :param block: Время ожидания новых заданий в XREADGROUP (в мс).
+        """
+        self.stream = stream
+        self.group = group
+        self.maxlen = maxlen
+        self.claim_idle = claim_idle
+        self.max_deliveries = max_deliveries
+        self.latest_ttl = latest_ttl
+        self.cancel_poll = cancel_poll
+        self.block = block
+        self.redis = None
+
+        self.processed = 0
+        self.recovered = 0
+
+    def configure(self, stream: str, group: str, claim_idle: int, max_deliveries: int) -> None:
+        """
+        Настройка очереди заданий (параметры см. в __init__). Вызывается до attach_redis.
+        """
+        self.stream = stream
+        self.group = group
+        self.claim_idle = claim_idle
+        self.max_deliveries = max_deliveries
+
+    def attach_redis(self, redis) -> None:
+        """
+        Подключение Redis: после этого генерация выполняется процессами-исполнителями.
+
+        :param redis: Асинхронный клиент Redis.
+        """
+        self.redis = redis
+        logger.info(f"LLM generation is delegated to workers via Redis stream '{self.stream}'.")
+
+    @property
+    def enabled(self) -> bool:
+        return self.redis is not None
+
+    def _latest_key(self, user_id: int) -> str:
+        return f"{self.stream}:latest:{user_id}"
+
+    async def enqueue(self, user_id: int, chat_id: int, lang: str, model: str, cost: int, prompt: str) -> str:
+        """
+        Добавление задания генерации в очередь. Предыдущее задание пользователя считается вытесненным.
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        :param chat_id: ID чата для отправки ответа.
+        :param lang: Язык пользователя.
+        :param model: Модель бота.
+        :param cost: Стоимость запроса (в токенах), уже списанная с баланса.
+        :param prompt: Текст запроса пользователя.
+        :return: ID задания.
+        """
+        job_id = uuid.uuid4().hex
+        # ID последнего задания записывается раньше самого задания, чтобы исполнитель не счёл его вытесненным
+        await self.redis.set(self._latest_key(user_id), job_id, ex=self.latest_ttl)
+        await self.redis.xadd(self.stream, {
+            "job_id": job_id,
+            "user_id": user_id,
+            "chat_id": chat_id,
+            "lang": lang,
+            "model": model,
+            "cost": cost,
+            "prompt": prompt,
+            "created_at": time.time(),
+        }, maxlen=self.maxlen, approximate=True)
+        logger.info(f"Generation job {job_id} ({model}) of user (ID: {user_id}) was queued.")
+        return job_id
+
+    async def cancel(self, user_id: int) -> bool:
+        """
+        Отмена ожидающего или выполняющегося задания пользователя.
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        :return: True, если у пользователя было задание.
+        """
+        return bool(await self.redis.delete(self._latest_key(user_id)))
+
+    async def _is_latest(self, user_id: int, job_id: str) -> bool:
+        latest = await self.redis.get(self._latest_key(user_id))
+        return latest is not None and latest.decode() == job_id
+
+    async def ensure_group(self) -> None:
+        """Создание группы потребителей (и потока), если их ещё нет."""
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+            logger.info(f"Consumer group '{self.group}' was created for stream '{self.stream}'.")
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def _watch(self, consumer: str, message_id: bytes, job: Dict[str, str],
+                     registry: GenerationRegistry) -> None:
+        """Продление владения заданием и прерывание генерации, если задание отменено или вытеснено."""
+        claimed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.cancel_poll)
+            try:
+                if time.monotonic() - claimed_at >= self.claim_idle / 3000:
+                    # JUSTID не увеличивает счётчик попыток доставки
+                    await self.redis.xclaim(self.stream, self.group, consumer, min_idle_time=0,
+                                            message_ids=[message_id], justid=True)
+                    claimed_at = time.monotonic()
+                if not await self._is_latest(int(job['user_id']), job['job_id']):
+                    registry.cancel(job['job_id'])
+                    return
+            except Exception as e:
+                logger.error(f"Error watching generation job {job['job_id']}: {e}")
+
+    async def _give_up(self, bot: Bot, job: Dict[str, str]) -> None:
+        """Отказ от задания после исчерпания попыток: возврат токенов и уведомление пользователя."""
+        user_id = int(job['user_id'])
+        await Database.credit_tokens(user_id=user_id, amount=int(job['cost']), reason=f"{job['model']}_refund")
+        await bot.send_message(int(job['chat_id']), t('model_unavailable', job['lang']))
+        logger.error(f"Generation job {job['job_id']} of user (ID: {user_id}) failed {self.max_deliveries} times, giving up.")
+
+    async def _handle(self, bot: Bot, consumer: str, message_id: bytes, job: Dict[str, str],
+                      registry: GenerationRegistry, recovered: bool) -> None:
+        user_id = int(job['user_id'])
+        if recovered:
+            pending = await self.redis.xpending_range(self.stream, self.group, min=message_id, max=message_id, count=1)
+            if pending and pending[0]['times_delivered'] > self.max_deliveries:
+                await self._give_up(bot, job)
+                return
+            logger.warning(f"Recovered generation job {job['job_id']} of user (ID: {user_id}).")
+
+        if not await self._is_latest(user_id, job['job_id']):
+            # Задание отменено или вытеснено до начала генерации
+            await Database.credit_tokens(user_id=user_id, amount=int(job['cost']), reason=f"{job['model']}_refund")
+            logger.info(f"Generation job {job['job_id']} of user (ID: {user_id}) was cancelled before it started.")
+            return
+
+        watcher = asyncio.create_task(self._watch(consumer, message_id, job, registry))
+        try:
+            await deliver_answer(bot, int(job['chat_id']), user_id, job['lang'], job['model'], int(job['cost']),
+                                 job['prompt'], registry=registry, key=job['job_id'])
+        finally:
+            watcher.cancel()
+
+    async def _process(self, bot: Bot, consumer: str, message_id: bytes, fields: Dict[bytes, bytes],
+                       registry: GenerationRegistry, recovered: bool = False) -> None:
+        job = {key.decode(): value.decode() for key, value in fields.items()}
+        try:
+            await self._handle(bot, consumer, message_id, job, registry, recovered)
+        except asyncio.CancelledError:
+            # Исполнитель останавливается: задание не подтверждается и будет забрано другим
+            raise
+        except Exception as e:
+            logger.error(f"Error processing generation job {job['job_id']}: {e}")
+
+        await self.redis.xack(self.stream, self.group, message_id)
+        await self.redis.xdel(self.stream, message_id)
+        self.processed += 1
+
+    async def consume(self, bot: Bot, consumer: str, registry: GenerationRegistry) -> None:
+        """
+        Цикл исполнителя: сначала забираются зависшие задания, затем читаются новые.
+
+        :param bot: Объект бота для отправки ответов.
+        :param consumer: Уникальное имя потребителя в группе.
+        :param registry: Реестр генераций процесса-исполнителя.
+        """
+        next_claim_at = 0.0
+        while True:
+            try:
+                messages, recovered = [], False
+                if time.monotonic() >= next_claim_at:
+                    _, messages, *_ = await self.redis.xautoclaim(self.stream, self.group, consumer,
+                                                                  min_idle_time=self.claim_idle, count=1)
+                    recovered = bool(messages)
+                    if not messages:
+                        next_claim_at = time.monotonic() + self.claim_idle / 2000
+                if not messages:
+                    response = await self.redis.xreadgroup(self.group, consumer, {self.stream: '>'},
+                                                           count=1, block=self.block)
+                    messages = response[0][1] if response else []
+
+                for message_id, fields in messages:
+                    if message_id is None:
+                        continue
+                    if not fields:
+                        # Задание было удалено из потока, но осталось в списке ожидающих
+                        await self.redis.xack(self.stream, self.group, message_id)
+                        continue
+                    if recovered:
+                        self.recovered += 1
+                    await self._process(bot, consumer, message_id, fields, registry, recovered=recovered)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error reading generation jobs: {e}")
+                await asyncio.sleep(1)
+
+    async def run_workers(self, bot: Bot, concurrency: int = 4, name: Optional[str] = None) -> None:
+        """
+        Запуск исполнителей заданий в текущем процессе.
+
+        :param bot: Объект бота для отправки ответов.
+        :param concurrency: Количество одновременно обрабатываемых заданий.
+        :param name: Префикс имён потребителей (по умолчанию хост и PID процесса).
+        """
+        await self.ensure_group()
+        name = name or f"{socket.gethostname()}-{os.getpid()}"
+        registry = GenerationRegistry()
+        consumers = [asyncio.create_task(self.consume(bot, f"{name}-{i}", registry)) for i in range(concurrency)]
+        logger.info(f"Started {concurrency} generation worker(s) '{name}'.")
+        try:
+            await asyncio.gather(*consumers)
+        finally:
+            for task in consumers:
+                task.cancel()
+            await asyncio.gather(*consumers, return_exceptions=True)
+            await registry.cancel_all()
+            logger.info(f"Generation workers '{name}' stopped: {self.processed} processed, {self.recovered} recovered.")
+
+
+# Имена потока и группы и параметры повторной доставки задаются в main() через jobs.configure
+jobs = GenerationJobs()
@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+from loguru import logger
+
+from app.database.requests import Database
+
+ASSETS_DIR = Path(__file__).resolve().parent.parent / 'database'
+AGREEMENT_PDF = ASSETS_DIR / 'Пользовательское соглашение.pdf'
+
+
+class MediaRegistry:
+    """
+    Реестр статических файлов бота: каждый файл загружается в Telegram один раз,
+    после чего отправляется по сохранённому file_id.
+
+    file_id хранится в базе данных по SHA-256 содержимого, поэтому изменённый файл
+    загружается заново, а перезапуск бота не требует повторной загрузки.
+    """
+
+    def __init__(self):
+        self.__file_ids: Dict[Tuple[int, str], str] = {}
+        self.__hashes: Dict[Path, Tuple[int, int, str]] = {}
+        self.__locks: Dict[Tuple[int, str], asyncio.Lock] = {}
+
+        self.uploads = 0
+        self.reused = 0
+
+    def content_hash(self, path: Path) -> str:
+        """
+        SHA-256 содержимого файла; пересчитывается только при изменении размера или времени изменения файла.
+
+        :param path: Путь к файлу.
+        :return: Хэш содержимого в шестнадцатеричном виде.
+        """
+        stat = os.stat(path)
+        cached = self.__hashes.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        self.__hashes[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    async def send_document(self, message: Message, path: Path, caption: Optional[str] = None) -> Message:
+        """
+        Отправка файла в чат сообщения: по file_id, если файл уже загружался, иначе с загрузкой.
+
+        :param message: Сообщение, в чат которого отправляется файл.
+        :param path: Путь к файлу.
+        :param caption: Подпись к файлу.
+        :return: Отправленное сообщение.
+        """
+        key = (message.bot.id, self.content_hash(path))
+
+        file_id = self.__file_ids.get(key) or await Database.get_media_file_id(*key)
+        if file_id is None:
+            # Одновременные /start ждут первую загрузку, а не загружают файл каждый сам
+            async with self.__locks.setdefault(key, asyncio.Lock()):
+                file_id = self.__file_ids.get(key)
+                if file_id is None:
+                    return await self.__upload(message, path, key, caption)
+
+        try:
+            sent = await message.answer_document(file_id, caption=caption)
+        except TelegramBadRequest as e:
+            logger.warning(f"Stored file_id of {path.name} was rejected, uploading again: {e}")
+            self.__file_ids.pop(key, None)
+            return await self.__upload(message, path, key, caption)
+
+        self.__file_ids[key] = file_id
+        self.reused += 1
+        return sent
+
+    async def __upload(self, message: Message, path: Path, key: Tuple[int, str], caption: Optional[str]) -> Message:
+        sent = await message.answer_document(FSInputFile(path), caption=caption)
+        self.uploads += 1
+        file_id = sent.document.file_id
+        self.__file_ids[key] = file_id
+        await Database.save_media_file_id(*key, name=path.name, file_id=file_id)
+        logger.info(f"Media asset {path.name} was uploaded to Telegram.")
+        return sent
+
+    def stats(self) -> Dict[str, int]:
+        return {"uploads": self.uploads, "reused": self.reused}
+
+
+media = MediaRegistry()
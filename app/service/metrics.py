@@ -0,0 +1,220 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+from loguru import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Базовый класс метрики с набором меток."""
+
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Монотонно растущий счётчик."""
+
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.__values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self.__values[key] = self.__values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for key, value in self.__values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """
+    Текущее значение; вместо set можно передать функцию, вычисляющую значения
+    по меткам в момент запроса метрик (например, глубину очередей).
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 collect: Optional[Callable[[], Dict[LabelValues, float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.__values: Dict[LabelValues, float] = {}
+        self.collect = collect
+
+    def set(self, value: float, **labels) -> None:
+        self.__values[self._key(labels)] = value
+
+    def samples(self) -> Iterable[str]:
+        values = dict(self.__values)
+        if self.collect is not None:
+            try:
+                values.update(self.collect())
+            except Exception as e:
+                logger.error(f"Error collecting metric {self.name}: {e}")
+        for key, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    """
+    Гистограмма длительностей с фиксированными границами корзин.
+    Квантили (p50/p95/p99) считаются на стороне Prometheus через histogram_quantile.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # Для каждого набора меток: количества по корзинам (не накопительные) и сумма значений
+        self.__counts: Dict[LabelValues, List[int]] = {}
+        self.__sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        counts = self.__counts.get(key)
+        if counts is None:
+            counts = self.__counts[key] = [0] * len(self.buckets)
+            self.__sums[key] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self.__sums[key] += value
+
+    def samples(self) -> Iterable[str]:
+        for key, counts in self.__counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(self.__sums[key])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик процесса в текстовом формате Prometheus.
+    Метрики изменяются только из потока цикла событий, поэтому блокировки не нужны.
+    """
+
+    def __init__(self):
+        self.__metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.__metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self.__metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              collect: Optional[Callable[[], Dict[LabelValues, float]]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self.__metrics.values()) + '\n'
+
+
+registry = MetricsRegistry()
+
+# Обработчики бота
+HANDLER_DURATION = registry.histogram(
+    'bot_handler_duration_seconds', 'Handler execution time.', ('handler', 'event'))
+HANDLER_ERRORS = registry.counter(
+    'bot_handler_errors_total', 'Unhandled exceptions raised by handlers.', ('handler', 'event'))
+
+# База данных
+DB_QUERY_DURATION = registry.histogram(
+    'db_query_duration_seconds', 'SQL statement execution time.', ('operation',))
+DB_QUERY_ERRORS = registry.counter(
+    'db_query_errors_total', 'Failed SQL statements.', ('operation',))
+
+# LLM-провайдеры и модели
+LLM_FIRST_CHUNK = registry.histogram(
+    'llm_provider_first_chunk_seconds', 'Time from provider call to the first response chunk.', ('provider',))
+LLM_STREAM_DURATION = registry.histogram(
+    'llm_provider_stream_seconds', 'Full provider stream duration.', ('provider', 'outcome'),
+    buckets=DEFAULT_BUCKETS + (120.0, 300.0))
+LLM_PROVIDER_ERRORS = registry.counter(
+    'llm_provider_errors_total', 'Failed provider calls.', ('provider',))
+LLM_RESPONSE_DURATION = registry.histogram(
+    'llm_response_duration_seconds', 'Model response time as seen by the bot (cache, coalescing and providers).',
+    ('model', 'source'), buckets=DEFAULT_BUCKETS + (120.0, 300.0))
+
+# Токены пользователей
+TOKENS_SPENT = registry.counter('tokens_spent_total', 'Tokens debited from user balances.', ('reason',))
+TOKENS_CREDITED = registry.counter('tokens_credited_total', 'Tokens credited to user balances.', ('reason',))
+
+
+async def start_metrics_server(host: str = '127.0.0.1', port: int = 9100, path: str = '/metrics') -> web.AppRunner:
+    """
+    Запуск HTTP-сервера метрик в формате Prometheus.
+
+    :param host: Адрес сервера (по умолчанию только локальный).
+    :param port: Порт сервера.
+    :param path: Путь к метрикам.
+    :return: AppRunner сервера (для остановки).
+    :raises OSError: Порт занят: каждому процессу на хосте нужен свой порт метрик.
+    """
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    app = web.Application()
+    app.router.add_get(path, handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logger.error(f"Metrics server could not start on {host}:{port}: {e}")
+        await runner.cleanup()
+        raise
+    logger.info(f"Metrics are exposed on http://{host}:{port}{path}")
+    return runner
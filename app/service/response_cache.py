@@ -0,0 +1,217 @@
+import hashlib
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from loguru import logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+_ZLIB = b'z'
+_ZSTD = b's'
+
+
+def compress(text: str, level: int = 6) -> bytes:
+    """
+    Сжатие текста ответа: zstd, если установлен пакет zstandard, иначе zlib.
+    Первый байт результата обозначает алгоритм, чтобы процессы с разными настройками понимали друг друга.
+
+    :param text: Текст ответа.
+    :param level: Уровень сжатия.
+    :return: Сжатые данные.
+    """
+    data = text.encode('utf-8')
+    if zstandard is not None:
+        return _ZSTD + zstandard.ZstdCompressor(level=level).compress(data)
+    return _ZLIB + zlib.compress(data, level)
+
+
+def decompress(payload: bytes) -> str:
+    """
+    Распаковка текста ответа, сжатого функцией compress.
+
+    :param payload: Сжатые данные.
+    :return: Текст ответа.
+    """
+    codec, data = payload[:1], payload[1:]
+    if codec == _ZSTD:
+        if zstandard is None:
+            raise ValueError("Response is compressed with zstd, but zstandard is not installed.")
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    if codec == _ZLIB:
+        return zlib.decompress(data).decode('utf-8')
+    raise ValueError(f"Unknown response cache codec: {codec!r}")
+
+
+class ResponseCache:
+    """
+    Кэш ответов моделей по точному совпадению запроса.
+
+    Ключ — модель, версия шаблона промпта и хэш текста запроса (с учётом регистра). Ответы хранятся
+    в сжатом виде: локально в LRU, ограниченном по объёму, и, при подключении, в Redis,
+    общем для всех экземпляров бота. Время жизни задаётся отдельно для каждой модели.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, int]] = None, default_ttl: int = 3600,
+                 max_bytes: int = 16 * 1024 * 1024, versions: Optional[Dict[str, str]] = None,
+                 key_prefix: str = 'llm_response'):
+        """
+        :param ttls: Время жизни ответов для каждой модели (в секундах).
+        :param default_ttl: Время жизни ответов моделей, не указанных в ttls (в секундах).
+        :param max_bytes: Максимальный объём сжатых ответов в локальном кэше (в байтах).
+        :param versions: Версия шаблона промпта для каждой модели; при её смене старые ответы не используются.
+        :param key_prefix: Префикс ключей в Redis.
+        """
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.versions = versions or {}
+        self.key_prefix = key_prefix
+        self.redis = None
+
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, ttls: Dict[str, int], default_ttl: int, max_bytes: int, versions: Dict[str, str]) -> None:
+        """
+        Настройка времени жизни, объёма и версий шаблонов (параметры см. в __init__).
+        Локальный кэш очищается: записи могли быть сохранены под другими версиями и TTL.
+        """
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.versions = versions
+        self.clear()
+
+    def attach_redis(self, redis) -> None:
+        """
+        Подключение Redis в качестве общего уровня кэша.
+
+        :param redis: Асинхронный клиент Redis.
+        """
+        self.redis = redis
+        logger.info("LLM response cache is now backed by Redis.")
+
+    def ttl(self, model: str) -> int:
+        return self.ttls.get(model, self.default_ttl)
+
+    def key(self, model: str, prompt: str) -> str:
+        """
+        Ключ кэша для запроса.
+
+        :param model: Модель бота.
+        :param prompt: Текст запроса без начальных и конечных пробелов.
+        :return: Ключ кэша.
+        """
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return f"{self.key_prefix}:{model}:{self.versions.get(model, '0')}:{digest}"
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at < time.monotonic():
+            self._pop_local(key)
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    def _pop_local(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def _set_local(self, key: str, payload: bytes, ttl: float) -> None:
+        self._pop_local(key)
+        if len(payload) > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + ttl, payload)
+        self._size += len(payload)
+        while self._size > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    async def get(self, model: str, prompt: str) -> Optional[str]:
+        """
+        Получение закэшированного ответа модели.
+
+        :param model: Модель бота.
+        :param prompt: Текст запроса без начальных и конечных пробелов.
+        :return: Текст ответа или None при промахе.
+        """
+        key = self.key(model, prompt)
+        payload = self._get_local(key)
+        if payload is None and self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    payload, ttl = await pipe.get(key).ttl(key).execute()
+            except Exception as e:
+                logger.error(f"Error reading LLM response cache from Redis: {e}")
+                payload = None
+            if payload is not None:
+                self._set_local(key, payload, ttl if ttl > 0 else self.ttl(model))
+
+        if payload is not None:
+            try:
+                response = decompress(payload)
+            except Exception as e:
+                logger.error(f"Error decoding cached LLM response: {e}")
+                self._pop_local(key)
+                response = None
+            if response is not None:
+                self.hits += 1
+                return response
+
+        self.misses += 1
+        return None
+
+    async def set(self, model: str, prompt: str, response: str) -> None:
+        """
+        Сохранение ответа модели в кэш.
+
+        :param model: Модель бота.
+        :param prompt: Текст запроса без начальных и конечных пробелов.
+        :param response: Полный текст ответа.
+        """
+        key = self.key(model, prompt)
+        ttl = self.ttl(model)
+        payload = compress(response)
+        self._set_local(key, payload, ttl)
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, payload, ex=ttl)
+            except Exception as e:
+                logger.error(f"Error writing LLM response cache to Redis: {e}")
+
+    def clear(self) -> None:
+        """Очистка локального уровня кэша."""
+        self._entries.clear()
+        self._size = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, any]:
+        """
+        Статистика работы кэша.
+
+        :return: Словарь с количеством попаданий, промахов, долей попаданий, числом записей и их объёмом.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "size": len(self._entries),
+            "bytes": self._size,
+        }
@@ -0,0 +1,280 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.service.scheduler import FairScheduler, QueueCallback, Slot
+
+
+class ProviderError(Exception):
+    """Ошибка отдельной попытки запроса к провайдеру."""
+
+    def __init__(self, provider: str, message: str = ''):
+        super().__init__(f"Provider '{provider}' failed: {message}")
+        self.provider = provider
+
+
+class ProviderUnavailableError(Exception):
+    """Ни один провайдер не смог ответить после всех попыток."""
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель провайдера: после failure_threshold ошибок подряд
+    провайдер исключается из маршрутизации на время cooldown.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self.open_until
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self) -> bool:
+        """
+        Учёт неудачной попытки.
+
+        :return: True, если выключатель только что разомкнулся.
+        """
+        self.failures += 1
+        if self.failures >= self.failure_threshold and not self.is_open:
+            self.open_until = time.monotonic() + self.cooldown
+            return True
+        return False
+
+
+class LatencyTracker:
+    """Скользящее окно задержек до первого фрагмента ответа для оценки p95."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def observe(self, latency: float) -> None:
+        self.samples.append(latency)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+StreamFactory = Callable[[str, List[Dict[str, str]]], AsyncIterator[str]]
+
+
+class ProviderRouter:
+    """
+    Маршрутизатор запросов к LLM-провайдерам.
+
+    Для каждой модели задан упорядоченный список провайдеров. Попытка ограничена таймаутом
+    до первого фрагмента ответа; при ошибке запрос сразу уходит следующему провайдеру,
+    а полный круг повторяется с экспоненциальной задержкой и случайным разбросом.
+    В режиме хеджирования второй провайдер запускается, если первый не ответил за p95
+    своей обычной задержки; побеждает ответивший первым, проигравший отменяется.
+    Провайдер с серией ошибок отключается выключателем на время охлаждения.
+    """
+
+    def __init__(self,
+                 stream_factory: StreamFactory,
+                 routes: Dict[str, List[str]],
+                 attempt_timeout: float = 30.0,
+                 retries: int = 1,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 5.0,
+                 hedge: bool = False,
+                 hedge_min_delay: float = 2.0,
+                 failure_threshold: int = 3,
+                 cooldown: float = 60.0,
+                 schedulers: Optional[Dict[str, FairScheduler]] = None):
+        """
+        :param stream_factory: Функция (провайдер, сообщения) -> асинхронный генератор фрагментов.
+        :param routes: Порядок провайдеров для каждой модели.
+        :param attempt_timeout: Таймаут попытки до первого фрагмента и между фрагментами (в секундах).
+        :param retries: Количество повторных кругов по всем провайдерам.
+        :param backoff_base: Базовая задержка перед повтором (в секундах).
+        :param backoff_max: Максимальная задержка перед повтором (в секундах).
+        :param hedge: Включить хеджирование запросов.
+        :param hedge_min_delay: Минимальная задержка перед хеджирующим запросом (в секундах).
+        :param failure_threshold: Количество ошибок подряд до размыкания выключателя.
+        :param cooldown: Время, на которое провайдер исключается из маршрутизации (в секундах).
+        :param schedulers: Ограничители одновременных запросов для провайдеров.
+        """
+        self.stream_factory = stream_factory
+        self.routes = routes
+        self.schedulers = schedulers or {}
+        self.providers = {provider for route in routes.values() for provider in route}
+        self.latency = {provider: LatencyTracker() for provider in self.providers}
+        self.configure(attempt_timeout=attempt_timeout, retries=retries, backoff_base=backoff_base,
+                       backoff_max=backoff_max, hedge=hedge, hedge_min_delay=hedge_min_delay,
+                       failure_threshold=failure_threshold, cooldown=cooldown)
+
+    def configure(self, attempt_timeout: float, retries: int, backoff_base: float, backoff_max: float,
+                  hedge: bool, hedge_min_delay: float, failure_threshold: int, cooldown: float) -> None:
+        """
+        Настройка таймаутов, повторов, хеджирования и выключателей (параметры см. в __init__).
+        Состояние выключателей сбрасывается.
+        """
+        self.attempt_timeout = attempt_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.breakers = {provider: CircuitBreaker(failure_threshold, cooldown) for provider in self.providers}
+
+    def _candidates(self, model: str) -> List[str]:
+        route = self.routes[model]
+        available = [provider for provider in route if not self.breakers[provider].is_open]
+        # Если разомкнуты все выключатели, пробуем всех: лучше попытка, чем гарантированный отказ
+        return available or list(route)
+
+    def _hedge_delay(self, provider: str) -> float:
+        p95 = self.latency[provider].quantile(0.95)
+        return max(self.hedge_min_delay, p95 or 0.0)
+
+    async def _scheduled(self, provider: str, messages: List[Dict[str, str]], slot: Optional[Slot]) -> AsyncIterator[str]:
+        """Поток провайдера, удерживающий место в ограничителе до своего закрытия."""
+        try:
+            # Поток провайдера закрывается вместе с этим потоком, а не при сборке мусора
+            async with aclosing(self.stream_factory(provider, messages)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+        finally:
+            if slot is not None:
+                slot.release()
+
+    async def _attempt(self, provider: str, messages: List[Dict[str, str]],
+                       user_id: int, on_queued: Optional[QueueCallback]) -> Tuple[str, AsyncIterator[str], str]:
+        """
+        Получение места у провайдера, открытие потока и ожидание первого фрагмента.
+        Время ожидания в очереди не входит в таймаут попытки.
+
+        :return: Кортеж (провайдер, поток, первый фрагмент).
+        """
+        scheduler = self.schedulers.get(provider)
+        slot = await scheduler.acquire(user_id, on_queued) if scheduler is not None else None
+
+        stream = self._scheduled(provider, messages, slot)
+        started = time.monotonic()
+        try:
+            first = await asyncio.wait_for(stream.__anext__(), self.attempt_timeout)
+        except StopAsyncIteration:
+            first = ''
+        except asyncio.CancelledError:
+            await stream.aclose()
+            if slot is not None:
+                slot.release()
+            raise
+        except Exception as e:
+            await stream.aclose()
+            if slot is not None:
+                slot.release()
+            if self.breakers[provider].record_failure():
+                logger.warning(f"Circuit breaker opened for provider '{provider}'.")
+            logger.warning(f"Provider '{provider}' attempt failed: {e!r}")
+            raise ProviderError(provider, repr(e)) from e
+
+        self.breakers[provider].record_success()
+        self.latency[provider].observe(time.monotonic() - started)
+        return provider, stream, first
+
+    async def _race(self, providers: List[str], messages: List[Dict[str, str]],
+                    user_id: int, on_queued: Optional[QueueCallback]) -> Tuple[str, AsyncIterator[str], str]:
+        """
+        Один круг по провайдерам: переключение при ошибке и, при включённом хеджировании,
+        запуск следующего провайдера по истечении p95-задержки текущего.
+        """
+        remaining = list(providers)
+        pending = set()
+        last_error = None
+
+        def launch():
+            provider = remaining.pop(0)
+            pending.add(asyncio.create_task(self._attempt(provider, messages, user_id, on_queued), name=provider))
+            return provider
+
+        current = launch()
+        try:
+            while pending:
+                timeout = self._hedge_delay(current) if self.hedge and remaining else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = launch()
+                    logger.info(f"Hedging request: '{current}' is slow, also asking '{hedged}'.")
+                    current = hedged
+                    continue
+
+                winner = None
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        if winner is None:
+                            winner = task.result()
+                        else:
+                            await task.result()[1].aclose()
+                    else:
+                        last_error = task.exception()
+                if winner is not None:
+                    return winner
+
+                if not pending and remaining:
+                    current = launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                # Проигравшая попытка могла успеть завершиться успешно: её поток закрывается, освобождая место
+                for result in await asyncio.gather(*pending, return_exceptions=True):
+                    if isinstance(result, tuple):
+                        await result[1].aclose()
+
+        raise last_error
+
+    async def stream(self, model: str, messages: List[Dict[str, str]],
+                     user_id: int = 0, on_queued: Optional[QueueCallback] = None) -> AsyncIterator[str]:
+        """
+        Потоковое получение ответа модели через доступных провайдеров.
+
+        :param model: Модель бота ('gpt4o', 'llama3' или 'scenary').
+        :param messages: Сообщения диалога.
+        :param user_id: ID пользователя для честного распределения мест у провайдеров.
+        :param on_queued: Корутина, вызываемая с позицией в очереди, если запросу приходится ждать.
+        :return: Асинхронный генератор фрагментов ответа.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                provider, stream, first = await self._race(self._candidates(model), messages, user_id, on_queued)
+                break
+            except ProviderError as e:
+                if attempt == self.retries:
+                    raise ProviderUnavailableError(f"No provider could answer for model '{model}'.") from e
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                logger.info(f"All providers failed for model '{model}', retrying in {delay:.2f}s.")
+                await asyncio.sleep(delay)
+
+        try:
+            if first:
+                yield first
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), self.attempt_timeout)
+                except StopAsyncIteration:
+                    break
+                except Exception as e:
+                    self.breakers[provider].record_failure()
+                    raise ProviderUnavailableError(f"Provider '{provider}' failed mid-stream: {e!r}") from e
+                yield chunk
+        finally:
+            await stream.aclose()
@@ -0,0 +1,136 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Optional
+
+from loguru import logger
+
+
+QueueCallback = Callable[[int], Awaitable[None]]
+
+
+class QueueFullError(Exception):
+    """Очередь к провайдеру переполнена."""
+
+
+class Slot:
+    """Занятое место у провайдера. Повторное освобождение игнорируется."""
+
+    def __init__(self, scheduler: 'FairScheduler'):
+        self._scheduler = scheduler
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._scheduler._release()
+
+
+class FairScheduler:
+    """
+    Ограничитель одновременных запросов к провайдеру с честной очередью.
+
+    Не более concurrency запросов выполняются одновременно; остальные ждут в очереди глубиной
+    не более max_queue. Освободившееся место выдаётся пользователям по кругу (round-robin),
+    поэтому один активный пользователь не может занять всю очередь.
+    """
+
+    def __init__(self, name: str, concurrency: int = 8, max_queue: int = 100):
+        """
+        :param name: Имя провайдера (для логов).
+        :param concurrency: Максимальное количество одновременных запросов.
+        :param max_queue: Максимальная глубина очереди ожидания.
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        # Очереди пользователей в порядке обхода по кругу
+        self._queues: OrderedDict[int, Deque[asyncio.Future]] = OrderedDict()
+
+    def configure(self, concurrency: int, max_queue: int) -> None:
+        """
+        Изменение лимитов; при увеличении concurrency ожидающие запросы сразу получают места.
+
+        :param concurrency: Максимальное количество одновременных запросов.
+        :param max_queue: Максимальная глубина очереди ожидания.
+        """
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        while self._queues and self.active < self.concurrency:
+            self.active += 1
+            self._release()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _position(self, waiter: asyncio.Future) -> int:
+        """Позиция ожидающего запроса с учётом обхода очередей пользователей по кругу."""
+        queues = list(self._queues.values())
+        position = 0
+        for round_index in range(max(len(queue) for queue in queues)):
+            for queue in queues:
+                if round_index < len(queue):
+                    position += 1
+                    if queue[round_index] is waiter:
+                        return position
+        return position
+
+    async def acquire(self, user_id: int, on_queued: Optional[QueueCallback] = None) -> Slot:
+        """
+        Получение места у провайдера.
+
+        :param user_id: Уникальный ID пользователя Telegram.
+        :param on_queued: Корутина, вызываемая с позицией в очереди, если запросу приходится ждать.
+        :return: Занятое место; его необходимо освободить через release().
+        :raises QueueFullError: Если очередь переполнена.
+        """
+        if self.active < self.concurrency and not self._queues:
+            self.active += 1
+            return Slot(self)
+
+        if self.queue_depth >= self.max_queue:
+            logger.warning(f"Provider '{self.name}' queue is full ({self.max_queue}).")
+            raise QueueFullError(f"Provider '{self.name}' queue is full.")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append(waiter)
+        position = self._position(waiter)
+        logger.debug(f"User (ID: {user_id}) queued for provider '{self.name}' at position {position}.")
+
+        try:
+            if on_queued is not None:
+                try:
+                    await on_queued(position)
+                except Exception as e:
+                    logger.debug(f"Failed to notify user about queue position: {e}")
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Место уже было выдано этому запросу — передаём его дальше
+                self._release()
+            else:
+                waiter.cancel()
+                self._discard(user_id, waiter)
+            raise
+        return Slot(self)
+
+    def _discard(self, user_id: int, waiter: asyncio.Future) -> None:
+        queue = self._queues.get(user_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[user_id]
+
+    def _release(self) -> None:
+        """Передача освободившегося места следующему пользователю по кругу."""
+        while self._queues:
+            user_id, queue = self._queues.popitem(last=False)
+            waiter = queue.popleft()
+            if queue:
+                # Пользователь с оставшимися запросами уходит в конец круга
+                self._queues[user_id] = queue
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
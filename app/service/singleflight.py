@@ -0,0 +1,115 @@
+import asyncio
+import re
+from typing import AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+from loguru import logger
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Нормализация текста запроса для сравнения: без учёта регистра и лишних пробелов.
+
+    :param prompt: Текст запроса пользователя.
+    :return: Нормализованный текст.
+    """
+    return re.sub(r'\s+', ' ', prompt).strip().casefold()
+
+
+class _Flight:
+    """Выполняющийся запрос к провайдеру и его подписчики."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self) -> None:
+        await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных запросов (single-flight).
+
+    Первый запрос с данным ключом запускает поток провайдера в фоновой задаче, остальные
+    подписываются на него и получают те же фрагменты, включая уже полученные.
+    Ошибка провайдера передаётся всем подписчикам. Поток отменяется, только когда
+    от него отписались все подписчики.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.started = 0  # Количество запросов, дошедших до провайдера
+        self.coalesced = 0  # Количество запросов, присоединившихся к уже выполняющемуся
+
+    async def _pump(self, key: Hashable, flight: _Flight, factory: Callable[[], AsyncIterator[str]]) -> None:
+        stream = factory()
+        try:
+            async for chunk in stream:
+                flight.chunks.append(chunk)
+                flight.notify()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            await stream.aclose()
+            flight.done = True
+            flight.notify()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Потоковое получение результата с объединением одинаковых запросов.
+
+        :param key: Ключ запроса (например, модель и нормализованный текст).
+        :param factory: Функция, открывающая поток провайдера; вызывается только для первого запроса.
+        :return: Асинхронный генератор фрагментов ответа.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(self._pump(key, flight, factory))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalesced identical in-flight request ({flight.subscribers} already waiting), "
+                        f"total coalesced: {self.coalesced}/{self.started + self.coalesced}")
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(flight.chunks):
+                    index += 1
+                    yield flight.chunks[index - 1]
+                elif flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.wait()
+        finally:
+            flight.subscribers -= 1
+            if not flight.subscribers and not flight.done:
+                # Ответ больше никому не нужен — освобождаем провайдера
+                flight.task.cancel()
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Статистика объединения запросов.
+
+        :return: Словарь с количеством запросов к провайдеру, объединённых запросов и выполняющихся сейчас.
+        """
+        return {"started": self.started, "coalesced": self.coalesced, "in_flight": len(self._flights)}
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import AsyncIterator, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+from loguru import logger
+
+
+TELEGRAM_MESSAGE_LIMIT = 4096  # Максимальная длина сообщения Telegram
+STREAM_EDIT_INTERVAL = 1.0  # Минимальный интервал между правками (в секундах), см. configure_streaming
+STREAM_PLACEHOLDER = "…"
+
+
+def configure_streaming(edit_interval: float) -> None:
+    """
+    Настройка потоковой отправки ответов.
+
+    :param edit_interval: Минимальный интервал между правками сообщения (в секундах).
+    """
+    global STREAM_EDIT_INTERVAL
+    STREAM_EDIT_INTERVAL = edit_interval
+
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> int:
+    """
+    Поиск позиции разбиения текста, не превышающей лимит: по переводу строки, пробелу или жёстко.
+
+    :param text: Текст сообщения.
+    :param limit: Максимальная длина сообщения.
+    :return: Позиция разбиения.
+    """
+    cut = text.rfind('\n', 0, limit)
+    if cut <= 0:
+        cut = text.rfind(' ', 0, limit)
+    if cut <= 0:
+        cut = limit
+    return cut
+
+
+async def _edit(bot: Bot, message: Message, text: str, final: bool = False) -> Optional[float]:
+    """
+    Правка сообщения с ответом. Промежуточные версии отправляются без разметки,
+    чтобы незакрытые теги не ломали разбор; итоговая — с разметкой бота и откатом на простой текст.
+
+    :return: Время ожидания, запрошенное Telegram (flood control), или None.
+    """
+    try:
+        if final:
+            try:
+                await bot.edit_message_text(text=text, chat_id=message.chat.id, message_id=message.message_id)
+            except TelegramBadRequest as e:
+                if 'not modified' in str(e):
+                    return None
+                await bot.edit_message_text(text=text, chat_id=message.chat.id, message_id=message.message_id,
+                                            parse_mode=None)
+        else:
+            await bot.edit_message_text(text=text, chat_id=message.chat.id, message_id=message.message_id,
+                                        parse_mode=None)
+    except TelegramRetryAfter as e:
+        logger.warning(f"Telegram flood control while streaming, retry after {e.retry_after}s.")
+        if final:
+            await asyncio.sleep(e.retry_after)
+            return await _edit(bot, message, text, final=True)
+        return e.retry_after
+    except TelegramBadRequest as e:
+        if 'not modified' not in str(e):
+            raise
+    return None
+
+
+async def send_streamed_response(bot: Bot, chat_id: int, chunks: AsyncIterator[str],
+                                 edit_interval: Optional[float] = None) -> str:
+    """
+    Потоковая отправка ответа модели: сначала отправляется заглушка, затем она
+    постепенно дополняется через edit_message_text не чаще, чем раз в edit_interval секунд.
+    Текст длиннее 4096 символов переносится в новое сообщение.
+
+    :param bot: Объект бота.
+    :param chat_id: ID чата.
+    :param chunks: Асинхронный генератор фрагментов ответа.
+    :param edit_interval: Минимальный интервал между правками сообщения (в секундах), по умолчанию STREAM_EDIT_INTERVAL.
+    :return: Полный текст ответа.
+    """
+    if edit_interval is None:
+        edit_interval = STREAM_EDIT_INTERVAL
+    message = await bot.send_message(chat_id, STREAM_PLACEHOLDER, parse_mode=None)
+    full_text = ''
+    current = ''
+    shown = ''
+    next_edit_at = 0.0
+
+    try:
+        async for chunk in chunks:
+            full_text += chunk
+            current += chunk
+
+            while len(current) > TELEGRAM_MESSAGE_LIMIT:
+                cut = split_message(current)
+                head, current = current[:cut], current[cut:].lstrip()
+                await _edit(bot, message, head, final=True)
+                message = await bot.send_message(chat_id, current[:TELEGRAM_MESSAGE_LIMIT] or STREAM_PLACEHOLDER,
+                                                 parse_mode=None)
+                shown = current[:TELEGRAM_MESSAGE_LIMIT]
+                next_edit_at = time.monotonic() + edit_interval
+
+            now = time.monotonic()
+            if current and current != shown and now >= next_edit_at:
+                retry_after = await _edit(bot, message, current)
+                shown = current
+                next_edit_at = now + max(edit_interval, retry_after or 0)
+    except BaseException:
+        # Заглушка без текста ответа не нужна пользователю
+        if not full_text:
+            try:
+                await bot.delete_message(chat_id=chat_id, message_id=message.message_id)
+            except Exception as e:
+                logger.debug(f"Failed to delete stream placeholder: {e}")
+        raise
+
+    if current:
+        await _edit(bot, message, current, final=True)
+
+    return full_text
@@ -0,0 +1,33 @@
+"""
+Сравнение готовых клавиатур с построением при каждом вызове.
+
+Запуск из корня репозитория: python -m benchmarks.keyboards
+"""
+import json
+from timeit import timeit
+from typing import Dict
+
+from app.keyboards.inline_keyboards import _build_choose_model_keyboard, get_choose_model_keyboard
+from app.keyboards.reply_keyboards import _build_menu_keyboard, get_menu_keyboard
+
+
+def benchmark(number: int = 10_000) -> Dict[str, float]:
+    """
+    Среднее время получения главного меню и клавиатуры выбора модели.
+
+    :param number: Количество вызовов каждого варианта.
+    :return: Среднее время одного вызова (в микросекундах).
+    """
+    def per_call(func) -> float:
+        return round(timeit(func, number=number) / number * 1e6, 3)
+
+    return {
+        "menu_build_us": per_call(lambda: _build_menu_keyboard(False, 'en')),
+        "menu_lookup_us": per_call(lambda: get_menu_keyboard(False, 'en')),
+        "choose_model_build_us": per_call(lambda: _build_choose_model_keyboard(True, False, True, 'en')),
+        "choose_model_lookup_us": per_call(lambda: get_choose_model_keyboard(True, False, True, 'en')),
+    }
+
+
+if __name__ == '__main__':
+    print(json.dumps(benchmark(), indent=4))
@@ -2,15 +2,71 @@ import asyncio
 import sys
 import logging
 
+from aiohttp import web
 from loguru import logger
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.redis import RedisStorage, Redis
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 from app.handlers.user import handlers
 from app.handlers.admin import admin_handlers
 
-from config import load_config
+from config import load_config, Config
 from app.database.requests import Database
+from app.FSM.storage import build_redis, build_storage
+from app.service.helpers import (
+    clients, flights, response_cache, router, configure_schedulers, configure_response_cache
+)
+from app.service.faq import configure_faq, get_faq_index
+from app.service.media import media
+from app.lexicon.i18n import catalog
+from app.service.generations import generations
+from app.service.jobs import jobs
+from app.middlewares.user_snapshot import UserSnapshotMiddleware
+from app.middlewares.throttling import ThrottlingMiddleware, throttler
+from app.middlewares.metrics import HandlerMetricsMiddleware
+from app.service.metrics import start_metrics_server
+from app.service.streaming import configure_streaming
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, config: Config) -> None:
+    """
+    Приём обновлений через вебхук: aiohttp-сервер с проверкой секретного токена.
+    Несколько экземпляров могут работать за балансировщиком с одним и тем же URL и секретом.
+
+    :param bot: Объект бота.
+    :param dp: Диспетчер.
+    :param config: Конфигурация бота.
+    """
+    if not config.webhook.base_url or not config.webhook.secret:
+        raise ValueError("WEBHOOK_BASE_URL and WEBHOOK_SECRET must be set in webhook mode.")
+
+    url = f"{config.webhook.base_url.rstrip('/')}{config.webhook.path}"
+    # Вебхук устанавливается при каждом запуске, чтобы смена секрета, allowed_updates или max_connections
+    # вступала в силу; очередь обновлений сохраняется, пока не задан DROP_PENDING_UPDATES
+    await bot.set_webhook(
+        url=url,
+        secret_token=config.webhook.secret,
+        allowed_updates=dp.resolve_used_update_types(),
+        max_connections=config.webhook.max_connections,
+        drop_pending_updates=config.tg_bot.drop_pending_updates
+    )
+    logger.info(f"Webhook was set to {url}.")
+
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=config.webhook.secret).register(app, path=config.webhook.path)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.webhook.host, port=config.webhook.port)
+    await site.start()
+    logger.info(f"Webhook server is listening on {config.webhook.host}:{config.webhook.port}{config.webhook.path}.")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        # Вебхук не удаляется: обновления продолжат получать остальные реплики
+        await runner.cleanup()
+        await bot.session.close()
 
 
 async def main() -> None:
@@ -22,26 +78,124 @@ async def main() -> None:
     style='{'
     )
 
+    await Database.configure(
+        url=config.db.url,
+        echo=config.db.echo,
+        pool_size=config.db.pool_size,
+        max_overflow=config.db.max_overflow,
+        statement_cache_size=config.db.statement_cache_size,
+        sqlite_busy_timeout=config.db.sqlite_busy_timeout,
+        sqlite_mmap_size=config.db.sqlite_mmap_size,
+        sqlite_cache_size=config.db.sqlite_cache_size
+    )
     await Database.create_tables()
+    configure_faq(
+        top_k=config.faq.top_k,
+        direct_threshold=config.faq.direct_threshold,
+        direct_cost=config.faq.direct_cost
+    )
+    get_faq_index()
+    configure_streaming(edit_interval=config.llm.stream_edit_interval)
+    clients.configure(
+        max_connections=config.llm.max_connections,
+        max_keepalive_connections=config.llm.max_keepalive_connections,
+        keepalive_expiry=config.llm.keepalive_expiry,
+        timeout=config.llm.timeout,
+        connect_timeout=config.llm.connect_timeout,
+        llama_api_key=config.llm.llama_api_key,
+        llama_base_url=config.llm.llama_base_url
+    )
+    router.configure(
+        attempt_timeout=config.llm.attempt_timeout,
+        retries=config.llm.retries,
+        backoff_base=config.llm.backoff_base,
+        backoff_max=config.llm.backoff_max,
+        hedge=config.llm.hedge,
+        hedge_min_delay=config.llm.hedge_min_delay,
+        failure_threshold=config.llm.breaker_failures,
+        cooldown=config.llm.breaker_cooldown
+    )
+    configure_schedulers(concurrency=config.llm.concurrency, max_queue=config.llm.max_queue)
+    # Неполный каталог строк не мешает запуску: отсутствующие ключи берутся из языка по умолчанию
+    catalog.check()
 
     bot = Bot(config.tg_bot.token, parse_mode='HTML')
-    redis = Redis(host='localhost')
-    dp = Dispatcher(redis=redis)
+    redis = build_redis(config.redis.url, max_connections=config.redis.max_connections)
+    dp = Dispatcher(storage=build_storage(redis, state_ttl=config.redis.state_ttl, data_ttl=config.redis.data_ttl))
+    # Данные пользователя загружаются один раз на обновление и передаются обработчикам обоих роутеров
+    dp.update.outer_middleware(UserSnapshotMiddleware())
+    # Время выполнения обработчиков всех роутеров
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+
+    Database.configure_cache(
+        max_size=config.cache.settings_size,
+        ttl=config.cache.settings_ttl,
+        redis=redis,
+        shared=config.cache.settings_redis
+    )
+    configure_response_cache(
+        ttls=config.cache.responses_ttls,
+        default_ttl=config.cache.responses_ttl,
+        max_bytes=config.cache.responses_max_bytes,
+        version=config.cache.responses_version
+    )
+    if config.cache.responses_redis:
+        response_cache.attach_redis(redis)
+    # В режиме исполнителей генерация выполняется процессами worker.py
+    jobs.configure(
+        stream=config.worker.stream,
+        group=config.worker.group,
+        claim_idle=config.worker.claim_idle,
+        max_deliveries=config.worker.max_deliveries
+    )
+    if config.worker.enabled:
+        jobs.attach_redis(redis)
+    throttler.configure(limits=config.throttle.limits, default_limit=config.throttle.default_limit)
+    throttler.attach_redis(redis)
 
     # Подключаем хэндлеры админки
     dp.include_routers(
         admin_handlers.router
     )
 
-    # Подключаем хэндлеры пользователей
+    # Подключаем хэндлеры пользователей; частота ограничивается только для сообщений, дошедших до моделей
+    handlers.router.message.middleware(ThrottlingMiddleware(throttler))
     dp.include_routers(
         handlers.router
     )
 
     logger.info('Bot was successfully started!')
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    # Занятый порт метрик останавливает запуск, а не отключает метрики процесса молча
+    metrics_runner = None
+    if config.metrics.enabled:
+        metrics_runner = await start_metrics_server(config.metrics.host, config.metrics.port)
+    ledger_flusher = asyncio.create_task(Database.run_ledger_flusher())
+    # Инвалидации кэша настроек от других реплик и исполнителей генерации
+    cache_listener = asyncio.create_task(Database.settings_cache.listen())
+
+    try:
+        if config.webhook.enabled:
+            await run_webhook(bot, dp, config)
+        else:
+            await bot.delete_webhook(drop_pending_updates=config.tg_bot.drop_pending_updates)
+            await dp.start_polling(bot)
+    finally:
+        await generations.cancel_all()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        ledger_flusher.cancel()
+        cache_listener.cancel()
+        await asyncio.gather(ledger_flusher, cache_listener, return_exceptions=True)
+        await clients.close()
+        await dp.storage.close()
+        await Database.close()
+        logger.info(f"Settings cache stats: {Database.settings_cache.stats()}")
+        logger.info(f"LLM request coalescing stats: {flights.stats()}")
+        logger.info(f"Media assets stats: {media.stats()}")
+        logger.info(f"LLM request throttling stats: {throttler.stats()}")
+        logger.info(f"LLM response cache stats: {response_cache.stats()}")
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
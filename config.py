@@ -1,17 +1,219 @@
 from dataclasses import dataclass
 from environs import Env
 
+# Провайдеры LLM, для которых можно задать отдельные лимиты (LLM_MAX_CONCURRENCY_G4F и т.п.)
+LLM_PROVIDERS = ('g4f', 'llama')
+# Модели бота, для которых можно задать отдельные лимиты частоты запросов (THROTTLE_BURST_GPT4O и т.п.)
+LLM_MODELS = ('gpt4o', 'llama3', 'scenary')
+
 @dataclass
 class TgBot:
     token: str
+    drop_pending_updates: bool
+
+@dataclass
+class Webhook:
+    enabled: bool
+    base_url: str
+    path: str
+    host: str
+    port: int
+    secret: str
+    max_connections: int
+
+@dataclass
+class Db:
+    url: str
+    echo: bool
+    pool_size: int
+    max_overflow: int
+    statement_cache_size: int
+    sqlite_busy_timeout: int
+    sqlite_mmap_size: int
+    sqlite_cache_size: int
+
+@dataclass
+class Redis:
+    url: str
+    max_connections: int
+    state_ttl: int
+    data_ttl: int
+
+@dataclass
+class Cache:
+    settings_size: int
+    settings_ttl: float
+    settings_redis: bool
+    responses_redis: bool
+    responses_ttls: dict[str, int]
+    responses_ttl: int
+    responses_max_bytes: int
+    responses_version: str
+
+@dataclass
+class Llm:
+    stream_edit_interval: float
+    attempt_timeout: float
+    retries: int
+    backoff_base: float
+    backoff_max: float
+    hedge: bool
+    hedge_min_delay: float
+    breaker_failures: int
+    breaker_cooldown: float
+    concurrency: dict[str, int]
+    max_queue: dict[str, int]
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_expiry: float
+    timeout: float
+    connect_timeout: float
+    llama_api_key: str | None
+    llama_base_url: str | None
+
+@dataclass
+class Faq:
+    top_k: int
+    direct_threshold: float
+    direct_cost: int
+
+@dataclass
+class Throttle:
+    limits: dict[str, tuple[float, float]]
+    default_limit: tuple[float, float]
+
+@dataclass
+class Worker:
+    enabled: bool
+    concurrency: int
+    stream: str
+    group: str
+    claim_idle: int
+    max_deliveries: int
+
+@dataclass
+class Metrics:
+    enabled: bool
+    host: str
+    port: int
+    worker_port: int
     
 @dataclass
 class Config:
     tg_bot: TgBot
+    webhook: Webhook
+    db: Db
+    redis: Redis
+    cache: Cache
+    llm: Llm
+    faq: Faq
+    throttle: Throttle
+    worker: Worker
+    metrics: Metrics
     
 def load_config(path: str | None = None) -> Config:
     env = Env()
     env.read_env(path)
+    max_concurrency = env.int('LLM_MAX_CONCURRENCY', 8)
+    max_queue = env.int('LLM_MAX_QUEUE', 100)
+    throttle_limit = (env.float('THROTTLE_BURST', 3.0), env.float('THROTTLE_RATE', 0.2))
     
-    return Config(tg_bot=TgBot(token=env('BOT_TOKEN')))
-
+    return Config(
+        tg_bot=TgBot(
+            token=env('BOT_TOKEN'),
+            drop_pending_updates=env.bool('DROP_PENDING_UPDATES', False),
+        ),
+        webhook=Webhook(
+            enabled=env.bool('WEBHOOK_MODE', False),
+            base_url=env('WEBHOOK_BASE_URL', ''),
+            path=env('WEBHOOK_PATH', '/webhook'),
+            host=env('WEBHOOK_HOST', '0.0.0.0'),
+            port=env.int('WEBHOOK_PORT', 8080),
+            secret=env('WEBHOOK_SECRET', ''),
+            max_connections=env.int('WEBHOOK_MAX_CONNECTIONS', 40),
+        ),
+        db=Db(
+            url=env('DATABASE_URL', 'sqlite+aiosqlite:///app/database/database.db'),
+            echo=env.bool('DATABASE_ECHO', False),
+            pool_size=env.int('DATABASE_POOL_SIZE', 10),
+            max_overflow=env.int('DATABASE_MAX_OVERFLOW', 20),
+            statement_cache_size=env.int('DATABASE_STATEMENT_CACHE_SIZE', 500),
+            sqlite_busy_timeout=env.int('SQLITE_BUSY_TIMEOUT', 5000),
+            sqlite_mmap_size=env.int('SQLITE_MMAP_SIZE', 268_435_456),
+            sqlite_cache_size=env.int('SQLITE_CACHE_SIZE', -64_000),
+        ),
+        redis=Redis(
+            url=env('REDIS_URL', 'redis://localhost:6379/0'),
+            max_connections=env.int('REDIS_MAX_CONNECTIONS', 50),
+            state_ttl=env.int('FSM_STATE_TTL', 30 * 24 * 3600),
+            data_ttl=env.int('FSM_DATA_TTL', 30 * 24 * 3600),
+        ),
+        cache=Cache(
+            settings_size=env.int('SETTINGS_CACHE_SIZE', 10_000),
+            settings_ttl=env.float('SETTINGS_CACHE_TTL', 300.0),
+            settings_redis=env.bool('SETTINGS_CACHE_REDIS', False),
+            responses_redis=env.bool('LLM_CACHE_REDIS', True),
+            responses_ttls={
+                'gpt4o': env.int('LLM_CACHE_TTL_GPT4O', 3600),
+                'llama3': env.int('LLM_CACHE_TTL_LLAMA3', 3600),
+                'scenary': env.int('LLM_CACHE_TTL_SCENARY', 86400),
+            },
+            responses_ttl=env.int('LLM_CACHE_TTL', 3600),
+            responses_max_bytes=env.int('LLM_CACHE_MAX_BYTES', 16 * 1024 * 1024),
+            responses_version=env('LLM_CACHE_VERSION', '1'),
+        ),
+        llm=Llm(
+            stream_edit_interval=env.float('STREAM_EDIT_INTERVAL', 1.0),
+            attempt_timeout=env.float('LLM_ATTEMPT_TIMEOUT', 30.0),
+            retries=env.int('LLM_RETRIES', 1),
+            backoff_base=env.float('LLM_BACKOFF_BASE', 0.5),
+            backoff_max=env.float('LLM_BACKOFF_MAX', 5.0),
+            hedge=env.bool('LLM_HEDGE', False),
+            hedge_min_delay=env.float('LLM_HEDGE_MIN_DELAY', 2.0),
+            breaker_failures=env.int('LLM_BREAKER_FAILURES', 3),
+            breaker_cooldown=env.float('LLM_BREAKER_COOLDOWN', 60.0),
+            concurrency={
+                provider: env.int(f'LLM_MAX_CONCURRENCY_{provider.upper()}', max_concurrency)
+                for provider in LLM_PROVIDERS
+            },
+            max_queue={
+                provider: env.int(f'LLM_MAX_QUEUE_{provider.upper()}', max_queue)
+                for provider in LLM_PROVIDERS
+            },
+            max_connections=env.int('LLM_MAX_CONNECTIONS', 100),
+            max_keepalive_connections=env.int('LLM_MAX_KEEPALIVE_CONNECTIONS', 20),
+            keepalive_expiry=env.float('LLM_KEEPALIVE_EXPIRY', 60.0),
+            timeout=env.float('LLM_TIMEOUT', 120.0),
+            connect_timeout=env.float('LLM_CONNECT_TIMEOUT', 10.0),
+            llama_api_key=env('LLAMA_API_KEY', None),
+            llama_base_url=env('LLAMA_BASE_URL', None),
+        ),
+        faq=Faq(
+            top_k=env.int('FAQ_TOP_K', 3),
+            direct_threshold=env.float('FAQ_DIRECT_THRESHOLD', 0.7),
+            direct_cost=env.int('FAQ_DIRECT_COST', 10),
+        ),
+        throttle=Throttle(
+            limits={
+                model: (env.float(f'THROTTLE_BURST_{model.upper()}', throttle_limit[0]),
+                        env.float(f'THROTTLE_RATE_{model.upper()}', throttle_limit[1]))
+                for model in LLM_MODELS
+            },
+            default_limit=throttle_limit,
+        ),
+        worker=Worker(
+            enabled=env.bool('LLM_WORKER_MODE', False),
+            concurrency=env.int('LLM_WORKER_CONCURRENCY', 4),
+            stream=env('LLM_JOBS_STREAM', 'llm:jobs'),
+            group=env('LLM_JOBS_GROUP', 'llm-workers'),
+            claim_idle=env.int('LLM_JOBS_CLAIM_IDLE', 60_000),
+            max_deliveries=env.int('LLM_JOBS_MAX_DELIVERIES', 3),
+        ),
+        metrics=Metrics(
+            enabled=env.bool('METRICS_ENABLED', True),
+            host=env('METRICS_HOST', '127.0.0.1'),
+            port=env.int('METRICS_PORT', 9100),
+            # У исполнителей свой порт; нескольким исполнителям на одном хосте задаются разные значения
+            worker_port=env.int('WORKER_METRICS_PORT', 9101),
+        ),
+    )
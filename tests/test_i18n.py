@@ -0,0 +1,47 @@
+import re
+from pathlib import Path
+
+import pytest
+
+from app.lexicon.i18n import Catalog, catalog, t
+
+APP_DIR = Path(__file__).resolve().parent.parent / 'app'
+
+
+def test_every_key_exists_in_every_locale():
+    assert catalog.missing_keys() == {}
+
+
+def test_placeholders_match_default_locale():
+    assert catalog.placeholder_mismatches() == {}
+
+
+def test_check_passes():
+    assert catalog.check()
+
+
+def test_keys_used_in_code_exist():
+    used = set()
+    for path in APP_DIR.rglob('*.py'):
+        used.update(re.findall(r"\bt\(\s*'([a-z0-9_]+)'", path.read_text(encoding='utf-8')))
+    assert {key for key in used if key not in catalog} == set()
+
+
+@pytest.mark.parametrize('lang', catalog.locales)
+def test_menu_labels_are_unique_per_locale(lang):
+    from app.keyboards.reply_keyboards import MENU_LAYOUT
+
+    labels = [t(f'menu_{command}', lang) for row in MENU_LAYOUT for command in row]
+    assert len(labels) == len(set(labels))
+
+
+def test_missing_key_falls_back_to_default_locale(tmp_path):
+    (tmp_path / 'ru.json').write_text('{"hello": "Привет, {name}!", "bye": "Пока"}', encoding='utf-8')
+    (tmp_path / 'de.json').write_text('{"hello": "Hallo, {name}!"}', encoding='utf-8')
+    partial = Catalog(directory=tmp_path)
+
+    assert partial.missing_keys() == {'de': frozenset({'bye'})}
+    assert partial.t('hello', 'de', name='Ada') == 'Hallo, Ada!'
+    assert partial.t('bye', 'de') == 'Пока'
+    assert partial.t('bye', 'fr') == 'Пока'
+    assert not partial.check()
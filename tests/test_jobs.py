@@ -0,0 +1,177 @@
+import asyncio
+import types
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+
+from app.database.requests import Database
+from app.service import helpers
+from app.service.jobs import GenerationJobs
+
+
+class FakeBot:
+    """Бот, запоминающий отправленные и отредактированные сообщения вместо запросов к Telegram."""
+
+    def __init__(self):
+        self.messages = {}
+        self.last_id = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.last_id += 1
+        self.messages[self.last_id] = (chat_id, text)
+        return types.SimpleNamespace(chat=types.SimpleNamespace(id=chat_id), message_id=self.last_id)
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        self.messages[message_id] = (chat_id, text)
+
+    async def delete_message(self, chat_id, message_id):
+        self.messages.pop(message_id, None)
+
+    def texts(self, chat_id):
+        return [text for chat, text in self.messages.values() if chat == chat_id]
+
+
+async def fake_provider(provider, messages):
+    await asyncio.sleep(0.01)
+    yield f"answer to {messages[0]['content']}"
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition was not met in time"
+        await asyncio.sleep(0.02)
+
+
+@pytest.fixture
+def refunds(monkeypatch):
+    credited = []
+
+    async def credit_tokens(user_id, amount, reason=None):
+        credited.append((user_id, amount, reason))
+        return amount
+
+    monkeypatch.setattr(Database, 'credit_tokens', credit_tokens)
+    monkeypatch.setattr(helpers.router, 'stream_factory', fake_provider)
+    helpers.response_cache.clear()
+    return credited
+
+
+class LocalRedis(fakeredis.FakeAsyncRedis):
+    """
+    Локальная замена Redis. Блокирующий XREADGROUP в fakeredis останавливает цикл событий,
+    поэтому ожидание новых заданий заменяется короткой асинхронной паузой.
+    """
+
+    async def xreadgroup(self, *args, block=None, **kwargs):
+        response = await super().xreadgroup(*args, **kwargs)
+        if not response and block:
+            await asyncio.sleep(block / 1000)
+        return response
+
+
+def make_jobs(**kwargs):
+    jobs = GenerationJobs(block=50, cancel_poll=0.02, **kwargs)
+    jobs.attach_redis(LocalRedis())
+    return jobs
+
+
+async def run_workers_until(jobs, bot, condition, name='test'):
+    workers = asyncio.create_task(jobs.run_workers(bot, concurrency=1, name=name))
+    try:
+        await wait_for(condition)
+    finally:
+        workers.cancel()
+        await asyncio.gather(workers, return_exceptions=True)
+
+
+async def pending(jobs):
+    return (await jobs.redis.xpending(jobs.stream, jobs.group))['pending']
+
+
+def test_enqueued_job_is_delivered_and_acknowledged(refunds):
+    async def scenario():
+        jobs = make_jobs()
+        bot = FakeBot()
+        await jobs.ensure_group()
+        await jobs.enqueue(user_id=1, chat_id=10, lang='ru', model='gpt4o', cost=100, prompt='enqueue')
+
+        await run_workers_until(jobs, bot, lambda: jobs.processed == 1)
+
+        assert bot.texts(10) == ['answer to enqueue']
+        assert await pending(jobs) == 0
+        assert await jobs.redis.xlen(jobs.stream) == 0
+        assert refunds == []
+
+    asyncio.run(scenario())
+
+
+def test_job_of_a_dead_worker_is_redelivered(refunds):
+    async def scenario():
+        jobs = make_jobs(claim_idle=100)
+        bot = FakeBot()
+        await jobs.ensure_group()
+        await jobs.enqueue(user_id=2, chat_id=20, lang='ru', model='gpt4o', cost=100, prompt='redelivery')
+        # Исполнитель забрал задание и упал, не подтвердив его
+        claimed = await jobs.redis.xreadgroup(jobs.group, 'dead', {jobs.stream: '>'}, count=1)
+        assert claimed and await pending(jobs) == 1
+
+        await run_workers_until(jobs, bot, lambda: jobs.processed == 1)
+
+        assert jobs.recovered == 1
+        assert bot.texts(20) == ['answer to redelivery']
+        assert await pending(jobs) == 0
+
+    asyncio.run(scenario())
+
+
+def test_job_redelivered_too_many_times_is_refunded(refunds):
+    async def scenario():
+        jobs = make_jobs(claim_idle=50, max_deliveries=1)
+        bot = FakeBot()
+        await jobs.ensure_group()
+        await jobs.enqueue(user_id=3, chat_id=30, lang='ru', model='llama3', cost=150, prompt='poison')
+        await jobs.redis.xreadgroup(jobs.group, 'dead', {jobs.stream: '>'}, count=1)
+
+        await run_workers_until(jobs, bot, lambda: jobs.processed == 1)
+
+        assert refunds == [(3, 150, 'llama3_refund')]
+        assert 'answer to poison' not in bot.texts(30)
+        assert await pending(jobs) == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_job_is_refunded_and_not_generated(refunds):
+    async def scenario():
+        jobs = make_jobs()
+        bot = FakeBot()
+        await jobs.ensure_group()
+        await jobs.enqueue(user_id=4, chat_id=40, lang='ru', model='gpt4o', cost=100, prompt='cancelled')
+        assert await jobs.cancel(4)
+        assert not await jobs.cancel(4)
+
+        await run_workers_until(jobs, bot, lambda: jobs.processed == 1)
+
+        assert bot.texts(40) == []
+        assert refunds == [(4, 100, 'gpt4o_refund')]
+        assert await pending(jobs) == 0
+
+    asyncio.run(scenario())
+
+
+def test_superseded_job_is_skipped(refunds):
+    async def scenario():
+        jobs = make_jobs()
+        bot = FakeBot()
+        await jobs.ensure_group()
+        await jobs.enqueue(user_id=5, chat_id=50, lang='ru', model='gpt4o', cost=100, prompt='first')
+        await jobs.enqueue(user_id=5, chat_id=50, lang='ru', model='gpt4o', cost=100, prompt='second')
+
+        await run_workers_until(jobs, bot, lambda: jobs.processed == 2)
+
+        assert bot.texts(50) == ['answer to second']
+        assert refunds == [(5, 100, 'gpt4o_refund')]
+
+    asyncio.run(scenario())
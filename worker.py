@@ -0,0 +1,121 @@
+import asyncio
+import logging
+
+from loguru import logger
+from aiogram import Bot
+
+from config import load_config
+from app.database.requests import Database
+from app.FSM.storage import build_redis
+from app.service.helpers import (
+    clients, flights, response_cache, router, configure_schedulers, configure_response_cache
+)
+from app.service.faq import configure_faq, get_faq_index
+from app.service.jobs import jobs
+from app.service.metrics import start_metrics_server
+from app.service.streaming import configure_streaming
+
+
+async def main() -> None:
+    """
+    Процесс-исполнитель заданий генерации: читает задания из Redis Streams
+    и отправляет ответы моделей в чаты. Запускается в нужном количестве экземпляров
+    отдельно от bot.py (LLM_WORKER_MODE=true).
+    """
+    config = load_config()
+    logging.basicConfig(
+    level=logging.INFO,
+    format='[{asctime}] #{levelname:8} {filename}:{funcName}'
+           '{lineno} - {name} - {message}',
+    style='{'
+    )
+
+    await Database.configure(
+        url=config.db.url,
+        echo=config.db.echo,
+        pool_size=config.db.pool_size,
+        max_overflow=config.db.max_overflow,
+        statement_cache_size=config.db.statement_cache_size,
+        sqlite_busy_timeout=config.db.sqlite_busy_timeout,
+        sqlite_mmap_size=config.db.sqlite_mmap_size,
+        sqlite_cache_size=config.db.sqlite_cache_size
+    )
+    configure_faq(
+        top_k=config.faq.top_k,
+        direct_threshold=config.faq.direct_threshold,
+        direct_cost=config.faq.direct_cost
+    )
+    get_faq_index()
+    configure_streaming(edit_interval=config.llm.stream_edit_interval)
+    clients.configure(
+        max_connections=config.llm.max_connections,
+        max_keepalive_connections=config.llm.max_keepalive_connections,
+        keepalive_expiry=config.llm.keepalive_expiry,
+        timeout=config.llm.timeout,
+        connect_timeout=config.llm.connect_timeout,
+        llama_api_key=config.llm.llama_api_key,
+        llama_base_url=config.llm.llama_base_url
+    )
+    router.configure(
+        attempt_timeout=config.llm.attempt_timeout,
+        retries=config.llm.retries,
+        backoff_base=config.llm.backoff_base,
+        backoff_max=config.llm.backoff_max,
+        hedge=config.llm.hedge,
+        hedge_min_delay=config.llm.hedge_min_delay,
+        failure_threshold=config.llm.breaker_failures,
+        cooldown=config.llm.breaker_cooldown
+    )
+    configure_schedulers(concurrency=config.llm.concurrency, max_queue=config.llm.max_queue)
+
+    bot = Bot(config.tg_bot.token, parse_mode='HTML')
+    redis = build_redis(config.redis.url, max_connections=config.redis.max_connections)
+
+    Database.configure_cache(
+        max_size=config.cache.settings_size,
+        ttl=config.cache.settings_ttl,
+        redis=redis,
+        shared=config.cache.settings_redis
+    )
+    configure_response_cache(
+        ttls=config.cache.responses_ttls,
+        default_ttl=config.cache.responses_ttl,
+        max_bytes=config.cache.responses_max_bytes,
+        version=config.cache.responses_version
+    )
+    if config.cache.responses_redis:
+        response_cache.attach_redis(redis)
+    jobs.configure(
+        stream=config.worker.stream,
+        group=config.worker.group,
+        claim_idle=config.worker.claim_idle,
+        max_deliveries=config.worker.max_deliveries
+    )
+    jobs.attach_redis(redis)
+
+    # Занятый порт метрик останавливает запуск, а не отключает метрики процесса молча
+    metrics_runner = None
+    if config.metrics.enabled:
+        metrics_runner = await start_metrics_server(config.metrics.host, config.metrics.worker_port)
+    ledger_flusher = asyncio.create_task(Database.run_ledger_flusher())
+    # Инвалидации кэша настроек от других реплик и исполнителей генерации
+    cache_listener = asyncio.create_task(Database.settings_cache.listen())
+
+    logger.info('Generation worker was successfully started!')
+    try:
+        await jobs.run_workers(bot, concurrency=config.worker.concurrency)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        ledger_flusher.cancel()
+        cache_listener.cancel()
+        await asyncio.gather(ledger_flusher, cache_listener, return_exceptions=True)
+        await clients.close()
+        await bot.session.close()
+        await redis.aclose()
+        await Database.close()
+        logger.info(f"LLM request coalescing stats: {flights.stats()}")
+        logger.info(f"LLM response cache stats: {response_cache.stats()}")
+
+if __name__ == '__main__':
+    asyncio.run(main())